@@ -1190,7 +1190,7 @@ def importTrialTypes(fileName, returnFieldNames=False):
     logging.warning("importTrialTypes is DEPRECATED (as of v1.70.00). Please use `importConditions` for identical functionality.")
     return importConditions(fileName, returnFieldNames)
 
-def importConditions(fileName, returnFieldNames=False):
+def importConditions(fileName, returnFieldNames=False, columns=None, rows=None):
     """Imports a list of conditions from an .xlsx, .csv, or .pkl file
 
     The output is suitable as an input to :class:`TrialHandler` `trialTypes` or to
@@ -1209,6 +1209,15 @@ def importConditions(fileName, returnFieldNames=False):
         - begin with a letter (upper or lower case)
         - contain no spaces or other punctuation (underscores are permitted)
 
+    To import only part of the file, give `columns` (a list of parameter names
+    or zero-indexed column numbers) and/or `rows` (a slice, or a (start, stop)
+    tuple, of the conditions, not counting the header). Excel files are then
+    read lazily, one row at a time, and cells outside of the selection are
+    not converted at all::
+
+        conditions = importConditions('stimuli.xlsx', columns=['word', 'corrAns'],
+                                      rows=(0, 20))
+
     """
     def _assertValidVarNames(fieldNames, fileName):
         """screens a list of names as candidate variable names. if all names are
@@ -1222,6 +1231,32 @@ def importConditions(fileName, returnFieldNames=False):
                 msg = msg.replace('Variables', 'Parameters (column headers)')
                 raise ImportError, 'Conditions file %s: %s%s"%s"' %(fileName, msg, os.linesep*2, name)
 
+    def _selectColumns(fieldNames, fileName):
+        """returns the indices of the columns to import
+        """
+        if columns is None:
+            return range(len(fieldNames))
+        colNs = []
+        for col in columns:
+            if col in fieldNames:
+                colNs.append(fieldNames.index(col))
+            elif type(col)==int and col<0:
+                raise ValueError, 'Conditions file %s: column numbers can not be negative (%s)' %(fileName, col)
+            elif type(col)==int and col<len(fieldNames):
+                colNs.append(col)
+            else:
+                raise ImportError, 'Conditions file %s: no column %s' %(fileName, col)
+        return colNs
+
+    def _selectRows():
+        """returns the (start, stop) of the conditions to import (stop may be None)
+        """
+        if rows is None:
+            return 0, None
+        if isinstance(rows, slice):
+            return rows.start or 0, rows.stop
+        return rows
+
     if fileName in ['None','none',None]:
         if returnFieldNames:
             return [], []
@@ -1244,11 +1279,14 @@ def importConditions(fileName, returnFieldNames=False):
         trialsArr = mlab.csv2rec(f) # data = non-header row x col
         f.close()
         #convert the record array into a list of dicts
+        colNs = _selectColumns(fieldNames, fileName)
+        start, stop = _selectRows()
         trialList = []
-        for trialN, trialType in enumerate(trialsArr):
+        for trialType in trialsArr[start:stop]:
             thisTrial ={}
-            for fieldN, fieldName in enumerate(fieldNames):
-                val = trialsArr[trialN][fieldN]
+            for fieldN in colNs:
+                fieldName = fieldNames[fieldN]
+                val = trialType[fieldN]
                 if type(val)==numpy.string_:
                     val = unicode(val.decode('utf-8'))
                     #if it looks like a list, convert it:
@@ -1267,43 +1305,62 @@ def importConditions(fileName, returnFieldNames=False):
         trialList = []
         fieldNames = trialsArr[0] # header line first
         _assertValidVarNames(fieldNames, fileName)
-        for row in trialsArr[1:]:
+        colNs = _selectColumns(fieldNames, fileName)
+        start, stop = _selectRows()
+        for row in trialsArr[1:][start:stop]:
             thisTrial = {}
-            for fieldN, fieldName in enumerate(fieldNames):
-                thisTrial[fieldName] = row[fieldN] # type is correct, being .pkl
+            for fieldN in colNs:
+                thisTrial[fieldNames[fieldN]] = row[fieldN] # type is correct, being .pkl
             trialList.append(thisTrial)
     else:
         if not haveOpenpyxl:
             raise ImportError, 'openpyxl is required for loading excel format files, but it was not found.'
         try:
-            wb = load_workbook(filename = fileName)
+            #cells are parsed lazily, a row at a time, and only within the range asked for
+            wb = load_workbook(filename = fileName, use_iterators=True)
         except: # InvalidFileException(unicode(e)): # this fails
             raise ImportError, 'Could not open %s as conditions' % fileName
         ws = wb.worksheets[0]
-        nCols = ws.get_highest_column()
-        nRows = ws.get_highest_row()
 
         #get parameter names from the first row header
-        fieldNames = []
-        for colN in range(nCols):
-            fieldName = ws.cell(_getExcelCellName(col=colN, row=0)).value
-            fieldNames.append(fieldName)
+        allFieldNames = [cell.internal_value for cell in ws.iter_rows().next()]
+        colNs = _selectColumns(allFieldNames, fileName)
+        fieldNames = [allFieldNames[colN] for colN in colNs]
         _assertValidVarNames(fieldNames, fileName)
 
+        #read only the selected rows, and the columns spanning the selected ones
+        start, stop = _selectRows()
+        if stop is None:
+            stop = 1048576-1 #the most rows a sheet can have
+        lastRow = _getExcelLastRow(ws)
+        if lastRow is not None:
+            stop = min(stop, lastRow)
+        firstCol = min(colNs)
+        #one column wider, as some openpyxl versions leave out the last column of a range
+        cellRange = '%s:%s' %(_getExcelCellName(col=firstCol, row=start+1),
+                              _getExcelCellName(col=max(colNs)+1, row=stop))
+
         #loop trialTypes
         trialList = []
-        for rowN in range(1, nRows):#skip header first row
+        for row in ws.iter_rows(cellRange):
             thisTrial={}
-            for colN in range(nCols):
-                val = ws.cell(_getExcelCellName(col=colN, row=rowN)).value
+            for colN, fieldName in zip(colNs, fieldNames):
+                val = row[colN-firstCol].internal_value
+                #numbers are read as floats; keep whole numbers as int, as a full load would
+                if type(val)==float and val.is_integer():
+                    val = int(val)
                 #if it looks like a list, convert it
                 if type(val) in [unicode, str] and (
                         val.startswith('[') and val.endswith(']') or
                         val.startswith('(') and val.endswith(')') ):
                     val = eval(val)
-                fieldName = fieldNames[colN]
                 thisTrial[fieldName] = val
             trialList.append(thisTrial)
+        if lastRow is not None:
+            #openpyxl leaves out the rows at the end of the range that have no cells in
+            #its columns, so add them, as the number of conditions can't depend on the columns
+            for rowN in range(start+len(trialList), stop):
+                trialList.append(dict((fieldName, None) for fieldName in fieldNames))
 
     logging.exp('Imported %s as conditions, %d conditions, %d params' %
                  (fileName, len(trialList), len(fieldNames)))
@@ -3056,3 +3113,17 @@ def _getExcelCellName(col, row):
     """
     return "%s%i" %(get_column_letter(col+1), row+1)#BEWARE - openpyxl uses indexing at 1, to fit with Excel
 
+def _getExcelLastRow(ws):
+    """Returns the last row (zero-indexed) of a worksheet opened with
+    use_iterators=True, from the dimension stored in the file, or None if
+    the file doesn't store it
+    """
+    try:
+        from openpyxl.reader.worksheet import read_dimension
+        dimension = read_dimension(ws._xml_source)
+    except (ImportError, AttributeError, ValueError):
+        return None
+    if not dimension:
+        return None
+    return dimension[3]-1
+
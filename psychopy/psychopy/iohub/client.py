@@ -15,6 +15,7 @@ import os,sys
 import time
 import subprocess
 from collections import deque
+from operator import itemgetter
 import json
 import signal
 
@@ -37,7 +38,7 @@ from .devices import Computer, DeviceEvent,import_device
 from .devices.experiment import MessageEvent,LogEvent
 from .constants import DeviceConstants,EventConstants
 from .util import updateDict,MessageDialog, print2err,printExceptionDetailsToStdErr,ioHubError,win32MessagePump, ioHubConnectionException, ioHubServerError
-from .net import UDPClientConnection
+from .net import UDPClientConnection, UDPSubscriptionConnection, EventRingBuffer, MAX_REQUEST_SIZE
 
 currentSec= Computer.currentSec
 
@@ -45,6 +46,129 @@ _currentSessionInfo=None
 
 
 
+class ioHubFuture(object):
+    """
+    The pending reply to a request that was queued in an ioHubConnection
+    batch, rather than sent and waited for. See ioHubConnection.batch().
+    """
+    def __init__(self,hubClient):
+        self._hubClient=hubClient
+        self._request_id=None
+        self._reply=None
+        self._done=False
+        self._convert=None
+
+    def done(self):
+        """
+        Returns True if the reply to the request has been received.
+        """
+        return self._done
+
+    def result(self):
+        """
+        Returns the result of the request, sending the batch it is queued in
+        and waiting for the reply if necessary. If the ioHub Server replied
+        with an error, the error is raised.
+        """
+        if self._done is False:
+            self._hubClient._waitForReply(self)
+        errorReply=self._hubClient._isErrorReply(self._reply)
+        if errorReply:
+            raise errorReply
+        if self._convert:
+            return self._convert(self._reply)
+        return self._reply
+
+    def _setReply(self,reply):
+        self._reply=reply
+        self._done=True
+
+class ioHubRequestBatch(object):
+    """
+    Context manager returned by ioHubConnection.batch().
+    """
+    def __init__(self,hubClient):
+        self.hubClient=hubClient
+        self._opened=False
+
+    def __enter__(self):
+        if self.hubClient._requestBatch is None:
+            self.hubClient._requestBatch=[]
+            self._opened=True
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        if self._opened:
+            self._opened=False
+            try:
+                self.hubClient._sendRequestBatch()
+            finally:
+                self.hubClient._requestBatch=None
+        return False
+
+class ioHubEventSubscription(object):
+    """
+    A subscription to the events of some event types and / or devices, which
+    the ioHub Process pushes to the PsychoPy Process as soon as it handles
+    them, rather than keeping them until events are next asked for.
+    Created by ioHubConnection.subscribe().
+
+    Subscribed events are still also returned by ioHubConnection.getEvents()
+    and the device getEvents() methods.
+    """
+    def __init__(self,hubClient,event_types=None,device_labels=None):
+        self.hubClient=hubClient
+        self._connection=UDPSubscriptionConnection()
+        self._sequence_number=0
+
+        #: The number of event pushes that never arrived, detected from
+        #: gaps in the sequence numbers of the pushes that did.
+        self.missed=0
+
+        r=hubClient._sendToHubServer(('RPC','subscribeToEvents',(self._connection.getAddress(),event_types,device_labels)))
+        self.subscription_id=r[2]
+
+    def getEvents(self,timeout=0.0,as_type='namedtuple'):
+        """
+        Returns the events pushed since the last call. If none have been,
+        waits up to timeout sec.msec for one to arrive; a timeout of None
+        waits until one does.
+
+        Args:
+            timeout (float): the longest time to wait for an event, in sec.msec. Default: 0.0, do not wait.
+
+            as_type (str): how events are represented, as for ioHubConnection.getEvents(). Default: 'namedtuple'.
+
+        Returns:
+            list: the events, oldest first.
+        """
+        events=[]
+        r=self._connection.receive(timeout)
+        while r is not None:
+            push_type,subscription_id,sequence_number,pushed_events=r[0]
+            if sequence_number > self._sequence_number:
+                self.missed+=sequence_number-self._sequence_number-1
+                self._sequence_number=sequence_number
+            elif self.missed > 0:
+                # a push that arrived after a later one was counted as missed
+                self.missed-=1
+            events.extend(pushed_events)
+            r=self._connection.receive(0.0)
+        return ioHubConnection._convertEventList(events,as_type)
+
+    def close(self):
+        """
+        Ends the subscription.
+        """
+        if self._connection:
+            try:
+                self.hubClient._sendToHubServer(('RPC','unsubscribeFromEvents',(self.subscription_id,)))
+            finally:
+                self._connection.close()
+                self._connection=None
+                if self in self.hubClient._eventSubscriptions:
+                    self.hubClient._eventSubscriptions.remove(self)
+
 #
 # The ioHubDeviceView is the ioHub client side representation of an ioHub device.
 # It has a dynamically created list of methods that can be called
@@ -64,6 +188,12 @@ class DeviceRPC(object):
 
     def __call__(self, *args,**kwargs):
         r = self.sendToHub(('EXP_DEVICE','DEV_RPC',self.device_class,self.method_name,args,kwargs))
+        if isinstance(r,ioHubFuture):
+            r._convert=lambda reply: self._processReply(reply,kwargs)
+            return r
+        return self._processReply(r,kwargs)
+
+    def _processReply(self,r,kwargs):
         r=r[1:]
         if len(r)==1:
             r=r[0]
@@ -139,7 +269,7 @@ class ioHubDeviceView(object):
             if name in self._preRemoteMethodCallFunctions:
                 f,ka=self._preRemoteMethodCallFunctions[name]
                 f(ka)
-            r = DeviceRPC(self.hubClient._sendToHubServer,self.device_class,name)
+            r = DeviceRPC(self.hubClient._sendOrQueueToHubServer,self.device_class,name)
             if name in self._postRemoteMethodCallFunctions:
                 f,ka=self._postRemoteMethodCallFunctions[name]
                 f(ka)
@@ -334,6 +464,21 @@ class ioHubConnection(object):
         # udp port setup
         self.udp_client = None
 
+        # the shared memory ring the ioHub Server writes new events to, if
+        # the server has one enabled.
+        self._eventRing = None
+
+        # requests queued by batch(), as (message, future) pairs; None
+        # when no batch is open.
+        self._requestBatch = None
+
+        # futures of the batches sent and not yet replied to, by request id.
+        self._pendingReplies = dict()
+        self._lastRequestID = 0
+
+        # the open ioHubEventSubscription's created by subscribe().
+        self._eventSubscriptions = []
+
         # the dynamically generated object that contains an attribute for
         # each device registed for monitoring with the ioHub server so
         # that devices can be accessed experiment process side by device name.
@@ -471,23 +616,34 @@ class ioHubConnection(object):
             d=self.deviceByLabel[device_label]
             r=d.getEvents()
   
-        if r:
-            if as_type == 'list':
-                return r
+        return self._convertEventList(r,as_type)
 
-            conversionMethod=None
-            if as_type =='namedtuple':
-                conversionMethod=self._eventListToNamedTuple
-            elif as_type == 'dict':
-                conversionMethod=self._eventListToDict
-            elif as_type == 'object':
-                conversionMethod=self._eventListToObject
+    def subscribe(self,event_types=None,device_labels=None):
+        """
+        Subscribes to events of the given types, from the given devices, so
+        that the ioHub Process pushes each one to the PsychoPy Process as 
+        soon as it is handled. The events are read from the returned
+        ioHubEventSubscription, whose getEvents() method can also wait for
+        the next event to arrive; this gives the lowest latency access to,
+        for example, the response of a reaction time trial::
+
+            responses=hub.subscribe(event_types=[EventConstants.KEYBOARD_PRESS,])
+            ...
+            kb_presses=responses.getEvents(timeout=2.0)
             
-            if conversionMethod:
-                return [conversionMethod(el) for el in r]
-            return r
+        Args:
+            event_types (list): the EventConstants ids (or names, such as 'KEYBOARD_PRESS') of the event types to subscribe to. None (the default) subscribes to all event types.
 
-        return []
+            device_labels (list): the names of the devices to subscribe to the events of. None (the default) subscribes to all devices.
+
+        Returns:
+            ioHubEventSubscription: the subscription. Call its close() method to end it.
+        """
+        if event_types is not None:
+            event_types=[getattr(EventConstants,et) if isinstance(et,basestring) else et for et in event_types]
+        subscription=ioHubEventSubscription(self,event_types,device_labels)
+        self._eventSubscriptions.append(subscription)
+        return subscription
         
     def clearEvents(self,device_label=None):
         """
@@ -516,6 +672,8 @@ class ioHubConnection(object):
         """
         if device_label is None or device_label.lower() == 'all':
             self._sendToHubServer(('RPC','clearEventBuffer'))
+            if self._eventRing:
+                self._eventRing.clear()
             self.allEvents=[]
             if device_label and device_label.lower() == 'all':
                 [self.deviceByLabel[label].clearEvents() for label in self.deviceByLabel]
@@ -527,6 +685,38 @@ class ioHubConnection(object):
                 return True
             return False
 
+    def batch(self):
+        """
+        Returns a context manager that, while it is open, queues device method
+        calls and sendMessageEvent() calls instead of sending each of them and
+        waiting for its reply. When the context manager exits, the queued
+        requests are sent to the ioHub Process together in one message (or a
+        few, if they do not fit in one datagram), so a burst of requests costs
+        one round trip instead of one each.
+
+        A device method called in a batch returns an ioHubFuture, whose
+        result() method returns the value of the call; the replies are
+        received when the first result() is asked for, or before the next
+        request that is not batched. Other ioHubConnection methods, such as
+        getEvents(), are not queued; calling one sends the requests queued
+        so far first.
+
+        Example::
+
+            with hub.batch():
+                for trial in trials:
+                    hub.sendMessageEvent('TRIAL_INFO %d'%(trial,))
+                pos=hub.devices.mouse.getPosition()
+            print 'current mouse position: ', pos.result()
+
+        Args:
+            None
+
+        Returns:
+            ioHubRequestBatch: the context manager.
+        """
+        return ioHubRequestBatch(self)
+
     def wait(self,delay,check_hub_interval=0.02):
         """
         Pause the experiment script execution for a duration equal to the
@@ -608,7 +798,7 @@ class ioHubConnection(object):
         Returns:
             bool: True
         """
-        self._sendToHubServer(('EXP_DEVICE','EVENT_TX',[MessageEvent._createAsList(text,prefix=prefix,msg_offset=offset,sec_time=sec_time),]))
+        self._sendOrQueueToHubServer(('EXP_DEVICE','EVENT_TX',[MessageEvent._createAsList(text,prefix=prefix,msg_offset=offset,sec_time=sec_time),]))
         return True
                 
     def initializeConditionVariableTable(self, condition_variable_provider):
@@ -953,6 +1143,14 @@ class ioHubConnection(object):
         except:
             printExceptionDetailsToStdErr()
 
+        # open the shared memory event ring, if the server has created one.
+        try:
+            ring_path=self._sendToHubServer(('RPC','getEventRingPath'))[2]
+            if ring_path:
+                self._eventRing=EventRingBuffer.open(ring_path)
+        except:
+            print2err("Could not open the ioHub event ring; events will be received over UDP.")
+            printExceptionDetailsToStdErr()
         
         if experiment_info:
             #print 'Sending experiment_info: {0}'.format(experiment_info)
@@ -1090,28 +1288,19 @@ class ioHubConnection(object):
         the PsychoPy Process to the ioHub Process, and then wait for the reply
         from the ioHub Process before returning.
 
-        The ioHubConnection currently blocks until the request is fulfilled and
-        and a response is received from the ioHub server.
-
-        TODO: An aysnc. version could be added if desired. 
-
-        Instead of using callbacks, I prefer the idea of the client sending a
-        request and getting a request ticket # back from the ioHub server
-        right away, indicating that the job has been submitted for processing.
-        The ioHubConnection can then ask the ioHub Server for the status of the
-        job ticket based on ticket number.
-        
-        When the ticket number result is ready, it is sent back as the reply to
-        the status request. This **aysnc. mode will be necessary** when the 
-        worker process is added to the ioHub framework to handle long running 
-        job requests from the PsychoPy process; for example to load an image
-        into a shared memory space, perform long running computations, etc.
+        The ioHubConnection blocks until the request is fulfilled and
+        and a response is received from the ioHub server. Requests queued
+        by batch() are sent, and their replies received, first.
 
         Args:
             messageList (tuple): ioHub Server Message to send.
 
         Return (object): the message response from the ioHub Server process.
         """
+        if self._requestBatch:
+            self._sendRequestBatch()
+        if self._pendingReplies:
+            self._receiveReplies()
 
         # send request to host, return is # bytes sent.
         bytes_sent=self.udp_client.sendTo(ioHubMessage)
@@ -1130,6 +1319,95 @@ class ioHubConnection(object):
         #Otherwise return the result
         return result
 
+    def _sendOrQueueToHubServer(self,ioHubMessage):
+        """
+        Sends a message like _sendToHubServer, or, if a batch() is open,
+        queues it and returns an ioHubFuture for its reply.
+        """
+        if self._requestBatch is None:
+            return self._sendToHubServer(ioHubMessage)
+        future=ioHubFuture(self)
+        self._requestBatch.append((ioHubMessage,future))
+        return future
+
+    def _sendRequestBatch(self):
+        """
+        Sends the requests queued by batch() as BATCH messages, each tagged
+        with a new request id, without waiting for the replies. Requests are
+        split over several messages if they do not fit in one datagram.
+        """
+        queued=self._requestBatch
+        if not queued:
+            return
+        self._requestBatch=[]
+
+        max_size=MAX_REQUEST_SIZE-64
+        batch=[]
+        batch_size=0
+        for message,future in queued:
+            size=len(self.udp_client.pack(message))
+            if batch and batch_size+size > max_size:
+                self._sendBatchMessage(batch)
+                batch=[]
+                batch_size=0
+            batch.append((message,future))
+            batch_size+=size
+        self._sendBatchMessage(batch)
+
+    def _sendBatchMessage(self,batch):
+        self._lastRequestID+=1
+        request_id=self._lastRequestID
+        self.udp_client.sendTo(('BATCH',request_id,[message for message,future in batch]))
+        futures=[]
+        for message,future in batch:
+            future._request_id=request_id
+            futures.append(future)
+        self._pendingReplies[request_id]=futures
+
+    def _receiveReplies(self,request_id=None):
+        """
+        Receives the replies to sent batches, until the batch with the given
+        request id has been replied to, or, if request_id is None, all have.
+
+        An error reply is set on the futures of the batch it belongs to, and
+        is raised once the remaining batches have been received. An error
+        that names no batch fails every pending batch with it.
+        """
+        failure=None
+        while self._pendingReplies and (request_id is None or request_id in self._pendingReplies):
+            result,address=self.udp_client.receive()
+            ioHubConnection._addResponseToHistory(result,0,address)
+
+            errorReply=self._isErrorReply(result)
+            if errorReply:
+                failed_id=None
+                if len(result)>2 and isinstance(result[2],dict):
+                    failed_id=result[2].get('request_id')
+                if failed_id not in self._pendingReplies:
+                    for futures in self._pendingReplies.values():
+                        for future in futures:
+                            future._setReply(result)
+                    self._pendingReplies.clear()
+                    raise errorReply
+                for future in self._pendingReplies.pop(failed_id):
+                    future._setReply(result)
+                if request_id is None or request_id == failed_id:
+                    failure=errorReply
+                continue
+            if result[0] != 'BATCH_RESULT':
+                raise ioHubConnectionException("Unexpected reply while waiting for batched requests: {0}".format(result[0]))
+
+            futures=self._pendingReplies.pop(result[1],())
+            for future,reply in zip(futures,result[2]):
+                future._setReply(reply)
+        if failure:
+            raise failure
+
+    def _waitForReply(self,future):
+        if future._request_id is None:
+            self._sendRequestBatch()
+        self._receiveReplies(future._request_id)
+
     @classmethod
     def _addResponseToHistory(cls,result,bytes_sent,address):
         """
@@ -1201,17 +1479,56 @@ class ioHubConnection(object):
         
     def _getEvents(self):
         """
-        Sends a request to the ioHub Server for any new device events from the global server event buffer.
+        Reads any new device events from the shared memory event ring, or,
+        if there is no ring, sends a request to the ioHub Server for any new 
+        device events from the global server event buffer.
         The events are returned and the global ioHub server event buffer is cleared.
 
+        A GET_EVENTS request is still sent when the ring is used if the
+        server could not write some events to the ring (when the ring was
+        full, for example); those events are merged in by time.
+
         Args: None
-        Return(tuple): list of events, or empty list if no events have occurred since last call
-              to getEvents() or clearEvents(). Each event in the list is a tuple containing the ordered
+        Return(tuple): list of events, or None if no events have occurred since last call
+              to getEvents() or clearEvents(). Each event in the list is a list containing the ordered
               attributes of the event constructor.
         """
-        r = self._sendToHubServer(('GET_EVENTS',))
-        return r[1]
+        if self._eventRing is None:
+            r = self._sendToHubServer(('GET_EVENTS',))
+            return r[1]
+
+        events=self._eventRing.read()
+        if self._eventRing.spilled():
+            r = self._sendToHubServer(('GET_EVENTS',))
+            if r[1]:
+                events.extend(r[1])
+                events.sort(key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
+        return events or None
+
+
+    @staticmethod
+    def _convertEventList(events,as_type):
+        """
+        Converts a list of events, each an ordered list of values, to the 
+        representation given by as_type (see getEvents()).
+        """
+        if events:
+            if as_type == 'list':
+                return events
+
+            conversionMethod=None
+            if as_type =='namedtuple':
+                conversionMethod=ioHubConnection._eventListToNamedTuple
+            elif as_type == 'dict':
+                conversionMethod=ioHubConnection._eventListToDict
+            elif as_type == 'object':
+                conversionMethod=ioHubConnection._eventListToObject
+            
+            if conversionMethod:
+                return [conversionMethod(el) for el in events]
+            return events
 
+        return []
 
     @staticmethod
     def _eventListToObject(eventValueList):
@@ -1266,7 +1583,17 @@ class ioHubConnection(object):
             if sys.platform != 'darwin':
                 TimeoutError=psutil.TimeoutExpired
                 
+            if self._eventRing:
+                self._eventRing.close()
+                self._eventRing=None
+
+            while self._eventSubscriptions:
+                subscription=self._eventSubscriptions.pop()
+                subscription._connection.close()
+                subscription._connection=None
+
             try:
+                self._sendRequestBatch()
                 self.udp_client.sendTo(('STOP_IOHUB_SERVER',))
                 self.udp_client.close()
                 if Computer.ioHubServerProcess:
@@ -1303,12 +1630,10 @@ class ioHubConnection(object):
 
         """
         if isIterable(data) and len(data)>0:
-            if isIterable(data[0]):
-                return False
-            else:
-                if (type(data[0]) in (str,unicode)) and data[0].find('ERROR')>=0:
-                    return ioHubServerError(data)
-                return False
+            # strings are iterable too, so check for an error name first
+            if isinstance(data[0],basestring) and data[0].find('ERROR')>=0:
+                return ioHubServerError(data)
+            return False
         else:
             raise ioHubConnectionException('Response from ioHub should always be iterable and have a length > 0')
 
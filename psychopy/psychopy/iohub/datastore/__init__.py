@@ -13,6 +13,9 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 """
 import os, atexit
 
+import gevent
+from gevent.event import Event
+
 import tables
 from tables import *
 from tables import parameters
@@ -43,7 +46,48 @@ FILE_VERSION = '0.7.0 Beta'
 SCHEMA_AUTHORS='Sol Simpson'
 SCHEMA_MODIFIED_DATE='April 24th, 2013'
 
-        
+
+class EventStagingBuffer(object):
+    """
+    A preallocated structured numpy array that the events saved to one
+    table are written into, in place, so that they can be appended to the
+    table a chunk at a time instead of one row at a time.
+    """
+    def __init__(self,table,dtype,length):
+        self.table=table
+        self.dtype=dtype
+        self.length=length
+        self.data=N.empty(length,dtype=dtype)
+        self.count=0
+
+    def add(self,event):
+        """
+        Adds an event, returning True if the buffer is now full.
+        """
+        self.data[self.count]=tuple(event)
+        self.count+=1
+        return self.count == self.length
+
+    def detach(self):
+        """
+        Returns the staged events and starts a new, empty array, so that the
+        events can be written to the table later.
+        """
+        staged=self.data[:self.count]
+        self.data=N.empty(self.length,dtype=self.dtype)
+        self.count=0
+        return staged
+
+    def write(self):
+        """
+        Appends the staged events to the table, returning how many there were.
+        """
+        count=self.count
+        if count:
+            self.table.append(self.data[:count])
+            self.count=0
+        return count
+
 class ioHubpyTablesFile():
     
     def __init__(self,fileName,folderPath,fmode='a',ioHubsettings=None):
@@ -58,6 +102,15 @@ class ioHubpyTablesFile():
         
         self.flushCounter=self.settings.get('flush_interval',32)
         self._eventCounter=0
+
+        # Events are staged, per table, in EventStagingBuffer's, and written
+        # by the _stagedEventWriter greenlet when a buffer fills up, or every
+        # staging_flush_interval sec.msec otherwise.
+        self.stagingBufferLength=self.settings.get('staging_buffer_length',256)
+        self.stagingFlushInterval=self.settings.get('staging_flush_interval',0.25)
+        self._stagingBuffers=dict()
+        self._fullStagingBuffers=[]
+        self._writeStagedEventsNow=Event()
         
         self.TABLES=dict()
         self._eventGroupMappings=dict()
@@ -70,9 +123,40 @@ class ioHubpyTablesFile():
             self.flush()
         else:
             self.loadTableMappings()
+
+        self._stagedEventWriterGreenlet=gevent.spawn(self._stagedEventWriter)
     
+    def _getEventTableSettings(self):
+        """
+        Returns the filters, chunk shape and columns to index for event
+        tables, from the data_store event_tables settings.
+        """
+        table_settings=self.settings.get('event_tables',{})
+
+        complib=table_settings.get('complib','zlib')
+        complevel=table_settings.get('complevel',0)
+        if complib is None or complib == 'none':
+            complib,complevel='zlib',0
+        else:
+            try:
+                available=tables.whichLibVersion(complib) is not None
+            except ValueError:
+                # not a library PyTables knows of
+                available=False
+            if not available:
+                print2err("ioDataStore: compression library %s is not available, using zlib."%(complib,))
+                complib='zlib'
+        dfilter = Filters(complevel=complevel, complib=complib, shuffle=table_settings.get('shuffle',True), fletcher32=False)
+
+        chunkshape=None
+        chunk_rows=table_settings.get('chunk_rows',0)
+        if chunk_rows:
+            chunkshape=(chunk_rows,)
+
+        return dfilter,chunkshape,table_settings.get('indexed_columns',[])
+
     def updateDataStoreStructure(self,device_instance,event_class_dict):
-        dfilter = Filters(complevel=0, complib='zlib', shuffle=False, fletcher32=False)
+        dfilter,chunkshape,indexed_columns=self._getEventTableSettings()
         
         def eventTableLabel2ClassName(event_table_label):
             tokens=str(event_table_label[0]+event_table_label[1:].lower()+'Event').split('_') 
@@ -82,7 +166,7 @@ class ioHubpyTablesFile():
             if event_cls.IOHUB_DATA_TABLE:
                 event_table_label=event_cls.IOHUB_DATA_TABLE
                 if event_table_label not in self.TABLES:
-                    self.TABLES[event_table_label]=self.emrtFile.createTable(self._eventGroupMappings[event_table_label],eventTableLabel2ClassName(event_table_label),event_cls.NUMPY_DTYPE, title="%s %s Data"%(device_instance.__class__.__name__,eventTableLabel2ClassName(event_table_label)),filters=dfilter.copy())
+                    self.TABLES[event_table_label]=self.emrtFile.createTable(self._eventGroupMappings[event_table_label],eventTableLabel2ClassName(event_table_label),event_cls.NUMPY_DTYPE, title="%s %s Data"%(device_instance.__class__.__name__,eventTableLabel2ClassName(event_table_label)),filters=dfilter.copy(),chunkshape=chunkshape)
                     self.flush()
     
                 self.addClassMapping(event_cls,self.TABLES[event_table_label])
@@ -372,14 +456,10 @@ class ioHubpyTablesFile():
 #            print2err("*** ",DeviceEvent.EVENT_TYPE_ID_INDEX, '_handleEvent: ',etype,' : event list: ',event)
             eventClass=EventConstants.getClass(etype)
                 
-            etable=self.TABLES[eventClass.IOHUB_DATA_TABLE]
             event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX]=self.active_experiment_id
             event[DeviceEvent.EVENT_SESSION_ID_INDEX]=self.active_session_id
 
-            np_array= N.array([tuple(event),],dtype=eventClass.NUMPY_DTYPE)
-            etable.append(np_array)
-
-            self.bufferedFlush()
+            self._stageEvent(eventClass,event)
 
         except:
             print2err("Error saving event: ",event)
@@ -399,26 +479,73 @@ class ioHubpyTablesFile():
             etype=event[DeviceEvent.EVENT_TYPE_ID_INDEX]
             #ioHub.print2err("etype: ",etype)
             eventClass=EventConstants.getClass(etype)
-            etable=self.TABLES[eventClass.IOHUB_DATA_TABLE]
-            #ioHub.print2err("eventClass: etable",eventClass,etable)
 
-            np_events=[]
             for event in events:
                 event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX]=self.active_experiment_id
                 event[DeviceEvent.EVENT_SESSION_ID_INDEX]=self.active_session_id
-                np_events.append(tuple(event))
-
-            np_array= N.array(np_events,dtype=eventClass.NUMPY_DTYPE)
-            #ioHub.print2err('np_array:',np_array)
-            etable.append(np_array)
-
-            self.bufferedFlush(len(np_events))
+                self._stageEvent(eventClass,event)
 
         except ioHubError, e:
             print2err(e)
         except:
             printExceptionDetailsToStdErr()
 
+    def _stageEvent(self,eventClass,event):
+        # events are staged per table, not per class, so that the rows of
+        # a table shared by several event classes stay in time order.
+        table_label=eventClass.IOHUB_DATA_TABLE
+        staging_buffer=self._stagingBuffers.get(table_label)
+        if staging_buffer is None:
+            etable=self.TABLES[table_label]
+            etable.autoIndex=False
+            staging_buffer=EventStagingBuffer(etable,eventClass.NUMPY_DTYPE,self.stagingBufferLength)
+            self._stagingBuffers[table_label]=staging_buffer
+
+        if staging_buffer.add(event):
+            self._fullStagingBuffers.append((staging_buffer.table,staging_buffer.detach()))
+            self._writeStagedEventsNow.set()
+
+    def _stagedEventWriter(self):
+        while self.emrtFile:
+            self._writeStagedEventsNow.wait(self.stagingFlushInterval)
+            self._writeStagedEventsNow.clear()
+            try:
+                self.writeStagedEvents()
+            except:
+                printExceptionDetailsToStdErr()
+
+    def writeStagedEvents(self):
+        """
+        Appends all staged events to their tables, returning how many
+        events were written.
+
+        The hub's other greenlets are given a turn after each buffer is
+        appended, so that a backlog of staged events is written a buffer
+        at a time rather than all at once.
+        """
+        count=0
+        for staging_buffer in self._stagingBuffers.values():
+            # full buffers hold older events than the partly filled ones,
+            # so they are always written first.
+            count+=self._writeFullStagingBuffers()
+            written=staging_buffer.write()
+            if written:
+                count+=written
+                gevent.sleep(0)
+        count+=self._writeFullStagingBuffers()
+        if count:
+            self.bufferedFlush(count)
+        return count
+
+    def _writeFullStagingBuffers(self):
+        count=0
+        while self._fullStagingBuffers:
+            etable,staged=self._fullStagingBuffers.pop(0)
+            etable.append(staged)
+            count+=len(staged)
+            gevent.sleep(0)
+        return count
+
     def bufferedFlush(self,eventCount=1):
         # if flushCounter threshold is >=0 then do some checks. If it is < 0, then
         # flush only occurs when command is sent to ioHub, so do nothing here.
@@ -437,16 +564,50 @@ class ioHubpyTablesFile():
     def flush(self):
         try:
             if self.emrtFile:
+                self.writeStagedEvents()
                 self.emrtFile.flush()
         except ClosedFileError:
             pass
         except:
             printExceptionDetailsToStdErr()
 
+    def indexEventTables(self):
+        """
+        Creates completely sorted indexes on the indexed_columns of the
+        event tables that have rows, or brings existing ones up to date.
+
+        Indexes are not updated while events are being recorded, since
+        that would slow every append down. Building them can take a long
+        time on a large file, so they are only built when the file is
+        closed if the event_tables index_on_close setting is True;
+        otherwise call this once the session is over.
+        """
+        dfilter,chunkshape,indexed_columns=self._getEventTableSettings()
+        for table_label,etable in self.TABLES.iteritems():
+            if table_label not in self._eventGroupMappings or etable.nrows == 0:
+                continue
+            try:
+                for column_name in indexed_columns:
+                    if column_name not in etable.colnames:
+                        continue
+                    column=getattr(etable.cols,column_name)
+                    if column.index is None:
+                        column.createCSIndex(filters=dfilter)
+                etable.reIndexDirty()
+            except:
+                print2err("Error indexing ioDataStore table: ",table_label)
+                printExceptionDetailsToStdErr()
+
     def close(self):
+        if self.emrtFile is None:
+            return
         self.flush()
+        if self.settings.get('event_tables',{}).get('index_on_close',False):
+            self.indexEventTables()
         self._activeRunTimeConditionVariableTable=None
         self.emrtFile.close()
+        self.emrtFile=None
+        self._writeStagedEventsNow.set()
         
     def __del__(self):
         try:
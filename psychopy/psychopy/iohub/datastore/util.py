@@ -244,8 +244,7 @@ class ExperimentDataAccessUtility(object):
 
                         resultSetList.append([])
 
-                        for ename in event_attribute_names:
-                            resultSetList[-1].append(deviceEventTable.readWhere(wclause, field=ename))
+                        resultSetList[-1].extend(self._readEventAttributes(deviceEventTable,wclause,event_attribute_names))
                         resultSetList[-1].append(wclause)
                         resultSetList[-1].append(cv)
 
@@ -285,8 +284,7 @@ class ExperimentDataAccessUtility(object):
                         wclause=wclause[:-3]
                         wclause+=" ) "
 
-                    for ename in event_attribute_names:
-                        resultSetList[-1].append(deviceEventTable.readWhere(wclause, field=ename))
+                    resultSetList[-1].extend(self._readEventAttributes(deviceEventTable,wclause,event_attribute_names))
                     resultSetList[-1].append(wclause)
                     resultSetList[-1].append(cv)
 
@@ -297,6 +295,13 @@ class ExperimentDataAccessUtility(object):
 
             return None
 
+    def _readEventAttributes(self,deviceEventTable,wclause,event_attribute_names):
+        # The where clause is evaluated once, using the indexes on the
+        # session_id, type and time columns if the file has them, and the
+        # matching rows are then read for each attribute.
+        coordinates=deviceEventTable.getWhereList(wclause, sort=True)
+        return [deviceEventTable.readCoordinates(coordinates, field=ename) for ename in event_attribute_names]
+
     def getEventIterator(self,event_type):
         return self.getEventTable(event_type).iterrows()
         
@@ -13,9 +13,19 @@ Distributed under the terms of the GNU General Public License (GPL version 3 or
 from gevent import socket
 import msgpack
 import struct
+import os
+import errno
+import tempfile
+import numpy as N
+
+from .constants import EventConstants
+from .devices import DeviceEvent
 
 MAX_PACKET_SIZE=64*1024
 
+# The largest request datagram the ioHub Server reads.
+MAX_REQUEST_SIZE=8192
+
 class SocketConnection(object):
     def __init__(self,local_host=None,local_port=None,remote_host=None,remote_port=None,rcvBufferLength=1492, broadcast=False, blocking=0, timeout=0):
         self._local_port= local_port
@@ -58,24 +68,27 @@ class SocketConnection(object):
     def receive(self):
         try:
             data, address = self.sock.recvfrom(self._rcvBufferLength)
-            self.lastAddress=address
-            self.feed(data[:-2])
-            result=self.unpack()
-            if result[0] == 'IOHUB_MULTIPACKET_RESPONSE':
-                num_packets=result[1]
-
-                for p in xrange(num_packets-1):
-                    data, address = self.sock.recvfrom(self._rcvBufferLength)
-                    self.feed(data)
-
-                data, address = self.sock.recvfrom(self._rcvBufferLength)
-                self.feed(data[:-2])
-                result=self.unpack()
-            return result,address
+            return self._readResponse(data,address)
         except Exception as e:
             print "Error during SocketConnection.receive: ",e
             raise e
 
+    def _readResponse(self,data,address):
+        self.lastAddress=address
+        self.feed(data[:-2])
+        result=self.unpack()
+        if result[0] == 'IOHUB_MULTIPACKET_RESPONSE':
+            num_packets=result[1]
+
+            for p in xrange(num_packets-1):
+                data, address = self.sock.recvfrom(self._rcvBufferLength)
+                self.feed(data)
+
+            data, address = self.sock.recvfrom(self._rcvBufferLength)
+            self.feed(data[:-2])
+            result=self.unpack()
+        return result,address
+
     def close(self):
         self.sock.close()
 
@@ -86,3 +99,198 @@ class UDPClientConnection(SocketConnection):
     def initSocket(self,**kwargs):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MAX_PACKET_SIZE)
+
+
+class UDPSubscriptionConnection(SocketConnection):
+    """
+    A UDP socket, bound to a free local port, that the ioHub Server pushes
+    the events of an event subscription to.
+    """
+    def __init__(self,local_host='127.0.0.1',rcvBufferLength = MAX_PACKET_SIZE):
+        SocketConnection.__init__(self,local_host=local_host,local_port=0,rcvBufferLength=rcvBufferLength)
+
+    def initSocket(self,**kwargs):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4*MAX_PACKET_SIZE)
+        self.sock.bind((self._local_host,self._local_port))
+        self._local_port=self.sock.getsockname()[1]
+
+    def getAddress(self):
+        return self._local_host,self._local_port
+
+    def receive(self,timeout=None):
+        """
+        Returns the next message pushed to the socket, as (result,address),
+        or None if none arrives within timeout sec.msec. A timeout of 0.0
+        does not wait at all; None waits until a message arrives.
+        """
+        self.sock.settimeout(timeout)
+        try:
+            data, address = self.sock.recvfrom(self._rcvBufferLength)
+        except socket.timeout:
+            return None
+        except socket.error as e:
+            if e.args[0] in (errno.EWOULDBLOCK,errno.EAGAIN):
+                return None
+            raise
+        self.sock.settimeout(None)
+        return self._readResponse(data,address)
+
+
+class EventRingBuffer(object):
+    """
+    A single producer / single consumer ring of fixed size event records,
+    held in a memory mapped file that is shared by the ioHub Server (the
+    producer) and the PsychoPy Process (the consumer).
+
+    Each slot of the ring holds one event, stored as a record of the
+    NUMPY_DTYPE of the event's class. The write index is only changed by the
+    producer and the read index only by the consumer, so no lock is needed,
+    and the consumer reads new events straight from shared memory without a
+    UDP round trip or any other system call.
+
+    Events that are larger than a slot, that can not be stored as a
+    NUMPY_DTYPE record, or that arrive while the ring is full are not written
+    to the ring; they are counted as spilled, and must be sent to the
+    consumer some other way (the GET_EVENTS request).
+    """
+    # The header holds one uint64 per field; the write and read indexes
+    # are kept on separate cache lines.
+    HEADER_SIZE=192
+    _WRITE_INDEX=0
+    _SPILLED_COUNT=1
+    _READ_INDEX=8
+    _CAPACITY=16
+    _SLOT_SIZE=17
+
+    _TYPE_OFFSET=DeviceEvent.NUMPY_DTYPE.fields['type'][1]
+
+    def __init__(self,path,data):
+        self.path=path
+        self._data=data
+        self._header=data[:self.HEADER_SIZE].view(N.uint64)
+        self.capacity=int(self._header[self._CAPACITY])
+        self.slot_size=int(self._header[self._SLOT_SIZE])
+        self._slots=data[self.HEADER_SIZE:].reshape(self.capacity,self.slot_size)
+        self._types=self._slots[:,self._TYPE_OFFSET]
+        self._dtypes={}
+        self._spilled_count=0
+
+    @classmethod
+    def create(cls,capacity,slot_size,directory=None):
+        """
+        Creates the ring in a new, uniquely named file that only the current
+        user can access, in directory (by default, the temp directory).
+        Called by the producer, which passes the path of the ring to the
+        consumer, and removes the file when it closes the ring.
+        """
+        size=cls.HEADER_SIZE+capacity*slot_size
+        fd,path=tempfile.mkstemp(prefix='iohub_events_',suffix='.ring',dir=directory)
+        f=os.fdopen(fd,'r+b')
+        try:
+            f.seek(size-1)
+            f.write(b'\0')
+            f.flush()
+            data=N.memmap(f,dtype=N.uint8,mode='r+',shape=(size,))
+        except:
+            f.close()
+            os.remove(path)
+            raise
+        f.close()
+        header=data[:cls.HEADER_SIZE].view(N.uint64)
+        header[cls._CAPACITY]=capacity
+        header[cls._SLOT_SIZE]=slot_size
+        return cls(path,data)
+
+    @classmethod
+    def open(cls,path):
+        """
+        Opens a ring created by the producer. Called by the consumer.
+        """
+        return cls(path,N.memmap(path,dtype=N.uint8,mode='r+'))
+
+    def _getEventDtype(self,event_type):
+        try:
+            return self._dtypes[event_type]
+        except KeyError:
+            dtype=None
+            eclass=EventConstants.getClass(event_type)
+            if eclass and eclass.NUMPY_DTYPE.itemsize <= self.slot_size:
+                dtype=eclass.NUMPY_DTYPE
+            self._dtypes[event_type]=dtype
+            return dtype
+
+    def write(self,event):
+        """
+        Writes an event, given as a list of attribute values, to the next
+        free slot. Returns False, and counts the event as spilled, if the
+        event was not written.
+        """
+        header=self._header
+        write_index=int(header[self._WRITE_INDEX])
+        if write_index-int(header[self._READ_INDEX]) < self.capacity:
+            dtype=self._getEventDtype(event[DeviceEvent.EVENT_TYPE_ID_INDEX])
+            if dtype is not None:
+                slot=self._slots[write_index%self.capacity]
+                try:
+                    slot[:dtype.itemsize].view(dtype)[0]=tuple(event)
+                    header[self._WRITE_INDEX]=write_index+1
+                    return True
+                except (ValueError,TypeError,UnicodeError):
+                    pass
+        header[self._SPILLED_COUNT]+=1
+        return False
+
+    def read(self):
+        """
+        Returns the events written since the last read, oldest first, as
+        lists of attribute values, and frees their slots.
+        """
+        header=self._header
+        read_index=int(header[self._READ_INDEX])
+        write_index=int(header[self._WRITE_INDEX])
+        events=[]
+        while read_index < write_index:
+            start=read_index%self.capacity
+            stop=min(start+write_index-read_index,self.capacity)
+            self._readSlots(start,stop,events)
+            read_index+=stop-start
+        header[self._READ_INDEX]=write_index
+        return events
+
+    def _readSlots(self,start,stop,events):
+        # Consecutive events of the same type are read as one strided
+        # record array over the slots.
+        types=self._types[start:stop]
+        bounds=[0]+(N.flatnonzero(types[1:]!=types[:-1])+1).tolist()+[stop-start]
+        for first,last in zip(bounds[:-1],bounds[1:]):
+            dtype=self._getEventDtype(int(types[first]))
+            if dtype is None:
+                continue
+            records=N.ndarray((last-first,),dtype,self._data,
+                              self.HEADER_SIZE+(start+first)*self.slot_size,
+                              (self.slot_size,))
+            events.extend([list(r) for r in records.tolist()])
+
+    def spilled(self):
+        """
+        Returns the number of events spilled since this method was last called.
+        """
+        spilled_count=int(self._header[self._SPILLED_COUNT])
+        spilled=spilled_count-self._spilled_count
+        self._spilled_count=spilled_count
+        return spilled
+
+    def clear(self):
+        """
+        Discards the events that have not been read yet. Called by the consumer.
+        """
+        self._header[self._READ_INDEX]=self._header[self._WRITE_INDEX]
+
+    def close(self,remove=False):
+        self._header=self._slots=self._types=self._data=None
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
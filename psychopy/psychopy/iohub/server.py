@@ -20,7 +20,7 @@ from psychopy.iohub.util import OrderedDict,print2err, printExceptionDetailsToSt
 from psychopy.iohub.constants import DeviceConstants,EventConstants
 from psychopy.iohub.devices import Computer, DeviceEvent, import_device        
 from psychopy.iohub.devices.deviceConfigValidation import validateDeviceConfiguration
-from psychopy.iohub.net import MAX_PACKET_SIZE
+from psychopy.iohub.net import MAX_PACKET_SIZE, EventRingBuffer
 from psychopy.iohub import IO_HUB_DIRECTORY
 from yaml import load
 try:
@@ -54,12 +54,25 @@ class udpServer(DatagramServer):
         
         self.feed(request[:-2])
         request = self.unpack()   
+
+        reply=self.handleRequest(request)
+        if reply is None:
+            return False
+        self.sendResponse(reply,replyTo)
+        return True
+
+    def handleRequest(self,request):
+        """
+        Returns the reply to a request, or None if it has no reply.
+        """
         request_type= request.pop(0)
         
         if request_type == 'GET_EVENTS':
-            return self.handleGetEvents(replyTo)
+            return self.handleGetEvents()
         elif request_type == 'EXP_DEVICE':
-            return self.handleExperimentDeviceRequest(request,replyTo)
+            return self.handleExperimentDeviceRequest(request)
+        elif request_type == 'BATCH':
+            return self.handleBatchRequest(request)
         elif request_type == 'RPC':
             callable_name=request.pop(0)
             args=None
@@ -73,11 +86,9 @@ class udpServer(DatagramServer):
             try:
                 result=getattr(self,callable_name)
             except:
-                self.sendResponse(createErrorResult('RPC_ATTRIBUTE_ERROR',
+                return createErrorResult('RPC_ATTRIBUTE_ERROR',
                                         msg="The method name referenced could not be found by the RPC server.",
-                                        method_name=callable_name),
-                                    replyTo)
-                return False
+                                        method_name=callable_name)
                 
             if result and callable(result):
                 funcPtr=result
@@ -90,63 +101,66 @@ class udpServer(DatagramServer):
                         result = funcPtr(*args)
                     elif not args and kwargs:
                         result = funcPtr(**kwargs)
-                    edata=('RPC_RESULT',callable_name,result)
-                    self.sendResponse(edata,replyTo)
-                    return True
+                    return ('RPC_RESULT',callable_name,result)
                 except Exception,e:
-                    self.sendResponse(createErrorResult('RPC_RUNTIME_ERROR',
+                    return createErrorResult('RPC_RUNTIME_ERROR',
                                       msg="An error occurred on the ioHub Server while evaulating an RPC request",
                                       method_name=callable_name,
                                       args=args,
                                       kwargs=kwargs,
                                       exception=str(e))
-                                ,replyTo)
-                    return False
             else:
-                self.sendResponse(createErrorResult('RPC_NOT_CALLABLE_ERROR',
+                return createErrorResult('RPC_NOT_CALLABLE_ERROR',
                                     msg="The method name give is not callable (it is not a method).",
                                     method_name=callable_name,
                                     resolved_result=str(result))
-                                ,replyTo)
-                return False
         elif request_type == 'STOP_IOHUB_SERVER':
             try:
                 self.shutDown()
             except:
                 printExceptionDetailsToStdErr
         else:
-            self.sendResponse(createErrorResult('RPC_TYPE_NOT_SUPPORTED_ERROR',
+            return createErrorResult('RPC_TYPE_NOT_SUPPORTED_ERROR',
                                     msg="The request type provided is not recognized by the ioHub Server.",
-                                    request_type=request_type),
-                                replyTo)
-            return False
+                                    request_type=request_type)
             
-    def handleGetEvents(self,replyTo):
+    def handleBatchRequest(self,request):
+        """
+        Handles the requests of a BATCH message, in order, and returns their
+        replies in one BATCH_RESULT message, tagged with the batch's request id.
+        """
+        request_id=request.pop(0)
+        try:
+            replies=[self.handleRequest(r) for r in request.pop(0)]
+        except Exception,e:
+            return createErrorResult('BATCH_RUNTIME_ERROR',
+                                    msg="An error occurred on the ioHub Server while handling a batch of requests",
+                                    request_id=request_id,
+                                    exception=str(e))
+        return ('BATCH_RESULT',request_id,replies)
+
+    def handleGetEvents(self):
         try:
             currentEvents=list(self.iohub.eventBuffer)
             self.iohub.eventBuffer.clear()
 
             if len(currentEvents)>0:
                 sorted(currentEvents, key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
-                self.sendResponse(('GET_EVENTS_RESULT',currentEvents),replyTo)
+                return ('GET_EVENTS_RESULT',currentEvents)
             else:
-                self.sendResponse(('GET_EVENTS_RESULT', None),replyTo)
-            return True
+                return ('GET_EVENTS_RESULT', None)
         except Exception,e:
-            self.sendResponse(createErrorResult('IOHUB_GET_EVENTS_ERROR',
+            return createErrorResult('IOHUB_GET_EVENTS_ERROR',
                                     msg="An error occurred while events were being retrived from the ioHub Server",
-                                    exception=str(e)),
-                                replyTo)
-            return False
+                                    exception=str(e))
 
-    def handleExperimentDeviceRequest(self,request,replyTo):
+    def handleExperimentDeviceRequest(self,request):
         request_type= request.pop(0)
         if request_type == 'EVENT_TX':
             exp_events=request.pop(0)
             for eventAsTuple in exp_events:
                 ioServer.deviceDict['Experiment']._nativeEventCallback(eventAsTuple)
-            self.sendResponse(('EVENT_TX_RESULT',len(exp_events)),replyTo)
-            return True
+            return ('EVENT_TX_RESULT',len(exp_events))
         elif request_type == 'DEV_RPC':
             dclass=request.pop(0)
             dmethod=request.pop(0)
@@ -170,19 +184,15 @@ class udpServer(DatagramServer):
                 dev=ioServer.deviceDict.get(dclass,None)
             
             if dev is None:
-                self.sendResponse(createErrorResult('IOHUB_DEVICE_ERROR',
+                return createErrorResult('IOHUB_DEVICE_ERROR',
                                         msg="An instance of the ioHub Device class provided is not enabled on the ioHub Server",
-                                        device_class=dclass),
-                                    replyTo)                
-                return False
+                                        device_class=dclass)
             
             try:
                 method=getattr(dev,dmethod)
             except:
-                self.sendResponse(createErrorResult('IOHUB_DEVICE_METHOD_ERROR',
-                                        msg="Device class {0} does not have a method called {1}".format(dclass,dmethod)),
-                                    replyTo)                
-                return False
+                return createErrorResult('IOHUB_DEVICE_METHOD_ERROR',
+                                        msg="Device class {0} does not have a method called {1}".format(dclass,dmethod))
                 
             result=[]
             try:
@@ -194,34 +204,28 @@ class udpServer(DatagramServer):
                     result=method(**kwargs)
                 else:
                     result=method()
-                self.sendResponse(('DEV_RPC_RESULT',result),replyTo)
-                return True
+                return ('DEV_RPC_RESULT',result)
             except Exception, e:
-                self.sendResponse(createErrorResult('RPC_DEVICE_RUNTIME_ERROR',
+                return createErrorResult('RPC_DEVICE_RUNTIME_ERROR',
                                       msg="An error occurred on the ioHub Server while evaulating an Device RPC request",
                                       device=dclass,
                                       dmethod=dmethod,
                                       args=args,
                                       kwargs=kwargs,
                                       exception=str(e))
-                                ,replyTo)
-                return False
         elif request_type == 'GET_DEVICE_LIST':
             try:            
                 dev_list=[]
                 for d in self.iohub.devices:
                     dev_list.append((d.name,d.__class__.__name__))
-                self.sendResponse(('GET_DEV_LIST_RESULT',len(dev_list),dev_list),replyTo)
-                return True
+                return ('GET_DEV_LIST_RESULT',len(dev_list),dev_list)
             except Exception, e:
                 printExceptionDetailsToStdErr()
-                self.sendResponse(createErrorResult('RPC_DEVICE_RUNTIME_ERROR',
+                return createErrorResult('RPC_DEVICE_RUNTIME_ERROR',
                                       msg="An error occurred on the ioHub Server while getting the Device list for the Experiment Process",
                                       devices=str(self.iohub.devices),
                                       dev_list=str(dev_list),
                                       exception=str(e))
-                                ,replyTo)
-                return False                
 
         elif request_type == 'GET_DEV_INTERFACE':
             dclass=request.pop(0)
@@ -237,14 +241,11 @@ class udpServer(DatagramServer):
                     data=dev._getRPCInterface()
                     
             if data:
-                self.sendResponse(('GET_DEV_INTERFACE',data),replyTo)
-                return True
+                return ('GET_DEV_INTERFACE',data)
             else:
-                self.sendResponse(createErrorResult('GET_DEV_INTERFACE_ERROR',
+                return createErrorResult('GET_DEV_INTERFACE_ERROR',
                                         msg="An error occurred on the ioHub Server while retrieving device interface information.",
-                                        device=dclass),
-                                  replyTo)
-                return False
+                                        device=dclass)
         elif request_type == 'ADD_DEVICE':
             dclass_name=request.pop(0)
             dconfig_dict=request.pop(1)
@@ -254,21 +255,16 @@ class udpServer(DatagramServer):
             # end adding device to server
                     
             if data:
-                self.sendResponse(('ADD_DEVICE',data),replyTo)
-                return True
+                return ('ADD_DEVICE',data)
             else:
-                self.sendResponse(createErrorResult('ADD_DEVICE_ERROR',
+                return createErrorResult('ADD_DEVICE_ERROR',
                                         msg="An error occurred on the ioHub Server while adding a device to be monitored.",
                                         device=dclass_name,
-                                        config=dconfig_dict),
-                                  replyTo)
-            return False
+                                        config=dconfig_dict)
         else:
-            self.sendResponse(createErrorResult('DEVICE_RPC_TYPE_NOT_SUPPORTED_ERROR',
+            return createErrorResult('DEVICE_RPC_TYPE_NOT_SUPPORTED_ERROR',
                                     msg="The device RPC request type provided is not recognized by the ioHub Server.",
-                                    request_type=request_type),
-                              replyTo)
-            return False
+                                    request_type=request_type)
             
     def sendResponse(self,data,address):
         packet_data=None
@@ -362,6 +358,17 @@ class udpServer(DatagramServer):
     def clearEventBuffer(self):
         return self.iohub.clearEventBuffer()
 
+    def subscribeToEvents(self,address,event_types=None,device_names=None):
+        return self.iohub.addEventSubscription(tuple(address),event_types,device_names)
+
+    def unsubscribeFromEvents(self,subscription_id):
+        return self.iohub.removeEventSubscription(subscription_id)
+
+    def getEventRingPath(self):
+        if self.iohub.eventRing:
+            return self.iohub.eventRing.path
+        return None
+
     def enableHighPriority(self,disable_gc=True):
         Computer.enableHighPriority(disable_gc)
 
@@ -376,7 +383,7 @@ class udpServer(DatagramServer):
 
     def flushIODataStoreFile(self):
         if self.iohub.emrt_file:
-            self.iohub.emrt_file.emrtFile.flush()
+            self.iohub.emrt_file.flush()
             return True
         return False
 
@@ -391,6 +398,23 @@ class udpServer(DatagramServer):
             printExceptionDetailsToStdErr()
             sys.exit(1)
 
+class EventSubscription(object):
+    """
+    A device event listener that pushes each event it handles straight to a
+    client's subscription socket, instead of keeping it until the client asks
+    for events. Each push carries a sequence number, so the client can tell
+    when a datagram was lost.
+    """
+    def __init__(self,udpService,subscription_id,address):
+        self.udpService=udpService
+        self.subscription_id=subscription_id
+        self.address=address
+        self.sequence_number=0
+
+    def _handleEvent(self,event):
+        self.sequence_number+=1
+        self.udpService.sendResponse(('EVENT_PUSH',self.subscription_id,self.sequence_number,[event,]),self.address)
+
 class DeviceMonitor(Greenlet):
     def __init__(self, device,sleep_interval):
         Greenlet.__init__(self)
@@ -411,6 +435,7 @@ class DeviceMonitor(Greenlet):
         
 class ioServer(object):
     eventBuffer=None
+    eventRing=None
     deviceDict={}
     _logMessageBuffer=deque(maxlen=128)
     def __init__(self, rootScriptPathDir, config=None):
@@ -429,9 +454,24 @@ class ioServer(object):
         self.filterLookupByInput={}
         self.filterLookupByOutput={}
         self.filterLookupByName={}  
+        self.deviceEventIDs={}
+        self.eventSubscriptions={}
+        self._lastSubscriptionID=0
         self._hookDevice=None
         ioServer.eventBuffer=deque(maxlen=config.get('global_event_buffer',2048))
 
+        # shared memory ring that streamed events are written to for the
+        # experiment process; events that can not be written to it are
+        # kept in the eventBuffer and sent in reply to GET_EVENTS.
+        self.eventRing=None
+        event_ring_config=config.get('event_ring',{})
+        if event_ring_config.get('enable',True):
+            try:
+                self.eventRing=EventRingBuffer.create(event_ring_config.get('capacity',8192),event_ring_config.get('slot_size',512),event_ring_config.get('directory'))
+            except:
+                print2err("Error creating the shared memory event ring; events will be sent over UDP.")
+                printExceptionDetailsToStdErr()
+
         self._running=True
         
         # start UDP service
@@ -772,6 +812,7 @@ class ioServer(object):
                     eventIDs.append(getattr(EventConstants,convertCamelToSnake(event_class_name[:-5],False)))
             
             self.log("{0} Instance Event IDs To Monitor: {1}".format(device_class_name,eventIDs))
+            self.deviceEventIDs[device_class_name]=eventIDs
             #ioHub.print2err("{0} Instance Event IDs To Monitor: {1}".format(device_class_name,eventIDs))
 
             # add event listeners for streaming events
@@ -841,9 +882,39 @@ class ioServer(object):
                 print2err("Event type ID: ",e[DeviceEvent.EVENT_TYPE_ID_INDEX], " : " , EventConstants.getName(e[DeviceEvent.EVENT_TYPE_ID_INDEX]))
                 print2err("--------------------------------------")
 
+    def addEventSubscription(self,address,event_types=None,device_names=None):
+        """
+        Starts pushing the events of the given type ids, from the devices
+        with the given names, to the UDP address given. None for either
+        filter means all event types, or all devices. Returns the id of the
+        subscription.
+        """
+        self._lastSubscriptionID+=1
+        subscription=EventSubscription(self.udpService,self._lastSubscriptionID,address)
+        for device_class_name,device in ioServer.deviceDict.iteritems():
+            if device_names and device.name not in device_names:
+                continue
+            eventIDs=self.deviceEventIDs.get(device_class_name,[])
+            if event_types:
+                eventIDs=[ei for ei in eventIDs if ei in event_types]
+            if eventIDs:
+                device._addEventListener(subscription,eventIDs)
+        self.eventSubscriptions[subscription.subscription_id]=subscription
+        self.log("Event subscription %d added for %s"%(subscription.subscription_id,str(address)))
+        return subscription.subscription_id
+
+    def removeEventSubscription(self,subscription_id):
+        subscription=self.eventSubscriptions.pop(subscription_id,None)
+        if subscription is None:
+            return False
+        for device in self.devices:
+            device._removeEventListener(subscription)
+        return True
+
     def _handleEvent(self,event):
         #ioHub.print2err("ioServer Handle event: ",event)
-        self.eventBuffer.append(event)
+        if self.eventRing is None or self.eventRing.write(event) is False:
+            self.eventBuffer.append(event)
 
     def clearEventBuffer(self):
         l= len(self.eventBuffer)
@@ -858,11 +929,17 @@ class ioServer(object):
                 if self._hookManager:
                     self._hookManager.cancel()
     
+            for subscription_id in self.eventSubscriptions.keys():
+                self.removeEventSubscription(subscription_id)
+
             while len(self.deviceMonitors) > 0:
                 m=self.deviceMonitors.pop(0)
                 m.running=False
             if self.eventBuffer:
                 self.clearEventBuffer()
+            if self.eventRing:
+                self.eventRing.close(remove=True)
+                self.eventRing=None
             try:
                 self.closeDataStoreFile()
             except:
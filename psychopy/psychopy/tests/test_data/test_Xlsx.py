@@ -3,6 +3,7 @@ import os, shutil
 import numpy
 
 from openpyxl.reader.excel import load_workbook
+from openpyxl.workbook import Workbook
 from psychopy import data, misc
 from psychopy.tests import utils
 from tempfile import mkdtemp
@@ -52,6 +53,46 @@ def test_TrialTypeImport():
                 print header, trialCSV[header], trialXLSX[header]
             assert trialXLSX[header] == trialCSV[header]
 
+def test_TrialTypeImportSelection():
+    fileName = os.path.join(fixturesPath, 'trialTypes.xlsx')
+    allConds = data.importConditions(fileName)
+    for columns in [['corrAns', 'n'], [5, 0]]:
+        conds, fieldNames = data.importConditions(fileName, returnFieldNames=True,
+            columns=columns, rows=(1, 4))
+        assert len(conds) == 3
+        for cond, fullCond in zip(conds, allConds[1:4]):
+            assert sorted(cond.keys()) == sorted(fieldNames)
+            for fieldName in fieldNames:
+                assert cond[fieldName] == fullCond[fieldName]
+
+def test_TrialTypeImportBlankCells():
+    #the last conditions have no note, and a blank row separates them
+    temp_dir = mkdtemp(prefix='psychopy-tests-testdata')
+    fileName = os.path.join(temp_dir, 'blankCells.xlsx')
+    wb = Workbook()
+    ws = wb.worksheets[0]
+    rows = [('word', 'n', 'note'), ('a', 1, 'first'), ('b', 2, None),
+            (None, None, None), ('c', 3, None)]
+    for rowN, row in enumerate(rows):
+        for colN, val in enumerate(row):
+            if val is not None:
+                ws.cell(row=rowN, column=colN).value = val
+    wb.save(fileName)
+    try:
+        for columns in [['note'], ['n', 'note'], ['word', 'note'], None]:
+            conds = data.importConditions(fileName, columns=columns)
+            assert len(conds) == 4
+            assert [cond['note'] for cond in conds] == ['first', None, None, None]
+        conds = data.importConditions(fileName, columns=['note'], rows=(2, 10))
+        assert conds == [{'note': None}, {'note': None}]
+        try:
+            data.importConditions(fileName, columns=[-1])
+            assert False, 'negative column numbers should be rejected'
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(temp_dir)
+
 if __name__=='__main__':
     t=TestXLSX()
     t.setup_class()
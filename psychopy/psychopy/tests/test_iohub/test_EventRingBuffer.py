@@ -0,0 +1,78 @@
+"""Tests for psychopy.iohub.net.EventRingBuffer"""
+import os, sys, stat
+import shutil
+from tempfile import mkdtemp
+import numpy as N
+
+from psychopy.iohub.net import EventRingBuffer
+from psychopy.iohub.devices import DeviceEvent
+
+EVENT_TYPE=151
+
+def makeEvent(event_id):
+    event=list(N.zeros(1,DeviceEvent.NUMPY_DTYPE)[0].tolist())
+    event[DeviceEvent.EVENT_ID_INDEX]=event_id
+    event[DeviceEvent.EVENT_TYPE_ID_INDEX]=EVENT_TYPE
+    return event
+
+def eventIds(events):
+    return [e[DeviceEvent.EVENT_ID_INDEX] for e in events]
+
+class TestEventRingBuffer:
+    def setup_class(self):
+        self.temp_dir = mkdtemp(prefix='psychopy-tests-iohub')
+
+    def teardown_class(self):
+        shutil.rmtree(self.temp_dir)
+
+    def setup_method(self, method):
+        self.ring=EventRingBuffer.create(4,DeviceEvent.NUMPY_DTYPE.itemsize,self.temp_dir)
+        self.reader=EventRingBuffer.open(self.ring.path)
+        # the base event class is not registered with EventConstants
+        for ring in (self.ring,self.reader):
+            ring._dtypes[EVENT_TYPE]=DeviceEvent.NUMPY_DTYPE
+
+    def teardown_method(self, method):
+        self.reader.close()
+        self.ring.close(remove=True)
+
+    def test_create(self):
+        assert os.path.dirname(self.ring.path) == self.temp_dir
+        other=EventRingBuffer.create(4,64,self.temp_dir)
+        assert other.path != self.ring.path
+        other.close(remove=True)
+        assert not os.path.exists(other.path)
+        if sys.platform != 'win32':
+            assert stat.S_IMODE(os.stat(self.ring.path).st_mode) == 0600
+
+    def test_read_write(self):
+        assert self.reader.read() == []
+        for i in range(3):
+            assert self.ring.write(makeEvent(i))
+        events=self.reader.read()
+        assert eventIds(events) == [0,1,2]
+        assert events[0] == makeEvent(0)
+        assert self.reader.read() == []
+
+    def test_wrap_around(self):
+        event_id=0
+        for n in (3,3,4,1):
+            for i in range(n):
+                assert self.ring.write(makeEvent(event_id+i))
+            assert eventIds(self.reader.read()) == range(event_id,event_id+n)
+            event_id+=n
+
+    def test_overrun(self):
+        written=[self.ring.write(makeEvent(i)) for i in range(6)]
+        assert written == [True]*4+[False]*2
+        assert self.reader.spilled() == 2
+        assert self.reader.spilled() == 0
+        assert eventIds(self.reader.read()) == [0,1,2,3]
+        # the slots are free again once read
+        assert self.ring.write(makeEvent(6))
+        assert eventIds(self.reader.read()) == [6]
+
+    def test_clear(self):
+        self.ring.write(makeEvent(0))
+        self.reader.clear()
+        assert self.reader.read() == []
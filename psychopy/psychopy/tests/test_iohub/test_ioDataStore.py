@@ -0,0 +1,179 @@
+"""Tests for the event staging and table settings of psychopy.iohub.datastore"""
+import os
+import shutil
+from tempfile import mkdtemp
+import numpy as N
+import tables
+from gevent.event import Event
+
+from psychopy.iohub import datastore
+from psychopy.iohub.datastore import EventStagingBuffer, ioHubpyTablesFile
+
+EVENT_DTYPE=N.dtype([('event_id',N.uint32),('time',N.float64)])
+
+class FakeTable(object):
+    """Stands in for a PyTables event table."""
+    def __init__(self):
+        self.rows=[]
+        self.appends=0
+
+    def append(self,rows):
+        self.rows.extend(rows.tolist())
+        self.appends+=1
+
+class FakeEventClass(object):
+    IOHUB_DATA_TABLE='TEST_EVENT'
+    NUMPY_DTYPE=EVENT_DTYPE
+
+class FakeFile(object):
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed=True
+
+def makeEvents(first,last):
+    return [[i,i/10.0] for i in range(first,last)]
+
+class TestEventStagingBuffer:
+    def setup_method(self, method):
+        self.table=FakeTable()
+        self.buffer=EventStagingBuffer(self.table,EVENT_DTYPE,3)
+
+    def test_full_at_capacity(self):
+        assert [self.buffer.add(e) for e in makeEvents(0,3)] == [False,False,True]
+        staged=self.buffer.detach()
+        assert staged.tolist() == [(0,0.0),(1,0.1),(2,0.2)]
+        assert self.buffer.count == 0
+        # the detached events are not overwritten by new ones
+        self.buffer.add([3,0.3])
+        assert staged.tolist()[0] == (0,0.0)
+
+    def test_write(self):
+        for e in makeEvents(0,2):
+            self.buffer.add(e)
+        assert self.buffer.write() == 2
+        assert self.buffer.write() == 0
+        assert self.table.rows == [(0,0.0),(1,0.1)]
+        assert self.table.appends == 1
+
+class TestStagedEvents:
+    def setup_method(self, method):
+        self.table=FakeTable()
+        store=ioHubpyTablesFile.__new__(ioHubpyTablesFile)
+        store.settings={}
+        store.flushCounter=-1
+        store._eventCounter=0
+        store.stagingBufferLength=2
+        store._stagingBuffers=dict()
+        store._fullStagingBuffers=[]
+        store._writeStagedEventsNow=Event()
+        store.TABLES={'TEST_EVENT':self.table}
+        store._eventGroupMappings=dict()
+        store.emrtFile=FakeFile()
+        self.store=store
+
+    def stage(self,events):
+        for event in events:
+            self.store._stageEvent(FakeEventClass,event)
+
+    def test_flush_at_capacity(self):
+        self.stage(makeEvents(0,1))
+        assert not self.store._writeStagedEventsNow.is_set()
+        self.stage(makeEvents(1,5))
+        # full buffers are handed to the writer, which is woken up
+        assert self.store._writeStagedEventsNow.is_set()
+        assert len(self.store._fullStagingBuffers) == 2
+        assert self.table.rows == []
+        self.stage(makeEvents(5,6))
+        assert self.store.writeStagedEvents() == 6
+        assert [row[0] for row in self.table.rows] == range(6)
+        assert self.store.writeStagedEvents() == 0
+
+    def test_yield_between_buffers(self, monkeypatch):
+        written=[]
+        def sleep(seconds):
+            written.append(len(self.table.rows))
+            if len(written) == 1:
+                self.stage(makeEvents(5,7))
+        monkeypatch.setattr(datastore.gevent,'sleep',sleep)
+        self.stage(makeEvents(0,5))
+        assert self.store.writeStagedEvents() == 7
+        # other greenlets get a turn after each buffer, and events staged
+        # meanwhile are still written in order
+        assert written == [2,4,6,7]
+        assert [row[0] for row in self.table.rows] == range(7)
+
+    def test_flush_at_close(self):
+        emrtFile=self.store.emrtFile
+        self.stage(makeEvents(0,3))
+        self.store.close()
+        assert [row[0] for row in self.table.rows] == range(3)
+        assert emrtFile.closed
+        assert self.store.emrtFile is None
+        # closing again, as __del__ does, is harmless
+        self.store.close()
+
+    def test_index_on_close(self, monkeypatch):
+        indexed=[]
+        monkeypatch.setattr(self.store,'indexEventTables',lambda: indexed.append(True))
+        self.store.settings={'event_tables':{'index_on_close':True}}
+        self.store.close()
+        assert indexed == [True]
+
+    def test_no_index_on_close(self, monkeypatch):
+        indexed=[]
+        monkeypatch.setattr(self.store,'indexEventTables',lambda: indexed.append(True))
+        self.store.close()
+        assert indexed == []
+
+class TestEventTables:
+    def setup_class(self):
+        self.temp_dir = mkdtemp(prefix='psychopy-tests-iohub')
+
+    def teardown_class(self):
+        shutil.rmtree(self.temp_dir)
+
+    def makeStore(self,event_tables):
+        store=ioHubpyTablesFile.__new__(ioHubpyTablesFile)
+        store.settings={'event_tables':event_tables}
+        return store
+
+    def test_settings(self):
+        store=self.makeStore({'complib':'zlib','complevel':5,'shuffle':False,
+                              'chunk_rows':128,'indexed_columns':['time']})
+        dfilter,chunkshape,indexed_columns=store._getEventTableSettings()
+        assert (dfilter.complib,dfilter.complevel,dfilter.shuffle) == ('zlib',5,False)
+        assert chunkshape == (128,)
+        assert indexed_columns == ['time']
+
+    def test_default_settings(self):
+        dfilter,chunkshape,indexed_columns=self.makeStore({})._getEventTableSettings()
+        assert dfilter.complevel == 0
+        assert chunkshape is None
+        assert indexed_columns == []
+
+    def test_unknown_compression_library(self):
+        store=self.makeStore({'complib':'nope','complevel':5})
+        dfilter,chunkshape,indexed_columns=store._getEventTableSettings()
+        assert (dfilter.complib,dfilter.complevel) == ('zlib',5)
+
+    def test_index_tables(self):
+        h5=tables.openFile(os.path.join(self.temp_dir,'events.hdf5'),'w')
+        try:
+            etable=h5.createTable('/','events',EVENT_DTYPE)
+            etable.append(N.array(map(tuple,makeEvents(0,10)),dtype=EVENT_DTYPE))
+            empty=h5.createTable('/','empty',EVENT_DTYPE)
+            store=self.makeStore({'indexed_columns':['time','missing']})
+            store.TABLES={'TEST_EVENT':etable,'EMPTY_EVENT':empty}
+            store._eventGroupMappings={'TEST_EVENT':None,'EMPTY_EVENT':None}
+            store.indexEventTables()
+            assert etable.cols.time.index is not None
+            assert etable.cols.event_id.index is None
+            assert empty.cols.time.index is None
+            # indexes are brought up to date when indexing again
+            etable.append(N.array(map(tuple,makeEvents(10,12)),dtype=EVENT_DTYPE))
+            store.indexEventTables()
+            assert etable.cols.time.index.nelements == 12
+        finally:
+            h5.close()
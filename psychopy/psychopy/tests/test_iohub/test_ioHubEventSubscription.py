@@ -0,0 +1,76 @@
+"""Tests for pushing subscribed events from the ioHub Server to the client"""
+from collections import deque
+
+from psychopy.iohub.server import EventSubscription
+from psychopy.iohub.client import ioHubEventSubscription
+
+CLIENT_ADDRESS=('127.0.0.1',9035)
+
+class FakeSubscriptionConnection(object):
+    """
+    Stands in for both ends of a subscription's UDP socket: the server's
+    udpService sends pushes to it, and the client receives them. Pushes
+    can be dropped, as lost datagrams would be.
+    """
+    def __init__(self):
+        self.pushes=deque()
+        self.dropped=0
+        self.drop_next=0
+
+    def sendResponse(self,data,address):
+        assert address == CLIENT_ADDRESS
+        if self.drop_next:
+            self.drop_next-=1
+            self.dropped+=1
+            return
+        self.pushes.append(data)
+
+    def receive(self,timeout):
+        if self.pushes:
+            return self.pushes.popleft(),('127.0.0.1',9034)
+        return None
+
+class TestEventSubscription:
+    def setup_method(self, method):
+        self.connection=FakeSubscriptionConnection()
+        self.publisher=EventSubscription(self.connection,1,CLIENT_ADDRESS)
+        self.subscription=ioHubEventSubscription.__new__(ioHubEventSubscription)
+        self.subscription._connection=self.connection
+        self.subscription._sequence_number=0
+        self.subscription.missed=0
+
+    def push(self,*events):
+        for event in events:
+            self.publisher._handleEvent([event])
+
+    def test_push(self):
+        assert self.subscription.getEvents(as_type='list') == []
+        self.push(1,2,3)
+        assert [p[2] for p in self.connection.pushes] == [1,2,3]
+        assert self.subscription.getEvents(as_type='list') == [[1],[2],[3]]
+        assert self.subscription.missed == 0
+
+    def test_sequence_gaps(self):
+        self.push(1)
+        self.connection.drop_next=2
+        self.push(2,3,4)
+        assert self.subscription.getEvents(as_type='list') == [[1],[4]]
+        assert self.subscription.missed == 2
+        # gaps are also found across calls
+        self.connection.drop_next=1
+        self.push(5,6)
+        assert self.subscription.getEvents(as_type='list') == [[6]]
+        assert self.subscription.missed == 3
+        assert self.connection.dropped == self.subscription.missed
+
+    def test_late_push(self):
+        self.push(1,2,3)
+        late=self.connection.pushes[1]
+        del self.connection.pushes[1]
+        self.connection.pushes.append(late)
+        events=self.subscription.getEvents(as_type='list')
+        assert sorted(events) == [[1],[2],[3]]
+        assert self.subscription.missed == 0
+        self.push(4)
+        assert self.subscription.getEvents(as_type='list') == [[4]]
+        assert self.subscription.missed == 0
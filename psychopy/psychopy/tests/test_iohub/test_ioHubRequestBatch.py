@@ -0,0 +1,137 @@
+"""Tests for the batched requests of psychopy.iohub.client.ioHubConnection"""
+from collections import deque
+from pytest import raises
+
+from psychopy.iohub import client
+from psychopy.iohub.client import ioHubConnection
+from psychopy.iohub.util import ioHubServerError
+
+class FakeUDPClient(object):
+    """
+    Stands in for the UDP connection to the ioHub Server. Each request is
+    answered as the server would, and the reply is kept until the client
+    receives it, so several batches can be waiting for their replies.
+    Replies are received in the order they were sent, or, if lifo is
+    True, newest first. A batch holding a 'crash' request is answered
+    with an error for the whole batch.
+    """
+    def __init__(self,lifo=False):
+        self.sent=[]
+        self.replies=deque()
+        self.lifo=lifo
+
+    def pack(self,message):
+        return repr(message)
+
+    def sendTo(self,message):
+        self.sent.append(message)
+        if message[0] == 'BATCH' and ('RPC','crash') in message[2]:
+            reply=('IOHUB_SERVER_ERROR','BATCH_RUNTIME_ERROR',dict(request_id=message[1]))
+        elif message[0] == 'BATCH':
+            reply=('BATCH_RESULT',message[1],[self._reply(m) for m in message[2]])
+        else:
+            reply=self._reply(message)
+        self.replies.append(reply)
+        return len(self.pack(message))
+
+    def receive(self):
+        if self.lifo:
+            return self.replies.pop(),('127.0.0.1',9034)
+        return self.replies.popleft(),('127.0.0.1',9034)
+
+    def _reply(self,message):
+        if message[1] == 'fail':
+            return ('RPC_ERROR','failed')
+        return ('RPC_RESULT',message[2][0])
+
+def echo(value):
+    return ('RPC','echo',(value,))
+
+class TestioHubRequestBatch:
+    def setup_method(self, method):
+        self.udp=FakeUDPClient()
+        self.hub=ioHubConnection.__new__(ioHubConnection)
+        self.hub.udp_client=self.udp
+        self.hub._requestBatch=None
+        self.hub._pendingReplies=dict()
+        self.hub._lastRequestID=0
+
+    def test_unbatched(self):
+        assert self.hub._sendOrQueueToHubServer(echo(1)) == ('RPC_RESULT',1)
+
+    def test_batch_is_sent_on_exit(self):
+        with self.hub.batch():
+            futures=[self.hub._sendOrQueueToHubServer(echo(i)) for i in range(3)]
+            assert self.udp.sent == []
+        assert len(self.udp.sent) == 1
+        assert self.udp.sent[0][2] == [echo(i) for i in range(3)]
+        assert not any(f.done() for f in futures)
+        assert [f.result() for f in futures] == [('RPC_RESULT',i) for i in range(3)]
+        assert all(f.done() for f in futures)
+
+    def test_error_reply(self):
+        with self.hub.batch():
+            first=self.hub._sendOrQueueToHubServer(echo(1))
+            failed=self.hub._sendOrQueueToHubServer(('RPC','fail'))
+            last=self.hub._sendOrQueueToHubServer(echo(3))
+        with raises(ioHubServerError):
+            failed.result()
+        assert first.result() == ('RPC_RESULT',1)
+        assert last.result() == ('RPC_RESULT',3)
+
+    def test_split_batch_replies(self, monkeypatch):
+        # room for two requests per datagram
+        monkeypatch.setattr(client,'MAX_REQUEST_SIZE',64+2*len(repr(echo(0))))
+        self.udp.lifo=True
+        with self.hub.batch():
+            futures=[self.hub._sendOrQueueToHubServer(echo(i)) for i in range(5)]
+        assert [len(message[2]) for message in self.udp.sent] == [2,2,1]
+        # the replies arrive out of order, but each goes to its own future
+        assert futures[0].result() == ('RPC_RESULT',0)
+        assert all(f.done() for f in futures)
+        assert [f.result() for f in futures] == [('RPC_RESULT',i) for i in range(5)]
+
+    def test_pipelined_request(self):
+        with self.hub.batch():
+            future=self.hub._sendOrQueueToHubServer(echo(1))
+        # replies to the batch are received before the reply to the request
+        assert self.hub._sendToHubServer(echo(2)) == ('RPC_RESULT',2)
+        assert future.done()
+        assert future.result() == ('RPC_RESULT',1)
+
+    def test_result_in_batch(self):
+        with self.hub.batch():
+            future=self.hub._sendOrQueueToHubServer(echo(1))
+            # asking for a result sends the requests queued so far
+            assert future.result() == ('RPC_RESULT',1)
+            later=self.hub._sendOrQueueToHubServer(echo(2))
+        assert later.result() == ('RPC_RESULT',2)
+        assert len(self.udp.sent) == 2
+
+    def test_batch_error_reply(self, monkeypatch):
+        # room for two requests per datagram
+        monkeypatch.setattr(client,'MAX_REQUEST_SIZE',64+2*len(repr(echo(0))))
+        with self.hub.batch():
+            futures=[self.hub._sendOrQueueToHubServer(echo(i)) for i in range(2)]
+            futures.append(self.hub._sendOrQueueToHubServer(('RPC','crash')))
+            futures+=[self.hub._sendOrQueueToHubServer(echo(i)) for i in range(3,5)]
+        with raises(ioHubServerError):
+            self.hub._receiveReplies()
+        # the batches after the failed one were still received
+        assert self.hub._pendingReplies == {}
+        assert all(f.done() for f in futures)
+        for f in futures[2:4]:
+            with raises(ioHubServerError):
+                f.result()
+        assert [f.result() for f in futures[:2]+futures[4:]] == [('RPC_RESULT',i) for i in (0,1,4)]
+
+    def test_unmatched_error_reply(self):
+        with self.hub.batch():
+            future=self.hub._sendOrQueueToHubServer(echo(1))
+        self.udp.replies[0]=('IOHUB_SERVER_ERROR','UNKNOWN_ERROR',{})
+        with raises(ioHubServerError):
+            self.hub._sendToHubServer(echo(2))
+        # with no batch to blame, every pending batch fails
+        assert self.hub._pendingReplies == {}
+        with raises(ioHubServerError):
+            future.result()
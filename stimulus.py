@@ -3,11 +3,30 @@
 Psychopy stimuli.
 """
 import os
+import csv
+import json
 import time
-from inspect import ismethod
+import sys
+import atexit
+import select
+import ctypes
+import threading
+import Queue
+import hashlib
+import weakref
+import copy
+from inspect import ismethod, getcallargs
+from collections import OrderedDict
+
+import numpy
+import pyglet
 
 from psychopy import core, visual, event, logging
 from psychopy.sound import Sound
+try:
+    import yaml
+except ImportError:
+    import tablib.packages.yaml as yaml
 
 class Paradigm(object):
     """Represents a study paradigm.
@@ -17,6 +36,11 @@ class Paradigm(object):
                         dataset=None, format="csv",
                         destination="data.csv",
                         unique=False,
+                        preload=0, max_preloaded=None,
+                        frame_accurate=False,
+                        stream=False, batch_size=1, fsync=False,
+                        background=False, max_queue_size=1000,
+                        profile=False, profile_destination=None,
                         *args, **kwargs):
         '''Initialize a paradigm.
 
@@ -32,6 +56,31 @@ class Paradigm(object):
         destination - Where to save the data. Defaults to data-[timestamp].csv.
         unique - Whether or not to use a timestamp (epoch) as a unique identifier
                     for a dataset file.
+        preload - Number of upcoming stimuli to instantiate ahead of time, 
+                    while the current stimulus is on screen. Defaults to 0 
+                    (no preloading). Preloading is done while a stimulus 
+                    waits (see Stimulus.idles), so preload should cover the
+                    longest run of stimuli that don't wait (e.g. videos).
+        max_preloaded - Maximum number of stimulus objects kept preloaded
+                    at once. This is a count of stimuli, not a memory size.
+                    Defaults to the value of preload.
+        frame_accurate - Whether to present stimulus durations as a whole 
+                    number of screen refreshes (see Stimulus.wait_frames).
+        stream - Whether to write each stimulus' data to the destination
+                    file as soon as the stimulus is finished, instead of 
+                    saving the whole dataset at the end. Streamed rows are 
+                    not kept in the dataset. Not supported for "xlsx".
+        batch_size - When streaming, the number of rows to collect before 
+                    writing them to the file.
+        fsync - When streaming, whether to force each write to disk.
+        background - Whether to stream data from a background thread 
+                    (see BackgroundWriter). Implies stream.
+        max_queue_size - The number of rows that can wait to be written by
+                    the background thread before the paradigm blocks.
+        profile - Whether to time each phase of presenting each stimulus
+                    (see Profiler). A JSON report is written by play_all().
+        profile_destination - Where to save the profiling report. Defaults 
+                    to the data destination, with a "-profile.json" suffix.
         '''
         if window_dimensions in ['full_screen', 'fullscr']:
             self.window = visual.Window(fullscr=True, 
@@ -57,8 +106,36 @@ class Paradigm(object):
             fname = destination
         self.destination = fname
 
+        stream = stream or background
+        if stream and self.format not in DataWriter.formats:
+            raise ValueError, "Streaming is not supported for format '{0}'".format(format)
+        self.stream = stream
+        self.background = background
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.writer = None  # Created when the first row is streamed
+
+        self.profiler = Profiler() if profile else None
+        if profile_destination is None:
+            profile_destination = os.path.splitext(self.destination)[0] + '-profile.json'
+        self.profile_destination = profile_destination
+
         self.stim_idx = 0  # Used to track which stimulus is playing
 
+        self.preload = int(preload)
+        self.max_preloaded = self.preload if max_preloaded is None else int(max_preloaded)
+        # Stimulus objects that are ready to be shown, keyed by index
+        self.preloaded = {}
+        # List of (index, seconds) tuples: time elapsed between the request
+        # to play a stimulus and the call to its show() method
+        self.show_gaps = []
+
+        self.frame_accurate = frame_accurate
+        # List of (index, onset, offset, dropped_frames) tuples for each
+        # stimulus that reports its onset
+        self.presentation_times = []
+
     def __iter__(self):
         return iter(self.stimuli)
 
@@ -85,20 +162,32 @@ class Paradigm(object):
         for stimulus in stimuli:
             self.add_stimulus(stimulus)
 
+    def load_stimuli(self, path, classes=None, use_cache=True, cache_dir=None):
+        '''Adds the stimuli defined in a paradigm file.
+        See load_paradigm for the file format.
+        '''
+        self.add_stimuli(load_paradigm(path, classes=classes, use_cache=use_cache,
+                                        cache_dir=cache_dir))
+
     def play_all(self, save_dataset=True, quit=True):
         '''Plays all the stimuli in sequence.
         This simply runs the show() method for each stimuli 
         in self.stimuli, then quits.
         '''
+        self.preload_stimuli()
         for stim in self:
             if self.escape_key in event.getKeys():
                 break
             self.play_stimulus(stim)
 
-        if save_dataset and self.dataset:
-            # Save the data if it exists
+        if self.writer or (save_dataset and self.dataset):
+            # Save the data if it exists. Streamed data is always saved,
+            # since it is already in the file; this finalizes it.
             self.write_data()
             logging.info("Saved dataset to {0}".format(self.destination))
+        if self.profiler:
+            self.profiler.write_report(self.profile_destination)
+            logging.info("Saved profiling report to {0}".format(self.profile_destination))
         if quit: core.quit()
         logging.info("Finished playing stimuli.")
 
@@ -106,15 +195,7 @@ class Paradigm(object):
         '''Plays the next stimuli in the sequence.
         '''
         if len(self.stimuli) > 0:
-            stim_data = self.stimuli[self.stim_idx] # The next stimulus tuple
-            # Instantiate the stimulus object
-            stim = self.initialize_stimulus(stim_data)
-            # Show the stimulus
-            logging.exp("Showing stimulus {0}: {1}".format(self.stim_idx, stim))
-            stim.show()
-            self.append_stim_data(stim)
-            self.stim_idx += 1
-            return stim
+            return self.show_stimulus(self.stim_idx)
         # If there are no more stimuli
         else:
             raise IndexError, "There are no stimuli to be played"
@@ -129,18 +210,86 @@ class Paradigm(object):
         '''
         if type(stim) == int:
             index = stim
-            stim_data = self.stimuli[stim]
         elif type(stim) in (list, tuple):
-            index = self.stimuli.index(stim)
-            stim_data = stim
+            # Prefer the next occurrence, in case a stimulus is repeated
+            try:
+                index = self.stimuli.index(stim, self.stim_idx)
+            except ValueError:
+                index = self.stimuli.index(stim)
         else:
             raise ValueError, "'stim' argument must be either an integer, list, or tuple"
-        stim = self.initialize_stimulus(stim_data)
+        self.show_stimulus(index)
+        return True
+
+    def show_stimulus(self, index):
+        '''Shows the stimulus at a given index in self.stimuli, using 
+        a preloaded stimulus object if one is available. Returns the 
+        stimulus object.
+        '''
+        requested = core.getTime()
+        stim = self.preloaded.pop(index, None)
+        if stim is None:
+            stim = self.create_stimulus(index)
+        if stim.idles:
+            # Preload the upcoming stimuli while this one is on screen.
+            # Stimuli that don't wait are preloaded by the ones before them.
+            stim.on_idle = lambda: self.preload_stimuli(index + 1)
+        if self.frame_accurate:
+            stim.frame_accurate = True
+        if self.profiler:
+            self.profiler.index = index
+            stim.profiler = self.profiler
+        self.show_gaps.append((index, core.getTime() - requested))
+        start = core.getTime()
         logging.exp("Showing stimulus {0}: {1}".format(index, stim))
+        self.profile(stim, 'log', start, index)
+        start = core.getTime()
         stim.show()
+        self.profile(stim, 'show', start, index)
+        stim.on_idle = None
+        if stim.onset is not None:
+            self.presentation_times.append((index, stim.onset, stim.offset,
+                                            stim.dropped_frames))
+            logging.exp("Stimulus {0}: onset {1}, offset {2}, {3} dropped "
+                        "frames".format(index, stim.onset, stim.offset,
+                                        stim.dropped_frames))
+        start = core.getTime()
         self.append_stim_data(stim)
+        self.profile(stim, 'data', start, index)
         self.stim_idx = index + 1
-        return True
+        return stim
+
+    def create_stimulus(self, index):
+        '''Initializes the stimulus at a given index in self.stimuli.
+        '''
+        start = core.getTime()
+        stim = self.initialize_stimulus(self.stimuli[index])
+        self.profile(stim, 'initialize', start, index)
+        return stim
+
+    def profile(self, stim, phase, start, index):
+        '''Records a phase of a stimulus that started at a given time 
+        and ended now, if profiling.
+        '''
+        if self.profiler:
+            self.profiler.record(stim, phase, start, core.getTime(), index)
+        return None
+
+    def preload_stimuli(self, start=None):
+        '''Instantiates up to self.preload stimuli, beginning at index 
+        start (defaults to the next stimulus to be played), and evicts 
+        preloaded stimuli that come before start.
+        '''
+        start = self.stim_idx if start is None else start
+        for index in [i for i in self.preloaded if i < start]:
+            del self.preloaded[index]
+        stop = min(start + self.preload, len(self.stimuli))
+        for index in range(start, stop):
+            if len(self.preloaded) >= self.max_preloaded:
+                break
+            if index not in self.preloaded:
+                self.preloaded[index] = self.create_stimulus(index)
+        return None
 
     def append_stim_data(self, stim):
         '''Append a stimulus' data to this paradigm's dataset.
@@ -148,6 +297,9 @@ class Paradigm(object):
         return value to self.dataset.
         '''
         if has_method(stim, 'get_data'):
+            if self.stream:
+                self.stream_data(stim.get_data())
+                return True
             # Append the stimulus' data
             try:
                 self.dataset.append(stim.get_data())
@@ -157,7 +309,28 @@ class Paradigm(object):
                 pass
         return False
 
+    def stream_data(self, row):
+        '''Write a row of data to the destination file. The file is 
+        created when the first row is written, using the dataset's
+        headers if there are any.
+        '''
+        if self.writer is None:
+            headers = self.dataset.headers if self.dataset is not None else None
+            self.writer = DataWriter(self.destination, self.format, 
+                                    headers=headers,
+                                    batch_size=self.batch_size,
+                                    fsync=self.fsync)
+            if self.background:
+                self.writer = BackgroundWriter(self.writer, 
+                                            max_queue_size=self.max_queue_size)
+        self.writer.write(row)
+        return None
+
     def write_data(self):
+        if self.writer:
+            # The rows are already in the file, so just finalize it
+            self.writer.close()
+            return None
         with open(self.destination, 'wb') as fp:
             if self.format == 'csv':
                 fp.write(self.dataset.csv)
@@ -170,6 +343,8 @@ class Paradigm(object):
         return None
 
     def quit(self):
+        if self.writer:
+            self.writer.close()
         core.quit()
 
     def initialize_stimulus(self, stim_data):
@@ -180,6 +355,11 @@ class Paradigm(object):
         Args:
         stim_data - The stimulus and its arguments as a tuple
         '''
+        if len(stim_data) == 3:
+            # (StimulusType, (arguments), {keyword arguments}), e.g. from
+            # load_paradigm, needs no guessing
+            stim_class, stim_args, stim_kwargs = stim_data
+            return stim_class(self.window, *stim_args, **stim_kwargs)
         stim_class = stim_data[0] # The class of the stimulus
         # Get stim args if passed
         # If not, an empty tuple is passed to the stimulus constructor
@@ -195,11 +375,331 @@ class Paradigm(object):
         return stim_class(self.window, *stim_args, **stim_kwargs)
 
 
+class Profiler(object):
+    '''Records how long each phase of presenting each stimulus takes:
+    initialize (construction, which may happen while another stimulus is 
+    preloading), log, show, flip (each flip within show) and data (storing
+    the stimulus' data). Durations are summarized per stimulus type, with
+    histograms on a logarithmic scale.
+    '''
+    # Histogram bin edges, in seconds: 5 bins per decade, from 10 us to 10 s
+    bins = numpy.logspace(-5, 1, 31)
+
+    def __init__(self):
+        # (index, stimulus type, phase, start, duration) tuples
+        self.records = []
+        self.index = None  # Index of the stimulus being shown
+
+    def record(self, stim, phase, start, end, index=None):
+        '''Record a phase of a stimulus. Times are from core.getTime().
+        '''
+        if index is None:
+            index = self.index
+        self.records.append((index, type(stim).__name__, phase, start, end - start))
+        return None
+
+    def summary(self):
+        '''Returns a dict of {stimulus type: {phase: statistics}}.
+        '''
+        durations = {}
+        for index, stim_type, phase, start, duration in self.records:
+            durations.setdefault(stim_type, {}).setdefault(phase, []).append(duration)
+        summary = {}
+        for stim_type, phases in durations.items():
+            summary[stim_type] = {}
+            for phase, values in phases.items():
+                values = numpy.array(values)
+                counts = numpy.histogram(values, bins=self.bins)[0]
+                summary[stim_type][phase] = {
+                    'count': len(values),
+                    'total': float(values.sum()),
+                    'mean': float(values.mean()),
+                    'median': float(numpy.median(values)),
+                    'min': float(values.min()),
+                    'max': float(values.max()),
+                    'histogram': counts.tolist(),
+                }
+        return summary
+
+    def write_report(self, destination):
+        '''Write the summary and the raw records to a JSON file.
+        '''
+        report = {
+            'bins': self.bins.tolist(),
+            'summary': self.summary(),
+            'records': [dict(zip(('index', 'type', 'phase', 'start', 'duration'), 
+                                record)) for record in self.records],
+        }
+        with open(destination, 'wb') as fp:
+            json.dump(report, fp, indent=2)
+        return None
+
+
+class DataWriter(object):
+    '''Writes rows of data to a file as they are collected, so that a
+    crash doesn't lose the rows collected so far.
+
+    Rows are written as follows:
+    csv - one line per row, preceded by a line of headers.
+    json - a list of objects (or lists if there are no headers). The list is
+            closed by close().
+    yaml - one list item per row.
+    '''
+    formats = ('csv', 'json', 'yaml')
+
+    def __init__(self, destination, format='csv', headers=None, 
+                batch_size=1, fsync=False):
+        '''Initialize a writer.
+
+        Arguments:
+        destination - Path of the file to write.
+        format - One of ("csv", "json", or "yaml").
+        headers - (list, optional) Column names.
+        batch_size - The number of rows to collect before writing them.
+        fsync - Whether to force each write to disk.
+        '''
+        if format not in self.formats:
+            raise ValueError, "Unsupported streaming format '{0}'".format(format)
+        self.destination = destination
+        self.format = format
+        self.headers = list(headers) if headers else None
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.file = None
+        self.rows = []  # Rows that haven't been written yet
+        self.rows_written = 0
+        self.closed = False
+        # Finalize the file if the paradigm exits early (e.g. core.quit())
+        atexit.register(self.close)
+
+    def write(self, row):
+        '''Add a row. The row is written once batch_size rows 
+        are pending.
+        '''
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+        return None
+
+    def flush(self):
+        '''Write the pending rows to the file.
+        '''
+        if self.file is None:
+            self.open()
+        for row in self.rows:
+            self.write_row(row)
+            self.rows_written += 1
+        self.rows = []
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        return None
+
+    def close(self):
+        '''Write the pending rows and finalize the file. Calling close()
+        again does nothing.
+        '''
+        if self.closed:
+            return None
+        self.closed = True
+        try:
+            self.flush()
+            if self.format == 'json':
+                self.file.write('\n]\n' if self.rows_written else ']\n')
+            elif self.format == 'yaml' and not self.rows_written:
+                self.file.write('[]\n')
+        finally:
+            if self.file is not None:
+                self.file.close()
+        return None
+
+    def open(self):
+        self.file = open(self.destination, 'wb')
+        if self.format == 'csv':
+            self.csv = csv.writer(self.file)
+            if self.headers:
+                self.csv.writerow(self.headers)
+        elif self.format == 'json':
+            self.file.write('[')
+        return None
+
+    def write_row(self, row):
+        if self.format == 'csv':
+            self.csv.writerow(row)
+            return None
+        if self.headers:
+            row = OrderedDict(zip(self.headers, row))
+        else:
+            row = list(row)
+        if self.format == 'json':
+            separator = ',\n' if self.rows_written else '\n'
+            self.file.write(separator + json.dumps(row))
+            return None
+        # JSON objects are valid YAML flow collections
+        self.file.write('- ' + json.dumps(row) + '\n')
+        return None
+
+
+class BackgroundWriter(threading.Thread):
+    '''Writes rows through a DataWriter from a separate thread, so that
+    presenting stimuli never waits on disk I/O. Rows are passed through a
+    bounded queue: if the queue is full, write() blocks until there is room.
+
+    The queue is drained and the file finalized by close(), which is also
+    called at exit (e.g. after core.quit()).
+
+    If the DataWriter raises an error, the remaining rows are discarded and
+    the error is raised again by the next call to write() or close().
+    '''
+    _end = object()  # Queued by close() to end the thread
+
+    def __init__(self, writer, max_queue_size=1000):
+        '''Initialize and start the thread.
+
+        Arguments:
+        writer - A DataWriter.
+        max_queue_size - The number of rows that can wait to be written.
+        '''
+        threading.Thread.__init__(self, name='BackgroundWriter')
+        self.daemon = True
+        self.writer = writer
+        self.queue = Queue.Queue(maxsize=max_queue_size)
+        # Counters
+        self.max_depth = 0  # Most rows waiting in the queue
+        self.blocked_time = 0.0  # Seconds write() spent waiting for room
+        self.rows_written = 0
+        self.write_time = 0.0  # Seconds spent writing rows
+        self.max_write_time = 0.0
+        self.error = None  # sys.exc_info() of the first error, if any
+        self.closed = False
+        atexit.register(self.close)
+        self.start()
+
+    @property
+    def depth(self):
+        '''The number of rows waiting to be written.'''
+        return self.queue.qsize()
+
+    def write(self, row):
+        '''Queue a row to be written.
+        '''
+        self.raise_error()
+        start = core.getTime()
+        self.queue.put(row)
+        self.blocked_time += core.getTime() - start
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return None
+
+    def run(self):
+        while True:
+            row = self.queue.get()
+            if row is self._end:
+                break
+            if self.error:
+                # Keep draining, so that write() never blocks
+                continue
+            start = core.getTime()
+            try:
+                self.writer.write(row)
+            except Exception:
+                self.error = sys.exc_info()
+                logging.error("Background writing failed: {0!r}".format(self.error[1]))
+                continue
+            elapsed = core.getTime() - start
+            self.rows_written += 1
+            self.write_time += elapsed
+            self.max_write_time = max(self.max_write_time, elapsed)
+        try:
+            self.writer.close()
+        except Exception:
+            if not self.error:
+                self.error = sys.exc_info()
+
+    def close(self):
+        '''Write all queued rows, finalize the file and wait for the 
+        thread to finish.
+        '''
+        if self.closed:
+            return None
+        self.closed = True
+        self.queue.put(self._end)
+        self.join()
+        if self.rows_written:
+            logging.info("Wrote {0} rows in the background. Max queue depth: "
+                        "{1}, mean write time: {2:.6f} s, max write time: "
+                        "{3:.6f} s, time blocked on a full queue: {4:.6f} s".format(
+                            self.rows_written, self.max_depth, 
+                            self.write_time / self.rows_written,
+                            self.max_write_time, self.blocked_time))
+        self.raise_error()
+        return None
+
+    def raise_error(self):
+        '''Raise the error that stopped the writer, if any.
+        '''
+        if self.error:
+            raise self.error[0], self.error[1], self.error[2]
+        return None
+
+
+class SampleBuffer(object):
+    '''A growable NumPy array of samples (rows of numbers). Space is 
+    preallocated and doubled when it runs out, so appending a sample
+    doesn't allocate memory. If a sample isn't numeric (e.g. a string), 
+    the buffer is converted to an object array.
+    '''
+    def __init__(self, width=2, capacity=1024, dtype=float):
+        self.data = numpy.empty((capacity, width), dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, *values):
+        if self.size == len(self.data):
+            grown = numpy.empty((2 * len(self.data), self.data.shape[1]), 
+                                dtype=self.data.dtype)
+            grown[:self.size] = self.data
+            self.data = grown
+        try:
+            self.data[self.size] = values
+        except (ValueError, TypeError):
+            if self.data.dtype == object:
+                raise
+            self.data = self.data.astype(object)
+            self.data[self.size] = values
+        self.size += 1
+        return None
+
+    def clear(self):
+        self.size = 0
+        return None
+
+    @property
+    def array(self):
+        '''The samples, as a view of the buffer.'''
+        return self.data[:self.size]
+
+
 class Stimulus(object):
     """An abstract stimulus class. All stimulus types will inherit
     from this class.
     """
     index = True
+    # Called once by wait() while the stimulus is on screen. Set by 
+    # Paradigm to preload upcoming stimuli.
+    on_idle = None
+    # Whether show() calls wait(), and so runs the on_idle hook. If not,
+    # the stimulus is shown without preloading the ones after it.
+    idles = False
+    # If True, wait() counts screen refreshes instead of seconds
+    frame_accurate = False
+    # Presentation times, set by show() for stimuli that flip the window
+    onset = None
+    offset = None
+    dropped_frames = 0
+    # Set by Paradigm when profiling
+    profiler = None
 
     def __init__(self, window):
         self.window = window
@@ -214,12 +714,71 @@ class Stimulus(object):
         '''
         core.quit()
 
-    def flip(self):
-        '''Flips the window.
+    def draw(self):
+        '''Draw the stimulus for the next flip. Descendant classes 
+        that display something should implement this.'''
+        return None
+
+    def wait(self, duration, frame_accurate=None):
+        '''Waits for duration seconds. Any work done by the on_idle
+        hook counts towards the duration.
+
+        Arguments:
+        frame_accurate - Whether to count screen refreshes instead of 
+                seconds. Defaults to self.frame_accurate.
+        '''
+        if frame_accurate is None:
+            frame_accurate = self.frame_accurate
+        if frame_accurate:
+            return self.wait_frames(duration)
+        clock = core.Clock()
+        self.idle()
+        core.wait(max(duration - clock.getTime(), 0.0))
+        return None
+
+    def wait_frames(self, duration):
+        '''Presents the stimulus for duration seconds, rounded to a whole 
+        number of screen refreshes. The stimulus is redrawn and the window 
+        flipped on every refresh after the onset flip, so the next flip
+        lands on the offset refresh. Refreshes are counted from self.onset,
+        so dropped frames (counted in self.dropped_frames) don't add up 
+        to drift.
+        '''
+        rate = get_frame_rate(self.window)
+        n_frames = int(round(duration * rate))
+        onset = core.getTime() if self.onset is None else self.onset
+        self.idle()
+        last_flip = onset
+        while True:
+            now = core.getTime()
+            if int(round((now - onset) * rate)) + 1 >= n_frames:
+                break
+            self.draw()
+            flip_time = self.flip()
+            self.dropped_frames += max(int(round((flip_time - last_flip) * rate)) - 1, 0)
+            last_flip = flip_time
+        return None
+
+    def idle(self):
+        '''Runs the on_idle hook, at most once per stimulus.
         '''
-        self.window.flip()
+        if self.on_idle:
+            on_idle, self.on_idle = self.on_idle, None
+            on_idle()
         return None
 
+    def flip(self):
+        '''Flips the window. Returns the time of the flip.
+        '''
+        start = core.getTime()
+        flip_time = self.window.flip()
+        # Window.flip() only returns a time if waitBlanking is set
+        if flip_time is None:
+            flip_time = core.getTime()
+        if self.profiler:
+            self.profiler.record(self, 'flip', start, core.getTime())
+        return flip_time
+
     def display_text(self, text, flip=True, *args, **kwargs):
         text = visual.TextStim(self.window, text, *args, **kwargs)
         text.draw()
@@ -229,6 +788,8 @@ class Stimulus(object):
 class Text(Stimulus):
     '''A text stimulus.
     '''
+    idles = True
+
     def __init__(self, window, text, duration=2.0, 
                 keys=None, *args, **kwargs):
         '''Initialize a text stimulus.
@@ -249,13 +810,11 @@ class Text(Stimulus):
 
     def show(self):
         self.draw()
-        self.window.flip()
-        core.wait(self.duration)
+        self.onset = self.flip()
+        self.wait(self.duration)
         if self.keys:
             wait_for_key(self.keys)
-            self.window.flip()
-        else:
-            self.window.flip()
+        self.offset = self.flip()
         return super(Text, self).show()
 
     def draw(self):
@@ -276,6 +835,8 @@ class Image(Stimulus):
     Additional args and kwargs are passed to the visual.ImageStim
     constructor.
     '''
+    idles = True
+
     def __init__(self, window,
                     image, duration,
                     text=None, text_size=0.15, units="norm", keys=None,
@@ -294,13 +855,13 @@ class Image(Stimulus):
     def show(self):
         self.draw()
         # Show image
-        self.window.flip()
-        core.wait(self.duration)
+        self.onset = self.flip()
+        self.wait(self.duration)
         if self.keys:
             # Wait for keypress
             wait_for_key(self.keys)
         # Hide image
-        self.window.flip()
+        self.offset = self.flip()
         return super(Image, self).show()
 
     def draw(self):
@@ -308,8 +869,69 @@ class Image(Stimulus):
         if self.text: self.text.draw()
         return None
 
+class SoundCache(object):
+    '''A least recently used cache of sound.Sound objects, so that a sound 
+    that is used several times is only loaded (or synthesized) once. Sounds 
+    are keyed by their constructor arguments.
+    '''
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        '''Initialize the cache.
+
+        Arguments:
+        max_bytes - Maximum size of the cached sounds, estimated as 
+                    16-bit stereo samples.
+        '''
+        self.max_bytes = max_bytes
+        self.sounds = OrderedDict()  # key -> (sound, duration, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, value, secs=0.5, octave=4, *args, **kwargs):
+        '''Returns a (sound, duration) tuple. Arguments are passed to the
+        sound.Sound constructor.
+        '''
+        key = (value, kwargs.get('sampleRate', 44100), secs, octave, 
+                args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            # e.g. a numpy array of samples; not cached
+            sound = Sound(value, secs, octave, *args, **kwargs)
+            return sound, sound.getDuration()
+        if key in self.sounds:
+            # Move to the most recently used end
+            entry = self.sounds.pop(key)
+            self.sounds[key] = entry
+            self.hits += 1
+            return entry[:2]
+        self.misses += 1
+        sound = Sound(value, secs, octave, *args, **kwargs)
+        duration = sound.getDuration()
+        size = int(duration * sound.sampleRate) * 4
+        self.sounds[key] = (sound, duration, size)
+        self.size += size
+        # Evict the least recently used sounds, but keep the new one
+        while self.size > self.max_bytes and len(self.sounds) > 1:
+            evicted = self.sounds.popitem(last=False)[1]
+            self.size -= evicted[2]
+        return sound, duration
+
+    def clear(self):
+        self.sounds.clear()
+        self.size = 0
+        return None
+
+# Shared by all Audio stimuli
+sound_cache = SoundCache()
+
+
 class Audio(Stimulus):
     '''A simple audio stimulus.'''
+    idles = True
+    # The SoundCache to load sounds from. Set to None to load every sound.
+    cache = sound_cache
+
     def __init__(self, window,
                     sound,
                     text=None,
@@ -327,29 +949,47 @@ class Audio(Stimulus):
         sound.Sound constructor.
         '''
         super(Audio, self).__init__(window)
-        self.sound = Sound(sound, *args, **kwargs)
+        if self.cache is not None:
+            self.sound, self.duration = self.cache.get(sound, *args, **kwargs)
+        else:
+            self.sound = Sound(sound, *args, **kwargs)
+            self.duration = self.sound.getDuration()
         self.text = text
 
     def show(self):
+        self.sound.play()
+        started = core.getTime()
+        # Show the text while the sound plays, rather than before it
         self.display_text(self.text)
-        self.play_sound()
+        self.wait_for_sound(started)
         return super(Audio, self).show()
 
     def play_sound(self):
         self.sound.play()
-        core.wait(self.sound.getDuration())
+        self.wait_for_sound(core.getTime())
+        return None
+
+    def wait_for_sound(self, started):
+        '''Waits until the sound, started at a given time, is finished.
+        '''
+        # The sound's duration is kept by the audio clock, not the screen
+        self.wait(self.duration - (core.getTime() - started), frame_accurate=False)
         return None
 
 class Video(Stimulus):
     '''A basic video stimulus.
     '''
-    def __init__(self, window, movie, movie_dimensions=None, *args, **kwargs):
+    def __init__(self, window, movie, movie_dimensions=None, decode_ahead=0, 
+                *args, **kwargs):
         '''Constructor for the Video stimulus.
 
         Arguments:
             movie - A filename (string) for the video file.
             movie_dimensions - Movie dimensions. If not specified, defaults to
                         50\% of the window area.
+            decode_ahead - Number of video frames to decode ahead of playback
+                        in a background thread (see DecodeAheadMovieStim).
+                        Defaults to 0 (frames are decoded while drawing).
         '''
         super(Video, self).__init__(window)
         movie_dims = None
@@ -358,23 +998,258 @@ class Video(Stimulus):
         else:
             # Default movie to half of the window area
             movie_dims = (self.window.size[0] / 2, self.window.size[1] / 2)
-        self.mov = visual.MovieStim(self.window, movie, size=movie_dims,
+        self.mov = self.load_movie(movie, decode_ahead, size=movie_dims,
                                     flipVert=False, loop=False, *args, **kwargs)
 
+    def load_movie(self, movie, decode_ahead=0, *args, **kwargs):
+        '''Returns a visual.MovieStim for a movie file, or a 
+        DecodeAheadMovieStim if decode_ahead is set.
+        '''
+        if decode_ahead:
+            return DecodeAheadMovieStim(self.window, movie, 
+                                        buffer_size=decode_ahead, *args, **kwargs)
+        return visual.MovieStim(self.window, movie, *args, **kwargs)
+
     def show(self):
         '''Show the stimulus (movie).
         '''
         while self.mov.status != visual.FINISHED:
             self.mov.draw()
-            self.window.update()
-        self.window.flip()
+            self.flip()
+        self.flip()
+        self.report_playback()
         return super(Video, self).show()
 
+    def report_playback(self):
+        '''Logs decoding statistics, if the movie was decoded ahead.
+        '''
+        if isinstance(self.mov, DecodeAheadMovieStim):
+            stats = self.mov.get_stats()
+            self.dropped_frames = stats['dropped_frames']
+            logging.exp("Played {filename}: {frames_shown} frames shown, "
+                        "{dropped_frames} dropped, mean decode time "
+                        "{mean_decode_time:.6f} s, max decode time "
+                        "{max_decode_time:.6f} s".format(**stats))
+        return None
+
+
+class FrameDecoder(threading.Thread):
+    '''Decodes the video frames of a movie file into a bounded queue, 
+    ahead of playback. Queued items are (timestamp, image) tuples, followed
+    by FrameDecoder.end at the end of the movie.
+    '''
+    end = object()
+
+    def __init__(self, source, buffer_size=30):
+        '''Initialize and start the thread.
+
+        Arguments:
+        source - The movie file, or a pyglet media source.
+        buffer_size - The number of frames to decode ahead.
+        '''
+        threading.Thread.__init__(self, name='FrameDecoder')
+        self.daemon = True
+        if isinstance(source, basestring):
+            source = pyglet.media.load(source, streaming=True)
+        self.source = source
+        self.frames = Queue.Queue(maxsize=buffer_size)
+        self.stopped = False
+        # Counters
+        self.frames_decoded = 0
+        self.decode_time = 0.0  # Seconds spent decoding frames
+        self.max_decode_time = 0.0
+        self.start()
+
+    def run(self):
+        while not self.stopped:
+            start = core.getTime()
+            timestamp = self.source.get_next_video_timestamp()
+            if timestamp is None:
+                break
+            image = self.source.get_next_video_frame()
+            elapsed = core.getTime() - start
+            self.frames_decoded += 1
+            self.decode_time += elapsed
+            self.max_decode_time = max(self.max_decode_time, elapsed)
+            self.frames.put((timestamp, image))
+        self.frames.put(self.end)
+
+    def stop(self):
+        '''Stop decoding and discard the decoded frames.
+        '''
+        self.stopped = True
+        # Make room in case the thread is waiting on a full queue
+        while self.is_alive():
+            try:
+                self.frames.get(timeout=0.01)
+            except Queue.Empty:
+                pass
+        return None
+
+
+class DecodeAheadMovieStim(visual.MovieStim):
+    '''A visual.MovieStim whose video frames are decoded ahead of the 
+    playhead by a FrameDecoder thread, so that draw() only uploads the 
+    current frame to a texture. Frames that are decoded too late to be 
+    shown are skipped and counted as dropped. Sound is played by the 
+    MovieStim's player, from a second source that has its video stripped,
+    so the player never decodes video frames. Looping is not supported.
+    '''
+    def __init__(self, win, filename="", buffer_size=30, *args, **kwargs):
+        self.buffer_size = buffer_size
+        visual.MovieStim.__init__(self, win, filename, *args, **kwargs)
+        self.clock = core.Clock()  # Reset when the movie starts playing
+        self._texture = None
+        self._next_frame = None  # The next (timestamp, image) to be shown
+        self.frames_shown = 0
+        self.dropped_frames = 0
+
+    def loadMovie(self, filename, log=True):
+        '''Start decoding the video frames of a movie file, and queue its 
+        sound on the player. See visual.MovieStim.loadMovie.
+        '''
+        self.decoder = FrameDecoder(filename, self.buffer_size)
+        # The decoder's source provides the video format and duration
+        self._movie = self.decoder.source
+        self.duration = self._movie.duration
+        sound = pyglet.media.load(filename, streaming=True)
+        if sound.audio_format is not None:
+            strip_video(sound)
+            self._player.queue(sound)
+            while self._player.source is not sound:
+                self._player.next()
+        self.status = visual.NOT_STARTED
+        self._player.pause()  # Start playing on the next draw()
+        self.filename = filename
+        if log and self.autoLog:
+            self.win.logOnFlip("Set %s movie=%s" % (self.name, filename),
+                                level=logging.EXP, obj=self)
+
+    def draw(self, win=None):
+        '''Draw the current frame. See visual.MovieStim.draw.
+        '''
+        if self.status == visual.NOT_STARTED:
+            self.play()
+            self.clock.reset()
+        elif self.status == visual.FINISHED:
+            return
+
+        image = self._get_due_frame()
+        if self.status == visual.FINISHED:
+            return
+
+        if win==None: win=self.win
+        self._selectWindow(win)
+
+        #make sure that textures are on and GL_TEXTURE0 is active
+        GL = pyglet.gl
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glEnable(GL.GL_TEXTURE_2D)
+        if image is not None:
+            self._upload(image)
+        if self._texture is None:
+            return
+
+        desiredRGB = self._getDesiredRGB(self.rgb, self.colorSpace, 1)  #Contrast=1
+        GL.glColor4f(desiredRGB[0],desiredRGB[1],desiredRGB[2],self.opacity)
+        GL.glPushMatrix()
+        self.win.setScale(self._winScale)
+        GL.glTranslatef(self._posRendered[0],self._posRendered[1],0)
+        GL.glRotatef(-self.ori,0.0,0.0,1.0)
+        flipBitX = 1-self.flipHoriz*2
+        flipBitY = 1-self.flipVert*2
+        self._texture.blit(
+                -self._sizeRendered[0]/2.0*flipBitX,
+                -self._sizeRendered[1]/2.0*flipBitY,
+                width=self._sizeRendered[0]*flipBitX,
+                height=self._sizeRendered[1]*flipBitY,
+                z=0)
+        GL.glPopMatrix()
+
+    def _get_due_frame(self):
+        '''Returns the latest decoded image that is due to be shown, or None
+        if there is no new image to show. Sets the status to FINISHED at the 
+        end of the movie.
+        '''
+        now = self.clock.getTime()
+        image = None
+        while True:
+            if self._next_frame is None:
+                try:
+                    self._next_frame = self.decoder.frames.get_nowait()
+                except Queue.Empty:
+                    # The decoder is behind; keep showing the current frame
+                    return image
+            if self._next_frame is FrameDecoder.end:
+                if image is None:
+                    self._finish()
+                return image
+            timestamp, frame = self._next_frame
+            if timestamp > now:
+                return image
+            if image is not None:
+                self.dropped_frames += 1
+            image = frame
+            self._next_frame = None
+
+    def _upload(self, image):
+        if self._texture is None:
+            # Same as pyglet's media player
+            self._texture = pyglet.image.Texture.create(image.width, image.height,
+                                                        rectangle=True)
+            self._texture = self._texture.get_transform(flip_y=True)
+            self._texture.anchor_y = 0
+        self._texture.blit_into(image, 0, 0, 0)
+        self.frames_shown += 1
+
+    def _onEos(self):
+        # The movie is finished when the decoded frames run out, not 
+        # when the sound does
+        pass
+
+    def _finish(self):
+        self._player.pause()
+        self.decoder.stop()
+        self.status = visual.FINISHED
+
+    def get_stats(self):
+        '''Returns a dict of playback statistics.
+        '''
+        decoder = self.decoder
+        return {
+            'filename': self.filename,
+            'frames_shown': self.frames_shown,
+            'dropped_frames': self.dropped_frames,
+            'frames_decoded': decoder.frames_decoded,
+            'mean_decode_time': decoder.decode_time / max(decoder.frames_decoded, 1),
+            'max_decode_time': decoder.max_decode_time,
+        }
+
+
+def strip_video(source):
+    '''Makes a pyglet media source audio-only, so that a player doesn't
+    decode (or, with AVbin, buffer) its video frames.
+    '''
+    source.video_format = None
+    # AVbin sources only keep the packets of the streams they know of
+    if getattr(source, '_video_stream', None) is not None:
+        source._video_stream = None
+        source._video_stream_index = None
+    return source
+
 
 class VideoRating(Video):
     '''A stimulus with simultaneous video playback and valence rating (Likert).
     Ratings are saved to a CSV file in where each row is of the format: Rating,Time
+
+    Additional arguments:
+    sample_every_frame - If True, the rating is recorded on every frame. 
+                Otherwise, it is recorded only when it changes.
+    history_format - Format of the rating history file. Can be one of 
+                ("csv", "npy", or "hdf5"). "hdf5" requires PyTables.
     '''
+    history_formats = ('csv', 'npy', 'hdf5')
+
     # labels on either side of the scale.
     def __init__(self, window, movie, destination_path, 
                 movie_dimensions=(1, 1), units='norm',
@@ -386,12 +1261,17 @@ class VideoRating(Video):
                 marker_style='triangle', marker_color='White', marker_start=5,
                 low=1, high=9, pos=None,
                 button_box=None,
+                sample_every_frame=False, history_format='csv',
+                decode_ahead=0,
                 *args, **kwargs):
         
-        super(VideoRating, self).__init__(window)
+        # The movie is loaded below, with different defaults than Video's
+        Stimulus.__init__(self, window)
+        if history_format not in self.history_formats:
+            raise ValueError, "Unsupported history format '{0}'".format(history_format)
         # FIXME: video should mantain aspect ratio regardless of window dimensions
-        self.mov = visual.MovieStim(self.window, 
-                                    movie, 
+        self.mov = self.load_movie(movie, 
+                                    decode_ahead,
                                     size=movie_dimensions,
                                     units=units,
                                     flipVert=False, 
@@ -419,18 +1299,34 @@ class VideoRating(Video):
         # The destination path to write the history to
         self.dest= destination_path
         self.button_box = button_box
+        self.sample_every_frame = sample_every_frame
+        self.history_format = history_format
+        # (rating, time) samples, preallocated for a sample every frame
+        # at 60 Hz if the movie duration is known
+        capacity = int((self.mov.duration or 0) * 60) if sample_every_frame else 0
+        # Ratings are strings if the scale has categorical choices
+        dtype = object if kwargs.get('choices') else float
+        self.history = SampleBuffer(width=2, capacity=max(capacity, 1024), 
+                                    dtype=dtype)
 
     def show(self):
         # Reset the scale
         self.rating_scale.reset()
-        # Start the rating at 5
+        self.history.clear()
+        # The starting rating isn't recorded
+        last_rating = self.rating_scale.getRating()
         # Show and update until the movie is done
         while self.mov.status != visual.FINISHED:
             if self.button_box:
                 self.button_box.getEvents(returnRaw=True, asKeys=True)
                 self.button_box.clearBuffer()
             self.draw()
-            self.window.flip()
+            self.flip()
+            rating = self.rating_scale.getRating()
+            if self.sample_every_frame or rating != last_rating:
+                self.history.append(numpy.nan if rating is None else rating,
+                                    self.rating_scale.getRT())
+                last_rating = rating
         # Write the history to a csv
         self.write_history()
         return super(VideoRating, self).show()
@@ -442,23 +1338,42 @@ class VideoRating(Video):
         return None
 
     def write_history(self):
-        '''Writes the rating history data to a CSV file 
-        at the specified destination path.
+        '''Writes the rating history data to a CSV file (or a .npy or HDF5 
+        file, depending on history_format) at the specified destination path.
+        Categorical ratings are written as UTF-8 encoded strings.
         '''
-        rating_history = self.rating_scale.getHistory()
+        rating_history = self.history.array
+        categorical = rating_history.dtype == object
+        if categorical:
+            # A record array of (rating, time) can be saved without pickling
+            ratings = [rating.encode('utf-8') if isinstance(rating, unicode) 
+                        else str(rating) for rating in rating_history[:, 0]]
+            rating_history = numpy.rec.fromarrays(
+                            [numpy.array(ratings, dtype=str), 
+                            rating_history[:, 1].astype(float)],
+                            names='rating,time')
         if len(rating_history) > 0:
             logging.info("Writing rating history...")
-            with open(self.dest, 'w') as history_file:
-                # Write header
-                history_file.write('Rating,Time\n')
-                for i, evt in enumerate(rating_history):
-                    # Skip the (None, 0.0) event
-                    if i == 0:
-                        continue
-                    # Write data
-                    rating, time = evt
-                    row = "{0},{1}\n".format(rating, round(time, 8))  # e.g. "3, 2.524"
-                    history_file.write(row)
+            if self.history_format == 'npy':
+                numpy.save(self.dest, rating_history)
+            elif self.history_format == 'hdf5':
+                import tables
+                history_file = tables.openFile(self.dest, 'w')
+                try:
+                    if categorical:
+                        history_file.createTable('/', 'history', rating_history,
+                                                title='Rating,Time')
+                    else:
+                        history_file.createArray('/', 'history', rating_history,
+                                                title='Rating,Time')
+                finally:
+                    history_file.close()
+            else:
+                with open(self.dest, 'w') as history_file:
+                    # Write header
+                    history_file.write('Rating,Time\n')
+                    numpy.savetxt(history_file, rating_history, delimiter=',', 
+                                fmt=('%s' if categorical else '%g', '%.8f'))  # e.g. "3,2.52400000"
             logging.info("Wrote to {0}".format(self.dest))
         else:
             logging.info("Rating history is empty. Nothing written")
@@ -467,12 +1382,16 @@ class VideoRating(Video):
 class Pause(Stimulus):
     '''A simple pause.
     '''
+    idles = True
+
     def __init__(self, window, duration):
         super(Pause, self).__init__(window)
         self.duration = float(duration)
 
     def show(self):
-        core.wait(self.duration)
+        self.onset = core.getTime()
+        self.wait(self.duration)
+        self.offset = core.getTime()
         return super(Pause, self).show()
 
 
@@ -516,10 +1435,231 @@ def wait_for_key(keys=['']):
     event.clearEvents()
     if keys:
         if any(keys):
-            ret = event.waitKeys(keyList=keys)
+            ret = wait_for_keys(keys)
         else:
-            ret = event.waitKeys()
-    return ret
+            ret = wait_for_keys()
+        return [key for key, key_time in ret]
+    return None
+
+def wait_for_keys(keys=None, max_wait=float('inf'), timeout=0.01):
+    '''Wait for a key press, like event.waitKeys(), but without keeping
+    the CPU busy. Between checks, the wait blocks until the window system 
+    has an event (see wait_for_events). A key that arrives during the wait 
+    is timestamped with the time the wait woke up for it, rather than the 
+    later time at which it was dispatched.
+
+    Returns a list of (key, time) tuples, or None if max_wait is exceeded.
+
+    Args:
+    keys - A list of keys to wait for. If None, any key is accepted.
+    max_wait - Maximum number of seconds to wait.
+    timeout - Maximum number of seconds to block between checks.
+    '''
+    event.clearEvents('keyboard')
+    clock = core.Clock()
+    woke = None  # When the last wait ended because an event arrived
+    while True:
+        # Dispatches pending window events, which timestamps key presses
+        pressed = event.getKeys(keyList=keys, timeStamped=True)
+        if pressed:
+            if woke is not None:
+                # pygame keys have no timestamp (0)
+                pressed = [(key, min(key_time, woke) if key_time else woke)
+                            for key, key_time in pressed]
+            logging.data("Key pressed: %s" % pressed[0][0])
+            return pressed
+        remaining = max_wait - clock.getTime()
+        if remaining <= 0:
+            logging.data("No keypress (maxWait exceeded)")
+            return None
+        woke = wait_for_events(min(remaining, timeout))
+
+# Arguments of MsgWaitForMultipleObjectsEx: wake up for any input to the
+# thread's windows, including input that arrived before the wait
+QS_ALLINPUT = 0x04FF
+MWMO_INPUTAVAILABLE = 0x0004
+WAIT_OBJECT_0 = 0
+
+def wait_for_events(timeout):
+    '''Block until the window system has events to dispatch, or until 
+    timeout seconds have passed, without keeping the CPU busy. On Windows,
+    waits for a message to the windows of this thread; on X11, for the 
+    pyglet display connection. Elsewhere (e.g. OS X), sleeps for half a 
+    millisecond.
+
+    Returns the time (core.getTime()) at which events arrived, or None if 
+    there were none or it isn't known.
+    '''
+    if sys.platform == 'win32':
+        # Returns as soon as a message is posted, regardless of the (coarse)
+        # resolution of the system timer
+        result = ctypes.windll.user32.MsgWaitForMultipleObjectsEx(0, None, 
+                            max(1, int(round(timeout * 1000))), 
+                            QS_ALLINPUT, MWMO_INPUTAVAILABLE)
+        return core.getTime() if result == WAIT_OBJECT_0 else None
+    display = None
+    if event.havePyglet and not (event.havePygame and event.display.get_init()):
+        display = pyglet.window.get_platform().get_default_display()
+    if hasattr(display, 'fileno'):
+        try:
+            readable = select.select([display.fileno()], [], [], timeout)[0]
+            return core.getTime() if readable else None
+        except (select.error, ValueError):
+            pass
+    time.sleep(min(timeout, 0.0005))
+    return None
+
+# Measured refresh rates, keyed by window. Closed windows aren't kept alive.
+_frame_rates = weakref.WeakKeyDictionary()
+
+def get_frame_rate(window):
+    '''Returns the refresh rate of a window in Hz. The rate is measured
+    once per window. If it can't be measured, 60 Hz is assumed.
+    '''
+    if window not in _frame_rates:
+        rate = window._getActualFrameRate()
+        if rate is None:
+            logging.warn("Could not measure the frame rate. Assuming 60 Hz.")
+            rate = 60.0
+        _frame_rates[window] = rate
+    return _frame_rates[window]
+
+# Compiled paradigm files, keyed by hash
+_paradigms = {}
+
+def load_paradigm(path, classes=None, use_cache=True, cache_dir=None):
+    '''Loads the stimuli defined in a paradigm file. Returns a list of 
+    (StimulusType, (arguments), {keyword arguments}) tuples, which can be 
+    added to a Paradigm.
+
+    The format depends on the file extension:
+    .yaml, .yml, .json - A list of stimuli. Each stimulus is a mapping with 
+            a "type" (the name of the stimulus class) and an optional list 
+            of "args". Other keys are passed as keyword arguments.
+    .csv - A "type" column, and a column for each keyword argument. Empty 
+            cells are skipped. Cells are strings, except in columns whose 
+            name ends with ":json" (e.g. "duration:json"), and the "args" 
+            column, which are parsed as JSON (e.g. 5.0 or ["c"]).
+
+    Example (YAML):
+        - {type: Text, text: Hello, duration: 5.0}
+        - {type: WaitForKey, args: [[c], continue]}
+
+    The file is validated and compiled once. The compiled stimuli are 
+    cached in memory, keyed by the hash of the paradigm file. If cache_dir 
+    is given, they are also cached there as JSON ([hash].json), so that 
+    other sessions can skip the validation.
+
+    Arguments:
+    path - Path to the paradigm file.
+    classes - (dict, optional) Additional stimulus classes, keyed by name.
+            The stimulus classes in this module are always available.
+    use_cache - Whether to use a previously compiled version of the file.
+    cache_dir - (optional) A directory to cache compiled files in.
+    '''
+    classes = dict(get_stimulus_classes(), **(classes or {}))
+    with open(path, 'rb') as fp:
+        content = fp.read()
+    # The class names are part of the key, since they change the result
+    class_names = sorted((name, cls.__module__, cls.__name__) 
+                        for name, cls in classes.items())
+    key = hashlib.sha1(content + repr(class_names)).hexdigest()
+    cache_path = os.path.join(cache_dir, key + '.json') if cache_dir else None
+    if use_cache:
+        if key in _paradigms:
+            # The arguments may be mutable, so each caller gets its own
+            return copy.deepcopy(_paradigms[key])
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as fp:
+                    stimuli = [(classes[name], tuple(args), 
+                                dict((str(k), v) for k, v in kwargs.items()))
+                                for name, args, kwargs in json.load(fp)]
+                _paradigms[key] = stimuli
+                return copy.deepcopy(stimuli)
+            # A cache that can't be loaded, e.g. a truncated file
+            except (ValueError, TypeError, KeyError):
+                pass
+    extension = os.path.splitext(path)[1].lower()
+    stimuli = compile_paradigm(parse_paradigm(content, extension), classes)
+    _paradigms[key] = stimuli
+    if cache_path:
+        names = dict((cls, name) for name, cls in classes.items())
+        try:
+            data = json.dumps([(names[stim_class], args, kwargs) 
+                                for stim_class, args, kwargs in stimuli])
+            with open(cache_path, 'wb') as fp:
+                fp.write(data)
+        except (IOError, TypeError):
+            logging.warn("Could not cache paradigm file {0}".format(path))
+    return copy.deepcopy(stimuli)
+
+def parse_paradigm(content, extension):
+    '''Parses the content of a paradigm file into a list of dicts.
+    See load_paradigm for the formats.
+    '''
+    if extension in ('.yaml', '.yml'):
+        items = yaml.safe_load(content)
+    elif extension == '.json':
+        items = json.loads(content)
+    elif extension == '.csv':
+        items = []
+        for row in csv.DictReader(content.splitlines()):
+            item = {}
+            for name, cell in row.items():
+                if not cell:
+                    continue
+                if name.endswith(':json'):
+                    name = name[:-len(':json')]
+                elif name != 'args':
+                    item[name] = cell
+                    continue
+                try:
+                    item[name] = json.loads(cell)
+                except ValueError:
+                    raise ValueError, "Invalid JSON in column '{0}': {1}".format(name, cell)
+            items.append(item)
+    else:
+        raise ValueError, "Unsupported paradigm file type '{0}'".format(extension)
+    if not isinstance(items, list):
+        raise ValueError, "A paradigm file must contain a list of stimuli"
+    return items
+
+def compile_paradigm(items, classes):
+    '''Validates a list of stimulus dicts (see load_paradigm) and returns
+    a list of (StimulusType, (arguments), {keyword arguments}) tuples.
+
+    Arguments:
+    items - A list of dicts.
+    classes - Stimulus classes, keyed by name.
+    '''
+    stimuli = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or 'type' not in item:
+            raise ValueError, "Stimulus {0} must be a mapping with a type".format(i)
+        kwargs = dict((str(name), value) for name, value in item.items())
+        name = kwargs.pop('type')
+        if name not in classes:
+            raise ValueError, "Stimulus {0}: unknown type '{1}'".format(i, name)
+        stim_class = classes[name]
+        args = kwargs.pop('args', ())
+        if not isinstance(args, (list, tuple)):
+            raise ValueError, "Stimulus {0}: args must be a list".format(i)
+        args = tuple(args)
+        # Check that the arguments fit the constructor
+        init = getattr(stim_class.__init__, 'im_func', stim_class.__init__)
+        try:
+            getcallargs(init, None, None, *args, **kwargs)
+        except TypeError as e:
+            raise ValueError, "Stimulus {0} ({1}): {2}".format(i, name, e)
+        stimuli.append((stim_class, args, kwargs))
+    return stimuli
+
+def get_stimulus_classes():
+    '''Returns the stimulus classes defined in this module, keyed by name.
+    '''
+    return dict((name, obj) for name, obj in globals().items() 
+                if isinstance(obj, type) and issubclass(obj, Stimulus))
 
 def has_method(obj, method_name):
     '''Utility method that checks if an object has a method bound to it.
@@ -1,7 +1,7 @@
 """ Tablib. """
 
 from tablib.core import (
-    Databook, Dataset, detect, import_set, import_book,
+    Databook, Dataset, detect, import_set, import_book, register_format,
     InvalidDatasetType, InvalidDimensions, UnsupportedFormat,
     __version__
 )
@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+"""
+    tablib.columnar
+    ~~~~~~~~~~~~~~~
+
+    This module implements a column-oriented :class:`Dataset`, backed by
+    NumPy arrays.
+
+    :copyright: (c) 2011 by Kenneth Reitz.
+    :license: MIT, see LICENSE for more details.
+"""
+
+from numbers import Integral
+
+import numpy
+
+from tablib.compat import unicode
+from tablib.core import (
+    Dataset, Row, HeadersNeeded, InvalidDatasetIndex, InvalidDimensions)
+
+
+def _dtype_of(value):
+    """Returns the NumPy dtype used to store a column starting with value."""
+    if isinstance(value, bool):
+        return numpy.bool_
+    elif isinstance(value, Integral):
+        return numpy.int64
+    elif isinstance(value, float):
+        return numpy.float64
+    return object
+
+
+def _promoted(dtype, value):
+    """Returns the dtype a column of the given dtype needs to store value:
+    integers and floats are promoted following NumPy's rules (e.g. an
+    integer column becomes a float column), anything else makes it an
+    object column. Booleans are not mixed with numbers, so that ``True``
+    doesn't become ``1``."""
+    value_dtype = _dtype_of(value)
+    if dtype == object or value_dtype is object:
+        return numpy.dtype(object)
+    if (dtype == numpy.bool_) != (value_dtype is numpy.bool_):
+        return numpy.dtype(object)
+    if value_dtype is numpy.int64 and not -2 ** 63 <= value < 2 ** 63:
+        return numpy.dtype(object)
+    return numpy.promote_types(dtype, value_dtype)
+
+
+class Column(object):
+    """Internal Column object. A growable NumPy array of one type, which is
+    promoted to a wider type (or to an object array) when a value of
+    another type is stored."""
+
+    __slots__ = ['data', 'size']
+
+    def __init__(self, values=(), dtype=None):
+        values = list(values)
+        if dtype is None:
+            dtype = _dtype_of(values[0]) if values else object
+        self.data = numpy.empty(max(len(values), 16), dtype=dtype)
+        self.size = 0
+        for value in values:
+            self.append(value)
+
+    @classmethod
+    def from_array(cls, array):
+        """Returns a new :class:`Column` holding a copy of a NumPy array."""
+        column = cls(dtype=array.dtype)
+        column.data = numpy.empty(max(len(array), 16), dtype=array.dtype)
+        column.data[:len(array)] = array
+        column.size = len(array)
+        return column
+
+    @classmethod
+    def wrap(cls, array):
+        """Returns a new :class:`Column` that stores its values in a NumPy
+        array (e.g. a memory-mapped one) without copying it. The array is
+        only copied if the column grows."""
+        column = cls.__new__(cls)
+        column.data = array
+        column.size = len(array)
+        return column
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def array(self):
+        """The stored values, as a view of the underlying array."""
+        return self.data[:self.size]
+
+    @property
+    def typed(self):
+        return self.data.dtype != object
+
+    def _ensure_fits(self, value):
+        if self.size == 0:
+            dtype = numpy.dtype(_dtype_of(value))
+        else:
+            dtype = _promoted(self.data.dtype, value)
+        if dtype != self.data.dtype:
+            if self.size == 0:
+                self.data = numpy.empty(len(self.data), dtype=dtype)
+            else:
+                self.data = self.data.astype(dtype)
+
+    def append(self, value):
+        self._ensure_fits(value)
+        if self.size == len(self.data):
+            grown = numpy.empty(2 * len(self.data), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size] = value
+        self.size += 1
+
+    def insert(self, index, value):
+        if index >= self.size:
+            return self.append(value)
+        self._ensure_fits(value)
+        data = numpy.empty(max(self.size + 1, len(self.data)), dtype=self.data.dtype)
+        data[:index] = self.data[:index]
+        data[index] = value
+        data[index + 1:self.size + 1] = self.data[index:self.size]
+        self.data = data
+        self.size += 1
+
+    def get(self, index):
+        value = self.array[index]
+        return value.item() if self.typed else value
+
+    def set(self, index, value):
+        self._ensure_fits(value)
+        self.array[index] = value
+
+    def tolist(self):
+        return self.array.tolist()
+
+    def take(self, indices):
+        """Returns a new :class:`Column` of the values at the given indices
+        (an index array or a boolean mask)."""
+        return Column.from_array(self.array[indices])
+
+
+class ColumnarDataset(Dataset):
+    """A :class:`Dataset` that stores each column in a typed NumPy array
+    (with an object array for columns of strings or mixed types), and each
+    :ref:`tag <tags>` as a boolean index of the rows that have it.
+
+    The :class:`Dataset` API is unchanged, but column access, sorting and
+    filtering work on whole arrays. Use :class:`ColumnarDataset.get_array`
+    to get a column as an array, without converting it to a list. ::
+
+        data = ColumnarDataset(headers=('rt', 'correct'))
+        data.append((0.512, True))
+
+        data.get_array('rt').mean()
+
+    Requires NumPy.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._columns = []
+        self._height = 0
+        self._tags = {}
+        super(ColumnarDataset, self).__init__(*args, **kwargs)
+
+    @classmethod
+    def from_arrays(cls, arrays, headers=None, title=None, copy=True):
+        """Returns a new :class:`ColumnarDataset` with the given NumPy arrays
+        (of the same length) as columns. Boolean, integer and float arrays
+        keep a typed column; others are stored as objects. With
+        ``copy=False``, arrays that already have the column's type (such
+        as memory-mapped ones) are used as they are.
+        """
+
+        columns = []
+        for array in arrays:
+            dtype = {'b': numpy.bool_, 'i': numpy.int64, 'u': numpy.int64,
+                     'f': numpy.float64}.get(array.dtype.kind, object)
+            if copy or array.dtype != dtype:
+                columns.append(Column.from_array(array.astype(dtype)))
+            else:
+                columns.append(Column.wrap(array))
+
+        heights = set(len(column) for column in columns)
+        if len(heights) > 1:
+            raise InvalidDimensions
+
+        _dset = cls(headers=headers, title=title)
+        _dset._columns = columns
+        _dset._height = heights.pop() if heights else 0
+        return _dset
+
+    def __getitem__(self, key):
+        if isinstance(key, str) or isinstance(key, unicode):
+            return self._get_column(key).tolist()
+        elif isinstance(key, slice):
+            return [tuple(self._get_row(i)) for i in range(*key.indices(self.height))]
+        else:
+            return tuple(self._get_row(key))
+
+    def __setitem__(self, key, value):
+        self._validate(value)
+        if key < 0:
+            key += self.height
+        if not 0 <= key < self.height:
+            raise IndexError
+        for column, item in zip(self._columns, value):
+            column.set(key, item)
+        self._indexes.clear()
+
+    def __delitem__(self, key):
+        if isinstance(key, str) or isinstance(key, unicode):
+            if key in self.headers:
+                pos = self.headers.index(key)
+                del self.headers[pos]
+                del self._columns[pos]
+                self._indexes.clear()
+            else:
+                raise KeyError
+        else:
+            keep = numpy.ones(self.height, dtype=bool)
+            keep[key] = False
+            self._take(keep)
+            self._indexes.clear()
+
+
+    # ---------
+    # Internals
+    # ---------
+
+    def _get_data(self):
+        """The rows, as a list of :class:`Row` objects. Setting it replaces
+        the contents of the :class:`Dataset`."""
+        rows = [list(row) for row in zip(*[c.tolist() for c in self._columns])]
+        if not self._columns:
+            rows = [[] for i in range(self.height)]
+
+        tags = [[] for row in rows]
+        for tag, index in self._tags.items():
+            for i in numpy.flatnonzero(index.array):
+                tags[i].append(tag)
+
+        return [Row(row, row_tags) for row, row_tags in zip(rows, tags)]
+
+    def _set_data(self, rows):
+        rows = list(rows)
+        width = len(rows[0]) if rows else 0
+
+        self._columns = [Column([row[i] for row in rows]) for i in range(width)]
+        self._height = len(rows)
+        self._tags = {}
+        for i, row in enumerate(rows):
+            for tag in getattr(row, 'tags', ()):
+                self._tag_index(tag).set(i, True)
+
+    _data = property(_get_data, _set_data)
+
+
+    def _get_row(self, index):
+        if index < 0:
+            index += self.height
+        if not 0 <= index < self.height:
+            raise IndexError
+        return [column.get(index) for column in self._columns]
+
+    def _get_column(self, key):
+        if not self.headers or key not in self.headers:
+            raise KeyError
+        return self._columns[self.headers.index(key)]
+
+    def _tag_index(self, tag):
+        """Returns the boolean row index of a tag, creating it if needed."""
+        if tag not in self._tags:
+            self._tags[tag] = Column.from_array(numpy.zeros(self.height, dtype=bool))
+        return self._tags[tag]
+
+    def _take(self, indices):
+        """Keeps only the rows at the given indices (an index array or a
+        boolean mask), in that order."""
+        self._columns = [column.take(indices) for column in self._columns]
+        self._tags = dict((tag, index.take(indices)) for tag, index in self._tags.items())
+        self._height = len(numpy.arange(self.height)[indices])
+
+    def _package_rows(self):
+        """Yields the rows as lists, with the headers (if set) first. The
+        formatters are applied to a whole column at a time."""
+
+        columns = [column.tolist() for column in self._columns]
+
+        for col, callback in self._formatters:
+            if col is not None and not -len(columns) <= col < len(columns):
+                raise InvalidDatasetIndex
+            for i in (range(len(columns)) if col is None else [col]):
+                columns[i] = [callback(value) for value in columns[i]]
+
+        if self.headers:
+            yield list(self.headers)
+
+        for row in zip(*columns):
+            yield list(row)
+
+    def _index_stamp(self):
+        return self._columns, self._height
+
+    def _subset(self, positions):
+        _dset = self._copy()
+        _dset._take(numpy.asarray(positions, dtype=numpy.intp))
+        return _dset
+
+    def _sort_order(self, cols, reverse=False, key=None):
+        if len(cols) > 1 or key is not None:
+            return super(ColumnarDataset, self)._sort_order(cols, reverse, key)
+
+        values = self._columns[cols[0]].array
+        if reverse:
+            # Sorting the reversed values keeps equal values in order
+            order = numpy.argsort(values[::-1], kind='mergesort')[::-1]
+            return len(values) - 1 - order
+        return numpy.argsort(values, kind='mergesort')
+
+    def _reorder(self, order):
+        self._take(order)
+        self._indexes.clear()
+
+    def _copy(self):
+        """Returns a new instance with the same headers, title, separators
+        and formatters, sharing the columns with this one."""
+        _dset = self.__class__(headers=self.headers, title=self.title)
+        _dset._separators = list(self._separators)
+        _dset._formatters = list(self._formatters)
+        _dset._columns = list(self._columns)
+        _dset._height = self._height
+        _dset._tags = dict(self._tags)
+        return _dset
+
+
+    @property
+    def height(self):
+        """The number of rows currently in the :class:`Dataset`.
+           Cannot be directly modified.
+        """
+        return self._height
+
+
+    @property
+    def width(self):
+        """The number of columns currently in the :class:`Dataset`.
+           Cannot be directly modified.
+        """
+        if self._columns:
+            return len(self._columns)
+        try:
+            return len(self.headers)
+        except TypeError:
+            return 0
+
+
+    # ----
+    # Rows
+    # ----
+
+    def insert(self, index, row, tags=list()):
+        """Inserts a row to the :class:`Dataset` at the given index.
+        See :class:`Dataset.insert` for additional documentation.
+        """
+
+        self._validate(row)
+        row = list(row)
+
+        if not self._columns:
+            self._columns = [Column() for value in row]
+        if index < 0:
+            index = max(self.height + index, 0)
+
+        for column, value in zip(self._columns, row):
+            column.insert(index, value)
+        for tag in tags:
+            self._tag_index(tag)
+        for tag, tag_index in self._tags.items():
+            tag_index.insert(index, tag in tags)
+
+        self._height += 1
+        self._indexes.clear()
+
+
+    def extend(self, rows, tags=list()):
+        """Adds a list of rows to the end of the :class:`Dataset`.
+        See :class:`Dataset.extend` for additional documentation.
+        """
+
+        rows = [list(row) for row in rows]
+
+        if rows:
+            width = self.width or len(rows[0])
+            if any(len(row) != width for row in rows):
+                raise InvalidDimensions
+
+        for row in rows:
+            self.insert(self.height, row, tags)
+
+
+    # -------
+    # Columns
+    # -------
+
+    def insert_col(self, index, col=None, header=None):
+        """Inserts a column to the :class:`Dataset` at the given index.
+        See :class:`Dataset.insert_col` for additional documentation.
+        """
+
+        if col is None:
+            col = []
+
+        # Callable Columns...
+        if hasattr(col, '__call__'):
+            col = list(map(col, self._data))
+
+        col = self._clean_col(col)
+        self._validate(col=col)
+
+        if self.headers:
+            # pop the first item off, add to headers
+            if not header:
+                raise HeadersNeeded()
+
+            # corner case - if header is set without data
+            elif header and self.height == 0 and len(col):
+                raise InvalidDimensions
+
+            self.headers.insert(index, header)
+
+        if self.height and self.width:
+            self._columns.insert(index, Column(col))
+            self._indexes.clear()
+        else:
+            self._data = [Row([row]) for row in col]
+
+
+    def get_col(self, index):
+        """Returns the column from the :class:`Dataset` at the given index."""
+
+        return self._columns[index].tolist()
+
+
+    def get_array(self, col):
+        """Returns a column, given string (for header) or integer (for column
+        index), as a NumPy array. The array is a view of the stored column,
+        and should not be modified."""
+
+        if isinstance(col, str) or isinstance(col, unicode):
+            return self._get_column(col).array
+        return self._columns[col].array
+
+
+    # ----
+    # Misc
+    # ----
+
+    def filter(self, tag):
+        """Returns a new instance of the :class:`Dataset`, excluding any rows
+        that do not contain the given :ref:`tags <tags>`.
+        """
+        if isinstance(tag, str) or isinstance(tag, unicode):
+            tag = [tag]
+
+        mask = numpy.zeros(self.height, dtype=bool)
+        for t in (tag or []):
+            if t in self._tags:
+                mask |= self._tags[t].array
+
+        _dset = self._copy()
+        _dset._take(mask)
+
+        return _dset
+
+
+    def wipe(self):
+        """Removes all content and headers from the :class:`Dataset` object."""
+        super(ColumnarDataset, self).wipe()
+        self._columns = []
+        self._height = 0
+        self._tags = {}
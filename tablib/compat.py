@@ -20,14 +20,11 @@ except ImportError:
     from tablib.packages.ordereddict import OrderedDict
 
 
+# The format backends (xlwt, xlrd, openpyxl, odf, markup) are imported by
+# the format modules that use them, when those are first used.
+
 if is_py3:
     from io import BytesIO
-    import tablib.packages.xlwt3 as xlwt
-    import tablib.packages.xlrd3 as xlrd
-    from tablib.packages.xlrd3.biffh import XLRDError
-    from tablib.packages import markup3 as markup
-    from tablib.packages import openpyxl3 as openpyxl
-    from tablib.packages.odf3 import opendocument, style, text, table
 
     import csv
     from io import StringIO
@@ -40,14 +37,9 @@ if is_py3:
 else:
     from cStringIO import StringIO as BytesIO
     from cStringIO import StringIO
-    import tablib.packages.xlwt as xlwt
-    import tablib.packages.xlrd as xlrd
-    from tablib.packages.xlrd.biffh import XLRDError
-    from tablib.packages import markup
     from itertools import ifilter
-    from tablib.packages import openpyxl
-    from tablib.packages.odf import opendocument, style, text, table
 
     from tablib.packages import unicodecsv as csv
 
     unicode = unicode
+    basestring = basestring
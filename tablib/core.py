@@ -9,8 +9,8 @@
     :license: MIT, see LICENSE for more details.
 """
 
+from bisect import bisect_left, bisect_right
 from copy import copy
-from operator import itemgetter
 
 from tablib import formats
 
@@ -105,6 +105,61 @@ class Row(object):
             return bool(len(set(tag) & set(self.tags)))
 
 
+class HashIndex(object):
+    """Index of the positions of the rows with each key, in order of first
+    appearance. See :class:`Dataset.create_index`."""
+
+    def __init__(self, keys):
+        self._positions = OrderedDict()
+        for i, key in enumerate(keys):
+            try:
+                self._positions[key].append(i)
+            except KeyError:
+                self._positions[key] = [i]
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def get(self, key):
+        """Returns the positions of the rows with the given key."""
+        return self._positions.get(key, [])
+
+    def keys(self):
+        return list(self._positions.keys())
+
+    def items(self):
+        return list(self._positions.items())
+
+
+class SortedIndex(object):
+    """Index of the positions of the rows, sorted by key, for range queries.
+    Rows with equal keys keep their order. See :class:`Dataset.create_index`."""
+
+    def __init__(self, keys):
+        keys = list(keys)
+        self._positions = sorted(range(len(keys)), key=keys.__getitem__)
+        self._keys = [keys[i] for i in self._positions]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        i = bisect_left(self._keys, key)
+        return i < len(self._keys) and self._keys[i] == key
+
+    def get(self, key):
+        """Returns the positions of the rows with the given key."""
+        return self._positions[bisect_left(self._keys, key):bisect_right(self._keys, key)]
+
+    def between(self, low=None, high=None):
+        """Returns the positions of the rows with low <= key < high, in key
+        order. Either bound can be None."""
+        start = 0 if low is None else bisect_left(self._keys, low)
+        stop = len(self._keys) if high is None else bisect_left(self._keys, high)
+        return self._positions[start:stop]
 
 
 class Dataset(object):
@@ -163,6 +218,9 @@ class Dataset(object):
         # (column, callback) tuples
         self._formatters = []
 
+        # (columns, index class): ((data, height), index)
+        self._indexes = {}
+
         try:
             self.headers = kwargs['headers']
         except KeyError:
@@ -173,8 +231,6 @@ class Dataset(object):
         except KeyError:
             self.title = None
 
-        self._register_formats()
-
 
     def __len__(self):
         return self.height
@@ -197,6 +253,7 @@ class Dataset(object):
     def __setitem__(self, key, value):
         self._validate(value)
         self._data[key] = Row(value)
+        self._indexes.clear()
 
 
     def __delitem__(self, key):
@@ -211,10 +268,13 @@ class Dataset(object):
 
                     del row[pos]
                     self._data[i] = row
+
+                self._indexes.clear()
             else:
                 raise KeyError
         else:
             del self._data[key]
+            self._indexes.clear()
 
 
     def __repr__(self):
@@ -249,16 +309,17 @@ class Dataset(object):
 
     @classmethod
     def _register_formats(cls):
-        """Adds format properties."""
+        """Adds format properties. Called once, when the module is loaded."""
         for fmt in formats.available:
-            try:
-                try:
-                    setattr(cls, fmt.title, property(fmt.export_set, fmt.import_set))
-                except AttributeError:
-                    setattr(cls, fmt.title, property(fmt.export_set))
+            cls._register_format(fmt)
 
-            except AttributeError:
-                pass
+
+    @classmethod
+    def _register_format(cls, fmt):
+        """Adds the property of a format, if it can export a :class:`Dataset`,
+        with a setter if it can import one. The format module is only
+        imported when the property is first used."""
+        _set_format_property(cls, fmt, 'export_set', 'import_set')
 
 
     def _validate(self, row=None, col=None, safety=False):
@@ -282,41 +343,153 @@ class Dataset(object):
 
 
     def _package(self, dicts=True, ordered=True):
-        """Packages Dataset into lists of dictionaries for transmission."""
+        """Packages Dataset into lists of dictionaries for transmission.
+        The formatters are applied to copies of the rows: the data stored
+        in the :class:`Dataset` is not changed."""
         # TODO: Dicts default to false?
 
-        _data = list(self._data)
-
         if ordered:
             dict_pack = OrderedDict
         else:
             dict_pack = dict
 
-        # Execute formatters
-        if self._formatters:
-            for row_i, row in enumerate(_data):
-                for col, callback in self._formatters:
-                    try:
-                        if col is None:
-                            for j, c in enumerate(row):
-                                _data[row_i][j] = callback(c)
-                        else:
-                            _data[row_i][col] = callback(row[col])
-                    except IndexError:
-                        raise InvalidDatasetIndex
-
+        rows = self._package_rows()
 
         if self.headers:
+            headers = next(rows)
             if dicts:
-                data = [dict_pack(list(zip(self.headers, data_row))) for data_row in _data]
+                data = [dict_pack(zip(headers, data_row)) for data_row in rows]
             else:
-                data = [list(self.headers)] + list(_data)
+                data = [headers] + list(rows)
         else:
-            data = [list(row) for row in _data]
+            data = list(rows)
 
         return data
 
 
+    def _get_formatter(self):
+        """Returns a function that returns a formatted copy of a row, or None
+        if there are no formatters. Built once per export."""
+
+        formatters = list(self._formatters)
+
+        if not formatters:
+            return None
+
+        if self.height:
+            for col, callback in formatters:
+                if col is not None and not -self.width <= col < self.width:
+                    raise InvalidDatasetIndex
+
+        def format_row(row):
+            row = list(row)
+            for col, callback in formatters:
+                if col is None:
+                    row = [callback(c) for c in row]
+                else:
+                    row[col] = callback(row[col])
+            return row
+
+        return format_row
+
+
+    def _package_rows(self):
+        """Yields the rows of the :class:`Dataset` as lists, one at a time,
+        with the headers (if set) first and the formatters applied."""
+
+        format_row = self._get_formatter()
+
+        if self.headers:
+            yield list(self.headers)
+
+        if format_row is None:
+            for row in self._data:
+                yield list(row)
+        else:
+            for row in self._data:
+                yield format_row(row)
+
+
+    def _get_stream_format(self, fmt, method):
+        """Returns the format module with the given title, if it supports
+        the given streaming method."""
+
+        for f in formats.available:
+            if f.title == fmt and hasattr(f, method):
+                return f
+        raise UnsupportedFormat('Format %s cannot be streamed.' % fmt)
+
+
+    def _get_col_indexes(self, cols):
+        """Returns the indexes of the given columns: a header or column
+        index, or a list of them."""
+
+        if isinstance(cols, (str, unicode, int)):
+            cols = [cols]
+
+        indexes = []
+        for col in cols:
+            if isinstance(col, str) or isinstance(col, unicode):
+                if not self.headers:
+                    raise HeadersNeeded
+                if col not in self.headers:
+                    raise KeyError(col)
+                indexes.append(self.headers.index(col))
+            else:
+                indexes.append(col)
+        return indexes
+
+
+    def _get_keys(self, cols):
+        """Returns the key of every row: the value in the column, or the
+        tuple of values in the columns, at the given indexes."""
+
+        columns = [self.get_col(i) for i in cols]
+        if len(columns) == 1:
+            return columns[0]
+        return list(zip(*columns))
+
+
+    def _index_stamp(self):
+        """Returns (storage, height), to tell whether the rows were replaced
+        since an index was built. Methods that change the rows in place
+        clear the indexes instead."""
+        return self._data, len(self._data)
+
+
+    def _subset(self, positions):
+        """Returns a new instance of the :class:`Dataset` with copies of the
+        rows at the given positions, in that order."""
+
+        _dset = copy(self)
+        rows = self._data
+        _dset._data = [Row(rows[i], rows[i].tags) for i in positions]
+        if self.headers:
+            _dset.headers = list(self.headers)
+        _dset._separators = list(self._separators)
+        _dset._formatters = list(self._formatters)
+        _dset._indexes = {}
+
+        return _dset
+
+
+    def _sort_order(self, cols, reverse=False, key=None):
+        """Returns the positions of the rows, sorted by the given columns."""
+
+        keys = self._get_keys(cols)
+        if key is not None:
+            keys = [key(k) for k in keys]
+
+        return sorted(range(len(keys)), key=keys.__getitem__, reverse=reverse)
+
+
+    def _reorder(self, order):
+        """Puts the rows in the given order, in place."""
+
+        rows = self._data
+        self._data = [rows[i] for i in order]
+        self._indexes.clear()
+
 
     def _get_headers(self):
         """An *optional* list of strings to be used for header rows and attribute names.
@@ -559,6 +732,51 @@ class Dataset(object):
         pass
 
 
+    # -------
+    # Streams
+    # -------
+
+    def export_stream(self, fmt, stream, **kwargs):
+        """Writes the :class:`Dataset` to a file object in the given format,
+        a chunk of rows at a time, without building the whole export in
+        memory first. ::
+
+            with open('output.csv', 'wb') as f:
+                data.export_stream('csv', f)
+
+        The ``csv``, ``tsv`` and ``json`` formats can be streamed. Keyword
+        arguments are passed on to the format (e.g. ``chunk_size``, or
+        ``lines=True`` to write JSON Lines).
+        """
+
+        fmt = self._get_stream_format(fmt, 'export_stream')
+        fmt.export_stream(self, stream, **kwargs)
+
+
+    def import_stream(self, fmt, stream, **kwargs):
+        """Replaces the contents of the :class:`Dataset` with rows read
+        lazily from a file object in the given format. Rows are validated
+        and added a batch at a time. ::
+
+            with open('input.csv', 'rb') as f:
+                data.import_stream('csv', f)
+
+        The ``csv``, ``tsv``, ``xls``, ``xlsx`` and ``npz`` formats can be
+        streamed. Keyword arguments are passed on to the format (e.g.
+        ``headers``, ``batch_size`` for CSV; ``cols`` and ``rows`` to import
+        only some columns and rows of an Excel sheet; ``allow_pickle`` to
+        read the object columns of a trusted NPZ file). ::
+
+            with open('stimuli.xlsx', 'rb') as f:
+                data.import_stream('xlsx', f, cols=['word', 'rt'], rows=(0, 20))
+        """
+
+        fmt = self._get_stream_format(fmt, 'import_stream')
+        fmt.import_stream(self, stream, **kwargs)
+
+        return self
+
+
     # ----
     # Rows
     # ----
@@ -574,6 +792,7 @@ class Dataset(object):
 
         self._validate(row)
         self._data.insert(index, Row(row, tags=tags))
+        self._indexes.clear()
 
 
     def rpush(self, row, tags=list()):
@@ -600,12 +819,20 @@ class Dataset(object):
         self.rpush(row, tags)
 
     def extend(self, rows, tags=list()):
-        """Adds a list of rows to the :class:`Dataset` using
-        :class:`Dataset.append`
+        """Adds a list of rows to the end of the :class:`Dataset`.
+
+        The rows are validated together, and added in one step: if any
+        of them is the wrong size, none of them are added.
         """
 
-        for row in rows:
-            self.append(row, tags)
+        rows = [Row(row, tags=tags) for row in rows]
+
+        if rows:
+            width = self.width or len(rows[0])
+            if any(len(row) != width for row in rows):
+                raise InvalidDimensions
+            self._data.extend(rows)
+            self._indexes.clear()
 
 
     def lpop(self):
@@ -693,6 +920,8 @@ class Dataset(object):
 
                 row.insert(index, col[i])
                 self._data[i] = row
+
+            self._indexes.clear()
         else:
             self._data = [Row([row]) for row in col]
 
@@ -780,49 +1009,146 @@ class Dataset(object):
         """
         _dset = copy(self)
         _dset._data = [row for row in _dset._data if row.has_tag(tag)]
+        _dset._indexes = {}
 
         return _dset
 
 
-    def sort(self, col, reverse=False):
+    def sort(self, col, reverse=False, key=None, in_place=False):
         """Sort a :class:`Dataset` by a specific column, given string (for
-        header) or integer (for column index). The order can be reversed by
-        setting ``reverse`` to ``True``.
+        header) or integer (for column index), or by several columns, given
+        a list of them. The order can be reversed by setting ``reverse`` to
+        ``True``. ``key`` is called with the value (or tuple of values) of
+        each row, to get the value to sort it by. ::
+
+            data.sort(['subject', 'rt'])
+            data.sort('word', key=len, in_place=True)
+
+        The sort is stable: rows with equal values keep their order. Tags,
+        separators and formatters are kept.
 
         Returns a new :class:`Dataset` instance where columns have been
-        sorted.
+        sorted. With ``in_place=True``, sorts this one and returns it.
         """
 
-        if isinstance(col, str) or isinstance(col, unicode):
+        order = self._sort_order(self._get_col_indexes(col), reverse, key)
 
-            if not self.headers:
-                raise HeadersNeeded
+        if in_place:
+            self._reorder(order)
+            return self
 
-            _sorted = sorted(self.dict, key=itemgetter(col), reverse=reverse)
-            _dset = Dataset(headers=self.headers)
+        return self._subset(order)
 
-            for item in _sorted:
-                row = [item[key] for key in self.headers]
-                _dset.append(row=row)
 
-        else:
-            if self.headers:
-                col = self.headers[col]
+    def create_index(self, cols, kind='hash'):
+        """Returns an index of the rows by the values in a column, given a
+        header or column index, or in several columns, given a list of them.
 
-            _sorted = sorted(self.dict, key=itemgetter(col), reverse=reverse)
-            _dset = Dataset(headers=self.headers)
+        A ``'hash'`` index finds the rows with a given key. A ``'sorted'``
+        index also finds the rows with keys in a range. ::
+
+            data.create_index(['subject', 'trial']).get(('s01', 3))
+            data.create_index('rt', kind='sorted').between(0.2, 1.0)
+
+        Both return row positions. The index is kept, and returned again,
+        until the :class:`Dataset` changes; :class:`Dataset.lookup`,
+        :class:`Dataset.between`, :class:`Dataset.join` and
+        :class:`Dataset.groupby` use it.
+        """
+
+        kinds = {'hash': HashIndex, 'sorted': SortedIndex}
+        if kind not in kinds:
+            raise ValueError('Unknown index kind: %s' % kind)
+
+        cols = tuple(self._get_col_indexes(cols))
+        key = (cols, kinds[kind])
+        data, height = self._index_stamp()
+
+        if key in self._indexes:
+            (indexed_data, indexed_height), index = self._indexes[key]
+            if indexed_data is data and indexed_height == height:
+                return index
+
+        index = kinds[kind](self._get_keys(cols))
+        self._indexes[key] = ((data, height), index)
+
+        return index
+
+
+    def lookup(self, cols, key):
+        """Returns a new instance of the :class:`Dataset`, with only the rows
+        that have the given key in the given column (or tuple of keys in the
+        given list of columns). Uses a hash index. ::
+
+            data.lookup('subject', 's01')
+        """
+
+        return self._subset(self.create_index(cols).get(key))
+
+
+    def between(self, col, low=None, high=None):
+        """Returns a new instance of the :class:`Dataset`, with only the rows
+        that have low <= value < high in the given column, sorted by that
+        column. Either bound can be None. Uses a sorted index."""
+
+        return self._subset(self.create_index(col, kind='sorted').between(low, high))
 
-            for item in _sorted:
-                if self.headers:
-                    row = [item[key] for key in self.headers]
-                else:
-                    row = item
-                _dset.append(row=row)
 
+    def join(self, other, on, how='inner'):
+        """Joins the rows of two :class:`Dataset` instances that have the
+        same values in the ``on`` columns: a header, or a list of headers,
+        found in both. Returns a new ``Dataset`` instance with the columns
+        of this one, followed by the other columns of ``other``. ::
+
+            results.join(conditions, on='stim_id', how='left')
+
+        With ``how='inner'``, rows without a match in ``other`` are left
+        out; with ``how='left'``, they are kept, with ``None`` in the
+        columns of ``other``. Uses a hash index of ``other``.
+        """
+
+        if how not in ('inner', 'left'):
+            raise ValueError('Unknown join: %s' % how)
+
+        if not self.headers or not other.headers:
+            raise HeadersNeeded
+
+        if isinstance(on, str) or isinstance(on, unicode):
+            on = [on]
+
+        keys = self._get_keys(self._get_col_indexes(on))
+        index = other.create_index(on)
+
+        other_cols = [i for i, header in enumerate(other.headers) if header not in on]
+        other_rows = other._data
+        missing = [None] * len(other_cols)
+
+        rows = []
+        for row, key in zip(self._data, keys):
+            matches = index.get(key)
+            for i in matches:
+                other_row = other_rows[i]
+                rows.append(Row(list(row) + [other_row[j] for j in other_cols], row.tags))
+            if not matches and how == 'left':
+                rows.append(Row(list(row) + missing, row.tags))
+
+        _dset = self.__class__(headers=self.headers + [other.headers[j] for j in other_cols])
+        _dset._data = rows
 
         return _dset
 
 
+    def groupby(self, cols):
+        """Groups the rows by the values in a column, given a header or
+        column index, or in several columns, given a list of them. Returns a
+        :class:`Grouping`, to aggregate the groups or iterate over them. ::
+
+            data.groupby('subject').agg({'rt': mean, 'correct': sum})
+        """
+
+        return Grouping(self, cols)
+
+
     def transpose(self):
         """Transpose a :class:`Dataset`, turning rows into columns and vice
         versa, returning a new ``Dataset`` instance. The first row of the
@@ -871,6 +1197,7 @@ class Dataset(object):
 
         rows_to_stack.extend(other_rows)
         _dset._data = rows_to_stack
+        _dset._indexes = {}
 
         return _dset
 
@@ -913,8 +1240,70 @@ class Dataset(object):
         """Removes all content and headers from the :class:`Dataset` object."""
         self._data = list()
         self.__headers = None
+        self._indexes.clear()
+
 
 
+class Grouping(object):
+    """The rows of a :class:`Dataset` grouped by key, in order of first
+    appearance. Returned by :class:`Dataset.groupby`.
+
+    Iterating over it gives ``(key, dataset)`` pairs, with a new
+    ``Dataset`` of the rows in each group.
+    """
+
+    def __init__(self, dataset, cols):
+        self.dataset = dataset
+        self.cols = dataset._get_col_indexes(cols)
+        self.index = dataset.create_index(self.cols)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        for key, positions in self.index.items():
+            yield key, self.dataset._subset(positions)
+
+    def agg(self, aggregations):
+        """Returns a new :class:`Dataset` with one row per group: the key
+        columns, followed by one column per aggregation. Each aggregation
+        function is called with the list of a column's values in the group.
+
+        ``aggregations`` is a dict of ``{column: function}``, or a list of
+        ``(column, function)`` pairs or ``(header, column, function)``
+        triples, to give a new header, or aggregate a column more than once.
+        """
+
+        if isinstance(aggregations, dict):
+            aggregations = list(aggregations.items())
+
+        specs = []
+        for spec in aggregations:
+            if len(spec) == 2:
+                spec = (spec[0],) + tuple(spec)
+            header, col, func = spec
+            specs.append((header, self.dataset._get_col_indexes(col)[0], func))
+
+        headers = None
+        if self.dataset.headers:
+            headers = [self.dataset.headers[i] for i in self.cols]
+            headers += [header for header, col, func in specs]
+
+        columns = dict((col, self.dataset.get_col(col)) for header, col, func in specs)
+
+        rows = []
+        for key, positions in self.index.items():
+            row = list(key) if len(self.cols) > 1 else [key]
+            for header, col, func in specs:
+                values = columns[col]
+                row.append(func([values[i] for i in positions]))
+            rows.append(row)
+
+        _dset = self.dataset.__class__(headers=headers)
+        _dset.extend(rows)
+
+        return _dset
+
 
 class Databook(object):
     """A book of :class:`Dataset` objects.
@@ -927,8 +1316,6 @@ class Databook(object):
         else:
             self._datasets = sets
 
-        self._register_formats()
-
     def __repr__(self):
         try:
             return '<%s databook>' % (self.title.lower())
@@ -943,16 +1330,17 @@ class Databook(object):
 
     @classmethod
     def _register_formats(cls):
-        """Adds format properties."""
+        """Adds format properties. Called once, when the module is loaded."""
         for fmt in formats.available:
-            try:
-                try:
-                    setattr(cls, fmt.title, property(fmt.export_book, fmt.import_book))
-                except AttributeError:
-                    setattr(cls, fmt.title, property(fmt.export_book))
+            cls._register_format(fmt)
 
-            except AttributeError:
-                pass
+
+    @classmethod
+    def _register_format(cls, fmt):
+        """Adds the property of a format, if it can export a :class:`Databook`,
+        with a setter if it can import one. The format module is only
+        imported when the property is first used."""
+        _set_format_property(cls, fmt, 'export_book', 'import_book')
 
 
     def add_sheet(self, dataset):
@@ -986,9 +1374,82 @@ class Databook(object):
         return len(self._datasets)
 
 
+def _set_format_property(cls, fmt, export, import_):
+    """Sets (or removes) the property of a format on cls, given the names
+    of the format's export and import functions."""
+
+    if not fmt.supports(export):
+        if isinstance(cls.__dict__.get(fmt.title), property):
+            delattr(cls, fmt.title)
+        return
+
+    getter = lambda self: getattr(fmt, export)(self)
+    if fmt.supports(import_):
+        setattr(cls, fmt.title, property(
+            getter, lambda self, in_stream: getattr(fmt, import_)(self, in_stream)))
+    else:
+        setattr(cls, fmt.title, property(getter))
+
+
+Dataset._register_formats()
+Databook._register_formats()
+
+
+def register_format(title, module, extensions=(), functions=None, magic=None):
+    """Registers a format, and adds its property to :class:`Dataset` and
+    :class:`Databook`. ::
+
+        tablib.register_format('tex', 'mypackage.tablib_tex', ('tex',))
+
+        data.tex
+
+    The module (or its dotted name, to import it on first use) defines
+    the functions the format supports, out of ``export_set``,
+    ``import_set``, ``export_book``, ``import_book``, ``export_stream``,
+    ``import_stream`` and ``detect``. List them in ``functions`` to keep
+    the module from being imported until it is used. ::
+
+        tablib.register_format('tex', 'mypackage.tablib_tex', ('tex',),
+                               functions=('export_set',))
+    """
+
+    fmt = formats.register(title, module, extensions, functions, magic)
+    Dataset._register_format(fmt)
+    Databook._register_format(fmt)
+
+    return fmt
+
+
+def _column_indexes(cols, headers, width):
+    """Returns the indexes of the given columns (headers or indexes), for
+    format modules that import only some of the columns."""
+
+    if cols is None:
+        return list(range(width))
+
+    indexes = []
+    for col in cols:
+        if headers and col in headers:
+            indexes.append(headers.index(col))
+        elif isinstance(col, int) and 0 <= col < width:
+            indexes.append(col)
+        else:
+            raise InvalidDatasetIndex
+    return indexes
+
+
 def detect(stream):
-    """Return (format, stream) of given stream."""
-    for fmt in formats.available:
+    """Return (format, stream) of given stream.
+
+    Formats whose files start with known bytes (e.g. a ZIP archive) are
+    tried first if the stream starts with them, and not at all if it
+    doesn't, so their modules are only imported when they are likely.
+    """
+    candidates = [fmt for fmt in formats.available
+                  if fmt.supports('detect') and fmt.may_be(stream)]
+    candidates.sort(key=lambda fmt: fmt.magic is None)
+
+    for fmt in candidates:
         try:
             if fmt.detect(stream):
                 return (fmt, stream)
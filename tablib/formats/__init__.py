@@ -3,13 +3,122 @@
 """ Tablib - formats
 """
 
-from . import _csv as csv
-from . import _json as json
-from . import _xls as xls
-from . import _yaml as yaml
-from . import _tsv as tsv
-from . import _html as html
-from . import _xlsx as xlsx
-from . import _ods as ods
-
-available = (json, xls, yaml, csv, tsv, html, xlsx, ods)
+import sys
+
+from tablib.compat import basestring
+
+
+# The functions a format module can define
+FUNCTIONS = ('export_set', 'import_set', 'export_book', 'import_book',
+             'export_stream', 'import_stream', 'detect')
+
+
+class Format(object):
+    """A registered format. The module implementing it is only imported
+    when one of its functions is first used, so the backends of formats
+    that are never used (xlwt, openpyxl, odf, ...) are never loaded.
+
+    Attribute access is passed on to the module: ``fmt.export_set``,
+    ``fmt.import_set``, ``fmt.export_book``, ``fmt.import_book`` and
+    ``fmt.detect``, for the functions the module defines. The functions a
+    module defines are given when the format is registered, so that they
+    can be checked (see :meth:`supports`) without importing it.
+    """
+
+    def __init__(self, title, module, extensions=(), functions=None, magic=None):
+        self.title = title
+        self.extensions = tuple(extensions)
+        self._module = module
+        if functions is None:
+            functions = [name for name in FUNCTIONS if hasattr(self.module, name)]
+        self.functions = tuple(functions)
+        self.magic = magic
+
+    def __repr__(self):
+        return '<%s format>' % self.title
+
+    @property
+    def module(self):
+        """The module implementing the format, imported on first use."""
+        if isinstance(self._module, basestring):
+            __import__(self._module)
+            self._module = sys.modules[self._module]
+        return self._module
+
+    def supports(self, function):
+        """Returns True if the module defines the given function (e.g.
+        ``'import_set'``), without importing it."""
+        return function in self.functions
+
+    def may_be(self, stream):
+        """Returns False if stream can't be in the format, going by the
+        bytes files in the format start with (if it has any)."""
+        if self.magic is None:
+            return True
+        return isinstance(stream, bytes) and stream.startswith(self.magic)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in FUNCTIONS and name not in self.functions:
+            raise AttributeError(name)
+        return getattr(self.module, name)
+
+
+available = []
+
+
+def register(title, module, extensions=(), functions=None, magic=None):
+    """Adds a format to :data:`available`, replacing any format with the
+    same title, and returns it.
+
+    :param module: the module implementing the format, or its dotted name
+                   to import it when the format is first used.
+    :param functions: the names of the functions the module defines (see
+                      :data:`FUNCTIONS`). If not given, the module is
+                      imported to find them.
+    :param magic: the bytes files in the format start with, if any. Other
+                  streams are not passed to its ``detect``.
+    """
+
+    fmt = Format(title, module, extensions, functions, magic)
+
+    for i, other in enumerate(available):
+        if other.title == title:
+            available[i] = fmt
+            break
+    else:
+        available.append(fmt)
+
+    return fmt
+
+
+def get(title):
+    """Returns the registered format with the given title, or None."""
+    for fmt in available:
+        if fmt.title == title:
+            return fmt
+
+
+json = register('json', 'tablib.formats._json', ('json', 'jsn'),
+                ('export_set', 'import_set', 'export_book', 'import_book',
+                 'export_stream', 'detect'))
+xls = register('xls', 'tablib.formats._xls', ('xls',),
+               ('export_set', 'import_set', 'export_book', 'import_book',
+                'import_stream', 'detect'),
+               magic=b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1')
+yaml = register('yaml', 'tablib.formats._yaml', ('yaml', 'yml'),
+                ('export_set', 'import_set', 'export_book', 'import_book', 'detect'))
+csv = register('csv', 'tablib.formats._csv', ('csv',),
+               ('export_set', 'import_set', 'export_stream', 'import_stream', 'detect'))
+tsv = register('tsv', 'tablib.formats._tsv', ('tsv',),
+               ('export_set', 'import_set', 'export_stream', 'import_stream', 'detect'))
+html = register('html', 'tablib.formats._html', ('html',),
+                ('export_set', 'export_book'))
+xlsx = register('xlsx', 'tablib.formats._xlsx', ('xlsx',),
+                ('export_set', 'import_set', 'export_book', 'import_stream'))
+ods = register('ods', 'tablib.formats._ods', ('ods',),
+               ('export_set', 'export_book'))
+npz = register('npz', 'tablib.formats._npz', ('npz',),
+               ('export_set', 'import_set', 'export_stream', 'import_stream', 'detect'),
+               magic=b'PK\x03\x04')
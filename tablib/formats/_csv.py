@@ -12,6 +12,8 @@ extensions = ('csv',)
 
 DEFAULT_ENCODING = 'utf-8'
 
+DEFAULT_CHUNK_SIZE = 1000
+
 
 
 def export_set(dataset):
@@ -23,7 +25,7 @@ def export_set(dataset):
     else:
         _csv = csv.writer(stream, encoding=DEFAULT_ENCODING)
 
-    for row in dataset._package(dicts=False):
+    for row in dataset._package_rows():
         _csv.writerow(row)
 
     return stream.getvalue()
@@ -46,6 +48,66 @@ def import_set(dset, in_stream, headers=True):
             dset.append(row)
 
 
+def _writer(stream, **kwargs):
+    if is_py3:
+        return csv.writer(stream, **kwargs)
+    return csv.writer(stream, encoding=DEFAULT_ENCODING, **kwargs)
+
+
+def _reader(stream, **kwargs):
+    if is_py3:
+        return csv.reader(stream, **kwargs)
+    return csv.reader(stream, encoding=DEFAULT_ENCODING, **kwargs)
+
+
+def export_stream(dataset, stream, chunk_size=DEFAULT_CHUNK_SIZE, delimiter=','):
+    """Writes CSV representation of Dataset to a file object, chunk_size
+    rows at a time. On Python 2 the file must be opened in binary mode, and
+    on Python 3 with ``newline=''``."""
+
+    _csv = _writer(stream, delimiter=delimiter)
+
+    chunk = []
+    for row in dataset._package_rows():
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _csv.writerows(chunk)
+            chunk = []
+
+    if chunk:
+        _csv.writerows(chunk)
+
+
+def import_stream(dset, in_stream, headers=True, batch_size=DEFAULT_CHUNK_SIZE,
+                  delimiter=','):
+    """Reads dataset from a CSV file object, without reading the whole file
+    into memory. Rows are validated and added batch_size rows at a time."""
+
+    dset.wipe()
+
+    rows = _reader(in_stream, delimiter=delimiter)
+
+    if headers:
+        for row in rows:
+            if row:
+                dset.headers = row
+                break
+
+    batch = []
+    for row in rows:
+        # Skip empty rows
+        if not row:
+            continue
+
+        batch.append(row)
+        if len(batch) >= batch_size:
+            dset.extend(batch)
+            batch = []
+
+    if batch:
+        dset.extend(batch)
+
+
 def detect(stream):
     """Returns True if given stream is valid CSV."""
     try:
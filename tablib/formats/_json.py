@@ -6,16 +6,84 @@
 import tablib
 
 import sys
+from tablib.compat import StringIO, unicode
 from tablib.packages import omnijson as json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 title = 'json'
 extensions = ('json', 'jsn')
 
+DEFAULT_CHUNK_SIZE = 1000
+
+
+# The encoder for rows and values, picked once: orjson if it is installed,
+# else the one omnijson picked (ujson, yajl, ..., the standard library).
+if orjson is not None:
+    def _encode(obj):
+        return orjson.dumps(obj).decode('utf-8')
+else:
+    _encode = json.dumps
+
+
+def _encode_rows(dataset):
+    """Yields the JSON text of each row: an object if headers are set, else
+    an array. The keys are encoded once."""
+
+    rows = dataset._package_rows()
+
+    if not dataset.headers:
+        for row in rows:
+            yield _encode(row)
+        return
+
+    keys = ['%s: ' % _encode(unicode(header)) for header in next(rows)]
+
+    for row in rows:
+        yield '{%s}' % ', '.join([key + _encode(value) for key, value in zip(keys, row)])
+
 
 def export_set(dataset):
     """Returns JSON representation of Dataset."""
-    return json.dumps(dataset.dict)
+    stream = StringIO()
+    export_stream(dataset, stream)
+    return stream.getvalue()
+
+
+def export_stream(dataset, stream, lines=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Writes JSON representation of Dataset to a file object, chunk_size
+    rows at a time, without building the list of rows first.
+
+    :param lines: write JSON Lines (one row per line) instead of an array.
+    """
+
+    separator = '\n' if lines else ', '
+    chunk = []
+    first = True
+
+    if not lines:
+        stream.write('[')
+
+    for row in _encode_rows(dataset):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            stream.write(('' if first else separator) + separator.join(chunk))
+            chunk = []
+            first = False
+
+    if chunk:
+        stream.write(('' if first else separator) + separator.join(chunk))
+        first = False
+
+    if lines:
+        if not first:
+            stream.write('\n')
+    else:
+        stream.write(']')
 
 
 def export_book(databook):
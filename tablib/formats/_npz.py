@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+""" Tablib - NPZ (NumPy) Support.
+
+Each column is stored as a NumPy array, keeping its type: booleans, integers
+and floats as typed arrays, text as unicode arrays, and anything else as an
+object array. Object arrays are pickled, so reading them must be allowed
+explicitly, with ``allow_pickle=True``, and only for files from sources you
+trust. Requires NumPy.
+"""
+
+import struct
+import zipfile
+from numbers import Integral, Real
+
+try:
+    import numpy
+    from numpy.lib import format as npy
+except ImportError:
+    numpy = None
+
+from tablib.compat import BytesIO, basestring, unicode
+
+
+title = 'npz'
+extensions = ('npz',)
+
+HEADERS = '__headers__'
+TITLE = '__title__'
+
+# Size of the local file header of a zip member, before its name and extra
+# field (see the zip file format specification)
+ZIP_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError('NumPy is required for the npz format.')
+
+
+def _column_name(i):
+    return 'col%d' % i
+
+
+def _to_array(values):
+    """Returns the array storing a column of values."""
+    types = set(type(value) for value in values)
+
+    if types <= set([bool]):
+        return numpy.array(values, dtype=numpy.bool_)
+    if not types & set([bool]) and all(issubclass(t, Integral) for t in types):
+        return numpy.array(values, dtype=numpy.int64)
+    if not types & set([bool]) and all(issubclass(t, Real) for t in types):
+        return numpy.array(values, dtype=numpy.float64)
+    if all(issubclass(t, basestring) for t in types):
+        return numpy.array([unicode(value) for value in values], dtype=unicode)
+
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _get_arrays(dataset):
+    """Returns the columns of dataset, formatted, as arrays."""
+    if hasattr(dataset, 'get_array') and not dataset._formatters:
+        arrays = [dataset.get_array(i) for i in range(dataset.width)]
+        return [array if array.dtype != object else _to_array(array.tolist())
+                for array in arrays]
+
+    rows = dataset._package_rows()
+    if dataset.headers:
+        next(rows)
+    columns = list(zip(*rows)) or [[] for i in range(dataset.width)]
+    return [_to_array(list(column)) for column in columns]
+
+
+def _load(f, allow_pickle=False):
+    try:
+        return numpy.load(f, allow_pickle=allow_pickle)
+    except TypeError:
+        # NumPy < 1.10 always unpickles object arrays
+        if not allow_pickle:
+            raise ValueError('Reading NPZ files without unpickling requires '
+                             'NumPy 1.10 or later.')
+        return numpy.load(f)
+
+
+def _read_npz(npz):
+    """Returns (headers, title, arrays) of an opened NPZ file."""
+    headers = [unicode(header) for header in npz[HEADERS]] or None
+    titles = npz[TITLE]
+    title = unicode(titles[0]) if len(titles) else None
+
+    names = [name for name in npz.files if name.startswith('col')]
+    names.sort(key=lambda name: int(name[3:]))
+    return headers, title, names
+
+
+def export_set(dataset):
+    """Returns NPZ representation of Dataset."""
+    stream = BytesIO()
+    export_stream(dataset, stream)
+    return stream.getvalue()
+
+
+def export_stream(dataset, stream):
+    """Writes NPZ representation of Dataset to a binary file object."""
+
+    _require_numpy()
+
+    arrays = dict((_column_name(i), array)
+                  for i, array in enumerate(_get_arrays(dataset)))
+    arrays[HEADERS] = numpy.array(dataset.headers or [], dtype=unicode)
+    arrays[TITLE] = numpy.array([dataset.title] if dataset.title else [], dtype=unicode)
+
+    # Stored uncompressed, so that load() can memory-map the columns
+    numpy.savez(stream, **arrays)
+
+
+def import_set(dset, in_stream, allow_pickle=False):
+    """Returns dataset from NPZ stream.
+
+    :param allow_pickle: whether to read object columns, which are pickled.
+                         Only allow it for files from sources you trust.
+    """
+
+    import_stream(dset, BytesIO(in_stream), allow_pickle=allow_pickle)
+
+
+def import_stream(dset, in_stream, allow_pickle=False):
+    """Reads dataset from an NPZ file object. See :func:`import_set`."""
+
+    _require_numpy()
+
+    dset.wipe()
+
+    npz = _load(in_stream, allow_pickle)
+    try:
+        headers, title, names = _read_npz(npz)
+        columns = [npz[name].tolist() for name in names]
+    finally:
+        npz.close()
+
+    dset.headers = headers
+    dset.title = title
+    dset.extend(zip(*columns))
+
+
+def load(path, mmap_mode='c', allow_pickle=False):
+    """Returns a :class:`ColumnarDataset <tablib.columnar.ColumnarDataset>`
+    read from an NPZ file. Boolean, integer and float columns are
+    memory-mapped, not read in; other columns are read.
+
+    :param mmap_mode: mode of the memory maps, as in :func:`numpy.memmap`.
+                      The default, ``'c'`` (copy-on-write), lets the
+                      Dataset be changed without changing the file.
+    :param allow_pickle: whether to read object columns, which are pickled.
+                         Only allow it for files from sources you trust.
+    """
+
+    _require_numpy()
+
+    from tablib.columnar import ColumnarDataset
+
+    npz = _load(path, allow_pickle)
+    archive = zipfile.ZipFile(path)
+    f = open(path, 'rb')
+    try:
+        headers, title, names = _read_npz(npz)
+        arrays = []
+        for name in names:
+            array = _memmap(archive, f, path, name + '.npy', mmap_mode)
+            if array is None:
+                array = npz[name]
+            arrays.append(array)
+    finally:
+        f.close()
+        archive.close()
+        npz.close()
+
+    return ColumnarDataset.from_arrays(arrays, headers=headers, title=title, copy=False)
+
+
+def _memmap(archive, f, path, member, mmap_mode):
+    """Returns a memory map of an uncompressed, typed array in an NPZ file,
+    or None if it cannot be mapped."""
+
+    info = archive.getinfo(member)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    f.seek(info.header_offset)
+    local_header = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+    f.seek(info.header_offset + ZIP_LOCAL_HEADER.size + local_header[-2] + local_header[-1])
+
+    version = npy.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = npy.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = npy.read_array_header_2_0(f)
+
+    if dtype.kind not in 'biuf':
+        return None
+
+    return numpy.memmap(path, dtype=dtype, mode=mmap_mode, offset=f.tell(),
+                        shape=shape, order='F' if fortran_order else 'C')
+
+
+def detect(stream):
+    """Returns True if given stream is an NPZ file written by tablib."""
+    try:
+        archive = zipfile.ZipFile(BytesIO(stream))
+    except (zipfile.BadZipfile, TypeError, ValueError, IOError):
+        return False
+    return HEADERS + '.npy' in archive.namelist()
@@ -11,7 +11,12 @@ if sys.version_info[0] > 2:
 else:
     from cStringIO import StringIO as BytesIO
 
-from tablib.compat import opendocument, style, table, text, unicode
+if sys.version_info[0] > 2:
+    from tablib.packages.odf3 import opendocument, style, text, table
+else:
+    from tablib.packages.odf import opendocument, style, text, table
+
+from tablib.compat import unicode
 
 title = 'ods'
 extensions = ('ods',)
@@ -4,6 +4,7 @@
 """
 
 from tablib.compat import is_py3, csv, StringIO
+from tablib.formats import _csv
 
 
 
@@ -22,7 +23,7 @@ def export_set(dataset):
     else:
         _tsv = csv.writer(stream, encoding=DEFAULT_ENCODING, delimiter='\t')
 
-    for row in dataset._package(dicts=False):
+    for row in dataset._package_rows():
         _tsv.writerow(row)
 
     return stream.getvalue()
@@ -50,6 +51,20 @@ def import_set(dset, in_stream, headers=True):
             dset.append(row)
 
 
+def export_stream(dataset, stream, chunk_size=_csv.DEFAULT_CHUNK_SIZE):
+    """Writes TSV representation of Dataset to a file object, chunk_size
+    rows at a time."""
+
+    _csv.export_stream(dataset, stream, chunk_size=chunk_size, delimiter='\t')
+
+
+def import_stream(dset, in_stream, headers=True, batch_size=_csv.DEFAULT_CHUNK_SIZE):
+    """Reads dataset from a TSV file object, batch_size rows at a time."""
+
+    _csv.import_stream(dset, in_stream, headers=headers, batch_size=batch_size,
+                       delimiter='\t')
+
+
 def detect(stream):
     """Returns True if given stream is valid TSV."""
     try:
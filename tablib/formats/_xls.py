@@ -5,9 +5,18 @@
 
 import sys
 
-from tablib.compat import BytesIO, xlwt, xlrd, XLRDError
+from tablib.compat import is_py3, BytesIO
 import tablib
 
+if is_py3:
+    import tablib.packages.xlwt3 as xlwt
+    import tablib.packages.xlrd3 as xlrd
+    from tablib.packages.xlrd3.biffh import XLRDError
+else:
+    import tablib.packages.xlwt as xlwt
+    import tablib.packages.xlrd as xlrd
+    from tablib.packages.xlrd.biffh import XLRDError
+
 title = 'xls'
 extensions = ('xls',)
 
@@ -84,6 +93,44 @@ def import_book(dbook, in_stream, headers=True):
         dbook.add_sheet(data)
 
 
+def import_set(dset, in_stream, headers=True):
+    """Returns dataset from XLS stream."""
+
+    import_stream(dset, BytesIO(in_stream), headers=headers)
+
+
+def import_stream(dset, in_stream, headers=True, cols=None, rows=None):
+    """Reads dataset from the first sheet of an XLS file object. Only the
+    first sheet is loaded, and only the selected cells are read from it.
+
+    :param cols: headers (or indexes) of the columns to import.
+    :param rows: ``(start, stop)`` of the rows to import, not counting
+                 the headers.
+    """
+
+    dset.wipe()
+
+    xls_book = xlrd.open_workbook(file_contents=in_stream.read(), on_demand=True)
+    sheet = xls_book.sheet_by_index(0)
+
+    if not sheet.nrows:
+        return
+
+    first_row = sheet.row_values(0) if headers else None
+    indexes = tablib.core._column_indexes(cols, first_row, sheet.ncols)
+
+    start, stop = rows or (0, None)
+    offset = 1 if headers else 0
+    start = min(start + offset, sheet.nrows)
+    stop = sheet.nrows if stop is None else min(stop + offset, sheet.nrows)
+
+    if headers:
+        dset.headers = [first_row[i] for i in indexes]
+
+    columns = [sheet.col_values(i, start, stop) for i in indexes]
+    dset.extend(zip(*columns))
+
+
 def dset_sheet(dataset, ws):
     """Completes given worksheet from given Dataset."""
     _package = dataset._package(dicts=False)
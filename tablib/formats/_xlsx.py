@@ -11,13 +11,20 @@ if sys.version_info[0] > 2:
 else:
     from cStringIO import StringIO as BytesIO
 
-from tablib.compat import openpyxl
+if sys.version_info[0] > 2:
+    from tablib.packages import openpyxl3 as openpyxl
+else:
+    from tablib.packages import openpyxl
 
 Workbook = openpyxl.workbook.Workbook
+load_workbook = openpyxl.reader.excel.load_workbook
 ExcelWriter = openpyxl.writer.excel.ExcelWriter
 get_column_letter = openpyxl.cell.get_column_letter
+MAX_ROW = openpyxl.shared.ooxml.MAX_ROW
+read_dimension = openpyxl.reader.worksheet.read_dimension
 
 from tablib.compat import unicode
+import tablib
 
 
 title = 'xlsx'
@@ -26,11 +33,11 @@ extensions = ('xlsx',)
 def export_set(dataset):
     """Returns XLSX representation of Dataset."""
 
-    wb = Workbook()
-    ws = wb.worksheets[0]
+    wb = Workbook(optimized_write=True)
+    ws = wb.create_sheet()
     ws.title = dataset.title if dataset.title else 'Tablib Dataset'
 
-    dset_sheet(dataset, ws)
+    dset_dump_sheet(dataset, ws)
 
     stream = BytesIO()
     wb.save(stream)
@@ -40,64 +47,131 @@ def export_set(dataset):
 def export_book(databook):
     """Returns XLSX representation of DataBook."""
 
-    wb = Workbook()
-    ew = ExcelWriter(workbook = wb)
+    wb = Workbook(optimized_write=True)
     for i, dset in enumerate(databook._datasets):
         ws = wb.create_sheet()
         ws.title = dset.title if dset.title else 'Sheet%s' % (i)
 
-        dset_sheet(dset, ws)
+        dset_dump_sheet(dset, ws)
 
 
     stream = BytesIO()
-    ew.save(stream)
+    wb.save(stream)
     return stream.getvalue()
 
 
-def dset_sheet(dataset, ws):
-    """Completes given worksheet from given Dataset."""
-    _package = dataset._package(dicts=False)
-
-    for i, sep in enumerate(dataset._separators):
-        _offset = i
-        _package.insert((sep[0] + _offset), (sep[1],))
-
-    for i, row in enumerate(_package):
-        row_number = i + 1
-        for j, col in enumerate(row):
-            col_idx = get_column_letter(j + 1)
-            # We want to freeze the column after the last column
-            frzn_col_idx = get_column_letter(j + 2)
-
-            # bold headers
-            if (row_number == 1) and dataset.headers:
-                # ws.cell('%s%s'%(col_idx, row_number)).value = unicode(
-                    # '%s' % col, errors='ignore')
-                ws.cell('%s%s'%(col_idx, row_number)).value = unicode(col)
-                style = ws.get_style('%s%s' % (col_idx, row_number))
-                style.font.bold = True
-                ws.freeze_panes = '%s%s' % (frzn_col_idx, row_number)
-
-
-            # bold separators
-            elif len(row) < dataset.width:
-                ws.cell('%s%s'%(col_idx, row_number)).value = unicode(
-                    '%s' % col, errors='ignore')
-                style = ws.get_style('%s%s' % (col_idx, row_number))
-                style.font.bold = True
-
-            # wrap the rest
-            else:
-                try:
-                    if '\n' in col:
-                        ws.cell('%s%s'%(col_idx, row_number)).value = unicode(
-                            '%s' % col, errors='ignore')
-                        style = ws.get_style('%s%s' % (col_idx, row_number))
-                        style.alignment.wrap_text
-                    else:
-                        ws.cell('%s%s'%(col_idx, row_number)).value = unicode(
-                            '%s' % col, errors='ignore')
-                except TypeError:
-                    ws.cell('%s%s'%(col_idx, row_number)).value = unicode(col)
+def import_set(dset, in_stream, headers=True):
+    """Returns dataset from XLSX stream."""
+
+    import_stream(dset, BytesIO(in_stream), headers=headers)
+
+
+def import_stream(dset, in_stream, headers=True, cols=None, rows=None):
+    """Reads dataset from the first sheet of an XLSX file object. The
+    sheet is parsed lazily, one row at a time, and only cells in the
+    selected range are read.
+
+    :param cols: headers (or indexes) of the columns to import.
+    :param rows: ``(start, stop)`` of the rows to import, not counting
+                 the headers.
+    """
+
+    dset.wipe()
+
+    ws = load_workbook(in_stream, use_iterators=True).worksheets[0]
+
+    try:
+        first_row = [cell.internal_value for cell in next(ws.iter_rows())]
+    except StopIteration:
+        return
+
+    indexes = tablib.core._column_indexes(cols, first_row if headers else None,
+                                          len(first_row))
+    if not indexes:
+        return
+    start, stop = rows or (0, None)
+    offset = 2 if headers else 1
+
+    first = start + offset
+    last = stop + offset - 1 if stop is not None else MAX_ROW
+    last_in_sheet = _last_row(ws)
+    if last_in_sheet is not None:
+        last = min(last, last_in_sheet)
+
+    # One column wider, as the reader leaves out the last column of a range
+    cell_range = '%s%d:%s%d' % (
+        get_column_letter(min(indexes) + 1), first,
+        get_column_letter(max(indexes) + 2), last)
+
+    if headers:
+        dset.headers = [first_row[i] for i in indexes]
+
+    positions = [i - min(indexes) for i in indexes]
+    rows = ([row[j].internal_value for j in positions]
+            for row in ws.iter_rows(cell_range))
+
+    if last_in_sheet is None:
+        dset.extend(rows)
+    else:
+        dset.extend(_pad_rows(rows, first, last, len(indexes)))
+
+
+def _last_row(ws):
+    """Returns the number of the last row of an iterable worksheet, from
+    the dimension stored in the file, or None if it isn't stored."""
+    try:
+        dimension = read_dimension(ws._xml_source)
+    except ValueError:
+        # A single cell (e.g. 'A1'), not a range
+        return None
+    return dimension[3] if dimension else None
+
+
+def _pad_rows(rows, first, last, width):
+    """Yields the rows numbered first to last of a range read by an
+    iterable worksheet, as lists. The reader leaves out the last rows of
+    the range if they have no cells in its columns; they are added as
+    rows of ``None``, so that the number of rows doesn't depend on the
+    columns read."""
+    number = first
+    for row in rows:
+        yield row
+        number += 1
+    for number in range(number, last + 1):
+        yield [None] * width
+
+
+def _text(value):
+    """Returns value as the text stored in a cell."""
+    try:
+        return unicode('%s' % value, errors='ignore')
+    except TypeError:
+        return unicode(value)
+
+
+def _iter_sheet_rows(dataset):
+    """Yields (row, bold) for each row of the sheet, with separators
+    inserted in place. Headers and separators are bold."""
+
+    separators = sorted(dataset._separators, key=lambda sep: sep[0])
+
+    for i, row in enumerate(dataset._package_rows()):
+        while separators and separators[0][0] <= i:
+            yield (separators.pop(0)[1],), True
+        yield row, (i == 0 and bool(dataset.headers))
+
+    for sep in separators:
+        yield (sep[1],), True
+
 
+def dset_dump_sheet(dataset, ws):
+    """Streams given Dataset into a write-only (optimized) worksheet,
+    one row at a time."""
+
+    if dataset.headers:
+        # We want to freeze the column after the last column
+        ws.freeze_panes = '%s1' % get_column_letter(len(dataset.headers) + 1)
+
+    for row, bold in _iter_sheet_rows(dataset):
+        ws.append([_text(col) for col in row], bold=bold)
 
@@ -36,6 +36,7 @@ from ..shared.date_time import SharedDate
 from ..shared.ooxml import MAX_COLUMN, MAX_ROW
 from tempfile import NamedTemporaryFile
 from ..writer.excel import ExcelWriter
+from ..writer.worksheet import write_worksheet_sheetviews
 from ..writer.strings import write_string_table
 from ..writer.styles import StyleWriter
 from ..style import Style, NumberFormat
@@ -57,8 +58,13 @@ STYLES = {'datetime' : {'type':Cell.TYPE_NUMERIC,
                     'style':'0'},
         }
 
+# cellXfs index of BOLD_STYLE, see ExcelDumpWriter
+BOLD_STYLE_ID = '2'
+
 DATETIME_STYLE = Style()
 DATETIME_STYLE.number_format.format_code = NumberFormat.FORMAT_DATE_YYYYMMDD2
+BOLD_STYLE = Style()
+BOLD_STYLE.font.bold = True
 BOUNDING_BOX_PLACEHOLDER = 'A1:%s%d' % (get_column_letter(MAX_COLUMN), MAX_ROW)
 
 class DumpWorksheet(Worksheet):
@@ -76,6 +82,7 @@ class DumpWorksheet(Worksheet):
 
         self._max_col = 0
         self._max_row = 0
+        self._column_letters = []
         self._parent = parent_workbook
         self._fileobj_header = NamedTemporaryFile(mode='r+', prefix='openpyxl.', suffix='.header', delete=False)
         self._fileobj_content = NamedTemporaryFile(mode='r+', prefix='openpyxl.', suffix='.content', delete=False)
@@ -105,12 +112,7 @@ class DumpWorksheet(Worksheet):
                 'summaryRight': '1'})
         end_tag(doc, 'sheetPr')
         tag(doc, 'dimension', {'ref': 'A1:%s' % (self.get_dimensions())})
-        start_tag(doc, 'sheetViews')
-        start_tag(doc, 'sheetView', {'workbookViewId': '0'})
-        tag(doc, 'selection', {'activeCell': 'A1',
-                'sqref': 'A1'})
-        end_tag(doc, 'sheetView')
-        end_tag(doc, 'sheetViews')
+        write_worksheet_sheetviews(doc, self)
         tag(doc, 'sheetFormatPr', {'defaultRowHeight': '15'})
         start_tag(doc, 'sheetData')
 
@@ -160,11 +162,21 @@ class DumpWorksheet(Worksheet):
         else:
             return '%s%d' % (get_column_letter(self._max_col), (self._max_row))
 
-    def append(self, row):
+    def _get_column_letters(self, span):
+
+        letters = self._column_letters
+        while len(letters) < span:
+            letters.append(get_column_letter(len(letters) + 1))
+        return letters
+
+    def append(self, row, bold=False):
 
         """
         :param row: iterable containing values to append
         :type row: iterable
+
+        :param bold: write the values in a bold font
+        :type bold: bool
         """
 
         doc = self.doc
@@ -174,6 +186,7 @@ class DumpWorksheet(Worksheet):
         self._max_col = max(self._max_col, span)
 
         row_idx = self._max_row
+        letters = self._get_column_letters(span)
 
         attrs = {'r': '%d' % row_idx,
                  'spans': '1:%d' % span}
@@ -185,7 +198,7 @@ class DumpWorksheet(Worksheet):
             if cell is None:
                 continue
 
-            coordinate = '%s%d' % (get_column_letter(col_idx+1), row_idx)
+            coordinate = '%s%d' % (letters[col_idx], row_idx)
             attributes = {'r': coordinate}
 
             if isinstance(cell, bool):
@@ -202,6 +215,9 @@ class DumpWorksheet(Worksheet):
                 dtype = 'string'
                 cell = self._string_builder.add(cell)
 
+            if bold and dtype != 'datetime':
+                attributes['s'] = BOLD_STYLE_ID
+
             attributes['t'] = STYLES[dtype]['type']
 
             start_tag(doc, 'c', attributes)
@@ -231,6 +247,7 @@ class ExcelDumpWriter(ExcelWriter):
         self.workbook = workbook
         self.style_writer = StyleDumpWriter(workbook)
         self.style_writer._style_list.append(DATETIME_STYLE)
+        self.style_writer._style_list.append(BOLD_STYLE)
 
     def _write_string_table(self, archive):
 
@@ -1,6 +1,11 @@
+import os
+import json
+import time
+import tempfile
 import unittest
 from nose.tools import *
 
+import stimulus
 from stimulus import *
 
 class TestStimulus(unittest.TestCase):
@@ -19,5 +24,279 @@ class TestStimulus(unittest.TestCase):
         text_stim = self.par._initialize_stimulus(text)        
         assert_true(isinstance(text_stim, Text))
 
+    def test_preload_stimuli(self):
+        self.par.preload = self.par.max_preloaded = 2
+        self.par.add_stimuli([(Pause, (0.1,))] * 3)
+        self.par.preload_stimuli()
+        assert_equal(sorted(self.par.preloaded), [0, 1])
+        # Already shown stimuli are evicted
+        self.par.preload_stimuli(2)
+        assert_equal(sorted(self.par.preloaded), [2])
+
+    def test_preload_on_idle(self):
+        # Stimuli that don't idle are preloaded while an earlier one waits
+        self.par.preload = self.par.max_preloaded = 2
+        preloaded = []
+        par = self.par
+        class Blank(Stimulus):
+            def show(self):
+                preloaded.append(sorted(par.preloaded))
+                return self
+        self.par.add_stimuli([(Pause, (0.01,)), (Blank, {}), (Blank, {})])
+        self.par.show_stimulus(0)
+        assert_equal(sorted(self.par.preloaded), [1, 2])
+        self.par.show_stimulus(1)
+        self.par.show_stimulus(2)
+        # Nothing is preloaded on the way to the screen
+        assert_equal(preloaded, [[2], []])
+
+class TestDataWriter(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_json_is_valid_after_close(self):
+        writer = DataWriter(self.path, 'json', headers=['rt', 'key'], batch_size=2)
+        writer.write((0.5, 'a'))
+        writer.write((0.7, 'b'))
+        writer.write((0.9, 'c'))
+        assert_equal(writer.rows_written, 2)
+        writer.close()
+        with open(self.path) as fp:
+            data = json.load(fp)
+        assert_equal(len(data), 3)
+        assert_equal(data[2], {'rt': 0.9, 'key': 'c'})
+
+    def test_close_twice(self):
+        writer = DataWriter(self.path, 'json')
+        writer.write((0.5,))
+        writer.close()
+        writer.close()
+        with open(self.path) as fp:
+            assert_equal(json.load(fp), [[0.5]])
+
+    def test_streamed_data_is_saved(self):
+        # Streamed rows are finalized even if the dataset isn't saved
+        class Blank(Stimulus):
+            def get_data(self):
+                return (0.5, 'a')
+        par = Paradigm(format='json', destination=self.path, stream=True,
+                       batch_size=10)
+        par.add_stimuli([(Blank, {})] * 2)
+        par.play_all(save_dataset=False, quit=False)
+        assert_true(par.writer.closed)
+        with open(self.path) as fp:
+            assert_equal(json.load(fp), [[0.5, 'a'], [0.5, 'a']])
+
+class FailingWriter(object):
+    '''A DataWriter whose disk is full.'''
+    closed = False
+
+    def write(self, row):
+        raise IOError("No space left on device")
+
+    def close(self):
+        self.closed = True
+
+class TestBackgroundWriter(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_writes_rows(self):
+        writer = BackgroundWriter(DataWriter(self.path, 'json'), max_queue_size=2)
+        for i in range(5):
+            writer.write((i, 'a'))
+        writer.close()
+        assert_equal(writer.rows_written, 5)
+        with open(self.path) as fp:
+            assert_equal(json.load(fp)[4], [4, 'a'])
+
+    def test_error_is_raised_by_write(self):
+        failing = FailingWriter()
+        writer = BackgroundWriter(failing, max_queue_size=1)
+        writer.write((1, 'a'))
+        while writer.error is None:
+            time.sleep(0.001)
+        assert_raises(IOError, writer.write, (2, 'b'))
+        assert_raises(IOError, writer.close)
+        assert_true(failing.closed)
+
+    def test_error_is_raised_by_close(self):
+        failing = FailingWriter()
+        writer = BackgroundWriter(failing, max_queue_size=1)
+        # Rows queued after the error are discarded, without blocking
+        for i in range(3):
+            try:
+                writer.write((i, 'a'))
+            except IOError:
+                break
+        assert_raises(IOError, writer.close)
+        assert_equal(writer.rows_written, 0)
+
+class TestCompileParadigm(unittest.TestCase):
+
+    def test_compile(self):
+        items = [{'type': 'Text', 'text': 'Hi', 'duration': 5.0},
+                {'type': 'WaitForKey', 'args': [['c'], 'continue']}]
+        stimuli = compile_paradigm(items, get_stimulus_classes())
+        assert_equal(stimuli, [(Text, (), {'text': 'Hi', 'duration': 5.0}),
+                                (WaitForKey, (['c'], 'continue'), {})])
+
+    def test_compile_validates_arguments(self):
+        assert_raises(ValueError, compile_paradigm, 
+                    [{'type': 'Pause'}], get_stimulus_classes())
+        assert_raises(ValueError, compile_paradigm, 
+                    [{'type': 'Nope'}], get_stimulus_classes())
+
+    def test_load_cached(self):
+        cache_dir = tempfile.mkdtemp()
+        path = os.path.join(cache_dir, 'paradigm.json')
+        with open(path, 'w') as fp:
+            json.dump([{'type': 'WaitForKey', 'keys': ['c']}], fp)
+        stimuli = load_paradigm(path, cache_dir=cache_dir)
+        # Callers can't change each other's arguments
+        stimuli[0][2]['keys'].append('q')
+        assert_equal(load_paradigm(path, cache_dir=cache_dir),
+                    [(WaitForKey, (), {'keys': ['c']})])
+        assert_equal(len(os.listdir(cache_dir)), 2)
+
+    def test_parse_csv(self):
+        content = ('type,text,duration:json,args\r\n'
+                   'Text,null,5.0,\r\n'
+                   'WaitForKey,,,"[[""c""], ""continue""]"\r\n')
+        assert_equal(parse_paradigm(content, '.csv'),
+                    [{'type': 'Text', 'text': 'null', 'duration': 5.0},
+                    {'type': 'WaitForKey', 'args': [['c'], 'continue']}])
+        assert_raises(ValueError, parse_paradigm, 
+                    'type,duration:json\r\nPause,five\r\n', '.csv')
+
+class TestSampleBuffer(unittest.TestCase):
+
+    def test_grows(self):
+        buf = SampleBuffer(width=2, capacity=2)
+        for i in range(5):
+            buf.append(i, i / 10.0)
+        assert_equal(len(buf), 5)
+        assert_equal(buf.array.shape, (5, 2))
+        assert_equal(buf.array[4].tolist(), [4, 0.4])
+        buf.clear()
+        assert_equal(len(buf.array), 0)
+
+    def test_non_numeric_samples(self):
+        # e.g. a RatingScale with choices
+        buf = SampleBuffer(width=2, capacity=2)
+        buf.append(1, 0.5)
+        buf.append('calm', 0.75)
+        assert_equal(buf.array.dtype, object)
+        assert_equal(buf.array.tolist(), [[1, 0.5], ['calm', 0.75]])
+
+class TestVideoRating(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_write_categorical_history(self):
+        rating = VideoRating.__new__(VideoRating)
+        rating.dest = self.path
+        rating.history_format = 'csv'
+        rating.history = SampleBuffer(width=2, dtype=object)
+        rating.history.append(u'\xe9t\xe9', 0.5)
+        rating.history.append('hiver', 1.0)
+        rating.write_history()
+        with open(self.path) as fp:
+            assert_equal(fp.read().decode('utf-8').splitlines(),
+                        [u'Rating,Time', u'\xe9t\xe9,0.50000000', 
+                        u'hiver,1.00000000'])
+
+class TestWaitForKeys(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (event.getKeys, event.clearEvents, stimulus.wait_for_events)
+        self.presses = []
+        event.getKeys = lambda keyList=None, timeStamped=False: self.presses.pop(0)
+        event.clearEvents = lambda eventType=None: None
+
+    def tearDown(self):
+        event.getKeys, event.clearEvents, stimulus.wait_for_events = self.saved
+
+    def test_key_time_is_wake_up_time(self):
+        # The key arrived at 10.25, and was dispatched at 10.5
+        self.presses = [[], [('a', 10.5)]]
+        stimulus.wait_for_events = lambda timeout: 10.25
+        assert_equal(wait_for_keys(), [('a', 10.25)])
+
+    def test_key_time_without_wake_up_time(self):
+        self.presses = [[], [], [('a', 10.5)]]
+        stimulus.wait_for_events = lambda timeout: None
+        assert_equal(wait_for_keys(), [('a', 10.5)])
+
+    def test_max_wait(self):
+        self.presses = [[]] * 100
+        stimulus.wait_for_events = lambda timeout: time.sleep(timeout)
+        assert_equal(wait_for_keys(max_wait=0.05, timeout=0.01), None)
+
+class FakeSource(object):
+    '''A pyglet media source with n_frames video frames, 1/30 s apart.'''
+    def __init__(self, n_frames):
+        self.frames = range(n_frames)
+
+    def get_next_video_timestamp(self):
+        return self.frames[0] / 30.0 if self.frames else None
+
+    def get_next_video_frame(self):
+        return 'frame {0}'.format(self.frames.pop(0))
+
+class TestFrameDecoder(unittest.TestCase):
+
+    def test_decodes_frames_in_order(self):
+        decoder = FrameDecoder(FakeSource(5), buffer_size=2)
+        frames = []
+        while True:
+            item = decoder.frames.get(timeout=1.0)
+            if item is FrameDecoder.end:
+                break
+            frames.append(item)
+        assert_equal(frames, [(i / 30.0, 'frame {0}'.format(i)) for i in range(5)])
+        assert_equal(decoder.frames_decoded, 5)
+
+    def test_stop_with_full_queue(self):
+        decoder = FrameDecoder(FakeSource(100), buffer_size=2)
+        while not decoder.frames.full():
+            time.sleep(0.001)
+        decoder.stop()
+        assert_false(decoder.is_alive())
+        assert_true(decoder.frames_decoded < 100)
+
+    def test_strip_video(self):
+        source = FakeSource(1)
+        source.video_format = object()
+        strip_video(source)
+        assert_true(source.video_format is None)
+
+class TestProfiler(unittest.TestCase):
+
+    def test_summary(self):
+        profiler = Profiler()
+        stim = Stimulus(None)
+        profiler.record(stim, 'show', 1.0, 1.5, index=0)
+        profiler.record(stim, 'show', 2.0, 3.0, index=1)
+        summary = profiler.summary()['Stimulus']['show']
+        assert_equal(summary['count'], 2)
+        assert_almost_equal(summary['mean'], 0.75)
+        assert_equal(sum(summary['histogram']), 2)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,418 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from nose.tools import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import tablib
+from tablib.compat import BytesIO, StringIO
+
+@unittest.skipIf(numpy is None, 'requires NumPy')
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        from tablib.columnar import ColumnarDataset
+        self.rows = [('s01', 1, 0.5, True), ('s02', 2, 0.75, False)]
+        self.headers = ['subject', 'trial', 'rt', 'correct']
+        self.data = ColumnarDataset(*self.rows, headers=self.headers)
+        self.reference = tablib.Dataset(*self.rows, headers=self.headers)
+
+    def test_typed_columns(self):
+        dtypes = [self.data.get_array(i).dtype for i in range(4)]
+        assert_equal(dtypes, [numpy.dtype(object), numpy.int64, numpy.float64, numpy.bool_])
+        assert_equal(self.data.get_array('rt').mean(), 0.625)
+
+    def test_same_as_dataset(self):
+        assert_equal(self.data.dict, self.reference.dict)
+        assert_equal(self.data[1], self.reference[1])
+        assert_equal(self.data['rt'], self.reference['rt'])
+        assert_equal(self.data.csv, self.reference.csv)
+        assert_equal(self.data.json, self.reference.json)
+
+    def test_row_changes(self):
+        for data in (self.data, self.reference):
+            data.lpush(('s00', 0, 0.25, True))
+            data.insert(2, ('s03', 3, 1.0, False))
+            data[0] = ('s04', 4, 1.25, True)
+            del data[1]
+            data.rpop()
+        assert_equal(self.data.dict, self.reference.dict)
+        assert_equal(self.data.height, 2)
+
+    def test_type_promotion(self):
+        from tablib.columnar import Column
+        column = Column([1, 2])
+        column.append(2.5)
+        assert_equal(column.array.dtype, numpy.float64)
+        assert_equal(column.tolist(), [1.0, 2.0, 2.5])
+        column.set(0, 'x')
+        assert_equal(column.array.dtype, object)
+        assert_equal(column.tolist(), ['x', 2.0, 2.5])
+
+    def test_bools_and_numbers(self):
+        from tablib.columnar import Column
+        column = Column([1])
+        column.append(True)
+        assert_equal(column.array.dtype, object)
+        assert_true(column.get(1) is True)
+        column = Column([True])
+        column.append(3)
+        assert_equal(column.tolist(), [True, 3])
+        assert_true(column.get(0) is True)
+
+    def test_subclass_copies(self):
+        from tablib.columnar import ColumnarDataset
+        class Trials(ColumnarDataset):
+            pass
+        data = Trials(*self.rows, headers=self.headers)
+        assert_true(isinstance(data.sort('rt'), Trials))
+        assert_true(isinstance(data.filter('practice'), Trials))
+
+    def test_formatter_outside_dataset(self):
+        self.data._formatters.append((4, str))
+        assert_raises(tablib.core.InvalidDatasetIndex, getattr, self.data, 'csv')
+
+    def test_columns_and_tags(self):
+        self.data.append(('s03', 3, 1.0, True), tags=['practice'])
+        self.reference.append(('s03', 3, 1.0, True), tags=['practice'])
+        assert_equal(self.data.filter('practice').dict, self.reference.filter('practice').dict)
+        self.data.append_col([0, 1, 2], header='block')
+        self.reference.append_col([0, 1, 2], header='block')
+        del self.data['trial']
+        del self.reference['trial']
+        assert_equal(self.data.dict, self.reference.dict)
+
+    def test_from_arrays(self):
+        from tablib.columnar import ColumnarDataset
+        rt = numpy.array([0.5, 0.75])
+        data = ColumnarDataset.from_arrays([numpy.array(['a', 'b']), rt],
+                                           headers=['word', 'rt'], copy=False)
+        assert_true(data.get_array('rt').base is rt)
+        assert_equal(data.dict, [{'word': 'a', 'rt': 0.5}, {'word': 'b', 'rt': 0.75}])
+        assert_raises(tablib.InvalidDimensions, ColumnarDataset.from_arrays,
+                      [rt, numpy.arange(3)])
+
+
+class TestStreams(unittest.TestCase):
+
+    def setUp(self):
+        self.data = tablib.Dataset(headers=('word', 'rt'))
+        for i in range(5):
+            self.data.append(('word %d' % i, i / 4.0))
+
+    def test_export_stream(self):
+        for fmt in ('csv', 'tsv'):
+            stream = StringIO()
+            self.data.export_stream(fmt, stream, chunk_size=2)
+            assert_equal(stream.getvalue(), getattr(self.data, fmt))
+
+    def test_import_stream(self):
+        for fmt in ('csv', 'tsv'):
+            data = tablib.Dataset()
+            data.import_stream(fmt, StringIO(getattr(self.data, fmt)), batch_size=2)
+            imported = tablib.Dataset()
+            setattr(imported, fmt, getattr(self.data, fmt))
+            assert_equal(data.headers, ['word', 'rt'])
+            assert_equal(data.dict, imported.dict)
+
+    def test_import_stream_without_headers(self):
+        data = tablib.Dataset()
+        data.import_stream('csv', StringIO('a,1\r\n\r\nb,2\r\n'), headers=False)
+        assert_equal(data.headers, None)
+        assert_equal(data[:], [('a', '1'), ('b', '2')])
+
+    def test_export_json_stream(self):
+        import json
+        stream = StringIO()
+        self.data.export_stream('json', stream, chunk_size=2)
+        assert_equal(json.loads(stream.getvalue()), json.loads(self.data.json))
+        assert_equal(json.loads(stream.getvalue()), self.data.dict)
+
+    def test_export_json_lines(self):
+        import json
+        stream = StringIO()
+        self.data.export_stream('json', stream, lines=True, chunk_size=2)
+        lines = stream.getvalue().split('\n')
+        assert_equal(lines[-1], '')
+        assert_equal([json.loads(line) for line in lines[:-1]], self.data.dict)
+        stream = StringIO()
+        tablib.Dataset().export_stream('json', stream, lines=True)
+        assert_equal(stream.getvalue(), '')
+
+    def test_unsupported_format(self):
+        assert_raises(tablib.UnsupportedFormat, self.data.export_stream, 'html', StringIO())
+        assert_raises(tablib.UnsupportedFormat, self.data.import_stream, 'yaml', StringIO())
+
+
+@unittest.skipIf(sys.version_info[0] > 2, 'the bundled openpyxl reader requires Python 2')
+class TestExcelStreams(unittest.TestCase):
+
+    def setUp(self):
+        from tablib.formats import _xlsx
+        workbook = _xlsx.Workbook()
+        sheet = workbook.worksheets[0]
+        # The last two rows have no note, and a blank row separates them
+        rows = [('word', 'rt', 'note'), ('a', 1, 'first'), ('b', 2, None),
+                (None, None, None), ('c', 3, None)]
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                if value is not None:
+                    sheet.cell(row=i, column=j).value = value
+        stream = BytesIO()
+        workbook.save(stream)
+        self.xlsx = stream.getvalue()
+
+    def import_stream(self, **kwargs):
+        data = tablib.Dataset()
+        data.import_stream('xlsx', BytesIO(self.xlsx), **kwargs)
+        return data
+
+    def test_import_columns(self):
+        data = self.import_stream(cols=['word', 'rt'])
+        assert_equal(data['word'], ['a', 'b', None, 'c'])
+        assert_equal(data['rt'], [1, 2, None, 3])
+
+    def test_trailing_blank_cells(self):
+        assert_equal(self.import_stream(cols=['note'])['note'],
+                     ['first', None, None, None])
+        assert_equal(self.import_stream(cols=['rt', 'note']).height, 4)
+        data = self.import_stream(cols=['note'], rows=(1, 3))
+        assert_equal(data['note'], [None, None])
+        data = self.import_stream(cols=['note'], rows=(2, 10))
+        assert_equal(data['note'], [None, None])
+
+class TestFormats(unittest.TestCase):
+
+    def setUp(self):
+        # A format whose module doesn't exist, so importing it fails
+        self.fmt = tablib.register_format('nope', 'tablib.formats._nope', ('nope',),
+                                          functions=('export_set', 'detect'),
+                                          magic=b'NOPE')
+
+    def tearDown(self):
+        tablib.formats.available.remove(self.fmt)
+        del tablib.Dataset.nope
+
+    def test_properties(self):
+        assert_true(hasattr(tablib.Dataset, 'nope'))
+        assert_false(hasattr(tablib.Databook, 'nope'))
+        assert_false(hasattr(tablib.Databook, 'csv'))
+        assert_true(hasattr(tablib.Databook, 'json'))
+        data = tablib.Dataset()
+        # Formats that can't import have no setter
+        assert_raises(AttributeError, setattr, data, 'nope', 'x')
+        assert_raises(AttributeError, setattr, data, 'html', '<table></table>')
+        data.csv = 'a,b\r\n1,2\r\n'
+        assert_equal(data.headers, ['a', 'b'])
+
+    def test_detect(self):
+        # The unlikely format is not imported to be tried
+        assert_equal(tablib.core.detect('a,b\r\n1,2\r\n')[0].title, 'csv')
+        assert_equal(tablib.core.detect('[{"a": 1}]')[0].title, 'json')
+        assert_raises(ImportError, tablib.core.detect, b'NOPE')
+
+class TestSort(unittest.TestCase):
+
+    def setUp(self):
+        self.data = tablib.Dataset(headers=('word', 'rt'))
+        self.data.append(('ccc', 3), tags=['c'])
+        self.data.append(('a', 1))
+        self.data.append(('bb', 1))
+        self.data.append(('dd', 2))
+        self.data.append_separator('end')
+
+    def test_sort(self):
+        data = self.data.sort('rt')
+        assert_equal(data['word'], ['a', 'bb', 'dd', 'ccc'])
+        assert_equal(self.data['word'], ['ccc', 'a', 'bb', 'dd'])
+        data = self.data.sort('rt', reverse=True)
+        assert_equal(data['word'], ['ccc', 'dd', 'a', 'bb'])
+
+    def test_sort_by_columns(self):
+        data = self.data.sort(['rt', 'word'], reverse=True)
+        assert_equal(data['word'], ['ccc', 'dd', 'bb', 'a'])
+        data = self.data.sort([1, 0])
+        assert_equal(data['word'], ['a', 'bb', 'dd', 'ccc'])
+
+    def test_sort_key(self):
+        data = self.data.sort('word', key=len)
+        assert_equal(data['word'], ['a', 'bb', 'dd', 'ccc'])
+        data = self.data.sort(['rt', 'word'], key=lambda values: -values[0])
+        assert_equal(data['word'], ['ccc', 'dd', 'a', 'bb'])
+
+    def test_sort_in_place(self):
+        assert_true(self.data.sort('word', in_place=True) is self.data)
+        assert_equal(self.data['word'], ['a', 'bb', 'ccc', 'dd'])
+        assert_equal(self.data.filter('c')['word'], ['ccc'])
+        assert_equal(self.data.lookup('word', 'dd')['rt'], [2])
+
+    def test_sort_keeps_tags_and_separators(self):
+        data = self.data.sort('rt')
+        assert_equal(data.filter('c')['word'], ['ccc'])
+        assert_equal(data._separators, self.data._separators)
+
+
+class TestFormatters(unittest.TestCase):
+
+    def setUp(self):
+        self.data = tablib.Dataset(headers=('word', 'rt'))
+        self.data.append(('a', 1))
+        self.data.append(('b', 2))
+
+    def test_export_does_not_change_data(self):
+        self.data.add_formatter('word', str.upper)
+        self.data.add_formatter(1, lambda rt: rt * 10)
+        assert_equal(self.data.dict, [{'word': 'A', 'rt': 10}, {'word': 'B', 'rt': 20}])
+        # exporting again does not apply the formatters twice
+        assert_equal(self.data.csv, 'word,rt\r\nA,10\r\nB,20\r\n')
+        assert_equal(self.data[:], [('a', 1), ('b', 2)])
+        assert_equal(list(self.data._package_rows()),
+                     [['word', 'rt'], ['A', 10], ['B', 20]])
+        assert_equal(self.data['rt'], [1, 2])
+
+    def test_formatter_for_all_columns(self):
+        self.data._formatters.append((None, str))
+        assert_equal(self.data.dict, [{'word': 'a', 'rt': '1'}, {'word': 'b', 'rt': '2'}])
+        assert_equal(self.data[0], ('a', 1))
+
+
+@unittest.skipIf(numpy is None, 'requires NumPy')
+class TestNpz(unittest.TestCase):
+
+    def setUp(self):
+        self.data = tablib.Dataset(headers=('word', 'trial', 'rt', 'correct'),
+                                   title='session')
+        self.data.append(('a', 1, 0.5, True))
+        self.data.append(('b', 2, 0.75, False))
+        self.temp_dir = tempfile.mkdtemp(prefix='tablib-tests')
+        self.path = os.path.join(self.temp_dir, 'data.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, data):
+        f = open(self.path, 'wb')
+        try:
+            data.export_stream('npz', f)
+        finally:
+            f.close()
+
+    def test_round_trip(self):
+        data = tablib.Dataset()
+        data.npz = self.data.npz
+        assert_equal(data.headers, self.data.headers)
+        assert_equal(data.title, 'session')
+        assert_equal(data.dict, self.data.dict)
+        data = tablib.Dataset()
+        data.import_stream('npz', BytesIO(self.data.npz))
+        assert_equal(data.dict, self.data.dict)
+
+    def test_load(self):
+        from tablib.formats import _npz
+        self.write(self.data)
+        data = _npz.load(self.path)
+        assert_equal(data.dict, self.data.dict)
+        assert_equal(data.title, 'session')
+        for col in ('trial', 'rt', 'correct'):
+            array = data.get_array(col)
+            assert_true(isinstance(array, numpy.memmap) or
+                        isinstance(array.base, numpy.memmap))
+        assert_false(isinstance(data.get_array('word'), numpy.memmap))
+        # copy-on-write: changing the dataset does not change the file
+        data[0] = ('c', 3, 1.0, False)
+        del data
+        assert_equal(_npz.load(self.path).dict, self.data.dict)
+
+    def test_files_are_closed(self):
+        from tablib.formats import _npz
+        closed = []
+        load = numpy.load
+        def tracked_load(*args, **kwargs):
+            npz = load(*args, **kwargs)
+            close = npz.close
+            npz.close = lambda: closed.append(close())
+            return npz
+        numpy.load = tracked_load
+        try:
+            self.write(self.data)
+            _npz.load(self.path)
+            tablib.Dataset().import_stream('npz', BytesIO(self.data.npz))
+        finally:
+            numpy.load = load
+        assert_equal(len(closed), 2)
+
+    def test_object_columns_need_pickle(self):
+        from tablib.formats import _npz
+        self.data.append_col([None, (1, 2)], header='extra')
+        self.write(self.data)
+        assert_raises(ValueError, _npz.load, self.path)
+        assert_raises(ValueError, tablib.Dataset().import_stream, 'npz',
+                      BytesIO(self.data.npz))
+        data = _npz.load(self.path, allow_pickle=True)
+        assert_equal(data['extra'], [None, (1, 2)])
+
+
+class TestIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.data = tablib.Dataset(headers=('key', 'value'))
+        self.data.append(('a', 3))
+        self.data.append(('b', 2))
+
+    def test_lookup(self):
+        assert_equal(self.data.lookup('key', 'b').dict, [{'key': 'b', 'value': 2}])
+        assert_equal(self.data.lookup('key', 'z').height, 0)
+
+    def test_index_is_reused(self):
+        index = self.data.create_index('key')
+        assert_true(self.data.create_index('key') is index)
+
+    def test_lookup_after_row_changes(self):
+        self.data.lookup('key', 'a')
+        del self.data[0]
+        self.data.append(('c', 9))
+        assert_equal(self.data.lookup('key', 'a').height, 0)
+        self.data.lpush(('a', 1))
+        assert_equal(self.data['value'], [1, 2, 9])
+        assert_equal(self.data.lookup('key', 'a')['value'], [1])
+        self.data.rpop()
+        assert_equal(self.data.lookup('key', 'c').height, 0)
+        self.data.insert(1, ('c', 5))
+        assert_equal(self.data.lookup('key', 'c')['value'], [5])
+        self.data.lpop()
+        assert_equal(self.data.lookup('key', 'c')['value'], [5])
+
+    def test_between(self):
+        self.data.append(('c', 1))
+        assert_equal(self.data.between('value', 2, 4)['key'], ['b', 'a'])
+        self.data.extend([('d', 2)])
+        assert_equal(self.data.between('value', 2, 4)['key'], ['b', 'd', 'a'])
+
+    def test_join(self):
+        other = tablib.Dataset(headers=('key', 'label'))
+        other.append(('a', 'first'))
+        assert_equal(self.data.join(other, on='key').dict,
+                    [{'key': 'a', 'value': 3, 'label': 'first'}])
+        other.append(('b', 'second'))
+        joined = self.data.join(other, on='key', how='left')
+        assert_equal(joined['label'], ['first', 'second'])
+
+    def test_groupby(self):
+        self.data.append(('a', 5))
+        grouped = self.data.groupby('key').agg({'value': sum})
+        assert_equal(sorted(grouped.dict, key=lambda row: row['key']),
+                    [{'key': 'a', 'value': 8},
+                    {'key': 'b', 'value': 2}])
+        self.data.rpop()
+        grouped = self.data.groupby('key').agg([('n', 'value', len)])
+        assert_equal(sorted(grouped['n']), [1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()